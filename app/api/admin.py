@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.api.airport import airport_query
+from app.services.admission import controllers
+from app.services.weather import health
+from app.services.cache import (
+    NAMESPACES,
+    get_airport_tags,
+    invalidate_tag,
+    inspect_tag,
+    keyspace_stats,
+)
+
+TAG_KINDS = ("airport", "ns", "provider")
+PROVIDERS = ("aviationstack", "weatherstack", "openmeteo", "metar")
+PREWARM_CONCURRENCY = 8
+
+
+def parse_tag(tag: str):
+    """This function validates a cache tag and normalises airport codes to upper case.
+
+    Args:
+        tag (str): "airport:{CODE}", "ns:{namespace}" or "provider:{name}".
+
+    Raises:
+        ValueError: If the tag is malformed or names an unknown namespace or provider.
+
+    Returns:
+        str: The normalised tag.
+    """
+    kind, _, value = (tag or "").partition(":")
+    if kind not in TAG_KINDS or not value:
+        raise ValueError(
+            "tag must be airport:{CODE}, ns:{namespace} or provider:{name}"
+        )
+    if kind == "airport":
+        if len(value) not in (3, 4):
+            raise ValueError("Airport code must be 3 or 4 characters long")
+        return get_airport_tags(value)[0]
+    if kind == "ns" and value not in NAMESPACES:
+        raise ValueError(f"namespace must be one of: {', '.join(NAMESPACES)}")
+    if kind == "provider" and value not in PROVIDERS:
+        raise ValueError(f"provider must be one of: {', '.join(PROVIDERS)}")
+    return tag
+
+
+def invalidate(tag: str):
+    """This function deletes every cache entry under a tag, see invalidate_tag.
+
+    Args:
+        tag (str): The tag, see parse_tag.
+
+    Raises:
+        ValueError: If the tag is invalid.
+
+    Returns:
+        dict: The tag and the number of cache entries deleted.
+    """
+    tag = parse_tag(tag)
+    return {"tag": tag, "deleted": invalidate_tag(tag)}
+
+
+def inspect(tag: str, limit: int = 100):
+    """This function describes the cache entries under a tag, see inspect_tag.
+
+    Args:
+        tag (str): The tag, see parse_tag.
+        limit (int, optional): Maximum number of entries described. Defaults to 100.
+
+    Raises:
+        ValueError: If the tag is invalid.
+
+    Returns:
+        dict: The tag and its entries with their ttl, size and age.
+    """
+    tag = parse_tag(tag)
+    return {"tag": tag, "entries": inspect_tag(tag, limit)}
+
+
+def prewarm(codes: list):
+    """This function loads airports into the cache by generating their profiles, which
+    caches their airport record, weather observation and traffic counters.
+
+    Args:
+        codes (list): Airport codes (IATA or ICAO).
+
+    Raises:
+        ValueError: If no codes, or more than PREWARM_MAX_CODES codes, are provided.
+
+    Returns:
+        dict: The codes warmed and the error of each code that failed.
+    """
+    codes = list(dict.fromkeys(code.strip().upper() for code in codes if code.strip()))
+    if not codes:
+        raise ValueError("At least one airport code must be provided")
+    if len(codes) > settings.PREWARM_MAX_CODES:
+        raise ValueError(
+            f"At most {settings.PREWARM_MAX_CODES} airports can be prewarmed at once"
+        )
+
+    def warm(code):
+        try:
+            airport_query(code)
+            return None
+        except Exception as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=PREWARM_CONCURRENCY) as executor:
+        errors = dict(zip(codes, executor.map(warm, codes)))
+    return {
+        "warmed": [code for code, error in errors.items() if error is None],
+        "failed": {code: error for code, error in errors.items() if error},
+    }
+
+
+def stats():
+    """This function returns the keyspace statistics per namespace, see keyspace_stats."""
+    return keyspace_stats()
+
+
+def providers():
+    """This function returns the admission state of every upstream provider and the
+    latency and health the weather providers are routed by."""
+    return {
+        "admission": {name: c.stats() for name, c in controllers.items()},
+        "weather": {name: h.stats() for name, h in health.items()},
+    }
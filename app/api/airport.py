@@ -1,9 +1,12 @@
 import logging
-from app.services.aviationstack import get_airport_info
-from app.services.weatherstack import get_current_weather_info
+from app.core.profiling import profiled
+from app.core.timing import stage
+from app.core.models import Airport, WeatherObservation, AirportProfile
+from app.services.lookup import lookup_airport_weather
+from app.services.traffic import get_traffic_counts
 from app.core.utils import (
     weather_risk_calc,
-    # TODO traffic_risk_calc,
+    traffic_risk_calc,
     okta_calc,
     dew_point_calc,
     local_time_calc,
@@ -12,7 +15,10 @@ from app.core.utils import (
     windspeed_knots_calc,
 )
 
+logger = logging.getLogger(__name__)
 
+
+@profiled
 def airport_query(airport_code: str = None):
     """This function retrieves airport information and current weather data
     for a given airport code (IATA or ICAO) and generates an airport profile.
@@ -28,87 +34,91 @@ def airport_query(airport_code: str = None):
         dict: A dictionary containing the airport profile and current weather information.
     """
     try:
-        airport_info = get_airport_info(airport_code)
-        latitude = airport_info["data"][0]["latitude"]
-        longitude = airport_info["data"][0]["longitude"]
-        weather_info = get_current_weather_info(latitude, longitude)
-        airport_profile = generate_airport_profile(airport_info, weather_info)
-        return airport_profile
+        # Airport and weather are read in one round trip when both are cached
+        airport, weather = lookup_airport_weather(airport_code)
+        # Counters are refreshed in the background, this is a single cache read
+        with stage("traffic_cache"):
+            traffic_counts = get_traffic_counts(airport.iata or airport_code)
+        with stage("profile"):
+            airport_profile = generate_airport_profile(airport, weather, traffic_counts)
+        return airport_profile.to_dict()
     except ValueError as ve:
-        print(f"ValueError: {ve}")
-        logging.error(f"ValueError: {ve}")
+        logger.info("Airport query for %s failed: %s", airport_code, ve)
         raise ve
     except Exception as e:
-        print(f"Unexpected error: {e}")
-        logging.error(f"Unexpected error: {e}")
+        logger.error("Airport query for %s failed: %s", airport_code, e)
         raise e
 
 
-def generate_airport_profile(airport_info, weather_info):
+def generate_airport_profile(
+    airport: Airport, weather: WeatherObservation, traffic_counts=None
+):
     """This function generates a comprehensive airport profile by combining
-    airport information and current weather data.
+    airport information, current weather data and traffic counters.
 
     Args:
-        airport_info (dict): Airport information data.
-        weather_info (dict): Weather information data.
+        airport (Airport): The airport.
+        weather (WeatherObservation): The current weather at the airport.
+        traffic_counts (dict, optional): Traffic counters for the current window. Defaults to None.
 
     Raises:
         e: If any unexpected errors during the execution.
 
     Returns:
-        dict: A dictionary containing the airport profile and current weather information.
+        AirportProfile: The airport profile, see AirportProfile.to_dict for the response format.
     """
     try:
-        airport = airport_info["data"][0]
-        weather = weather_info["current"]
-
-        utc_time, local_time = local_time_calc(airport["gmt"])
-
-        airport_profile = {
-            "airport_profile": {
-                "name": airport["airport_name"],
-                "iata": airport["iata_code"],
-                "icao": airport["icao_code"],
-                "city": weather_info["location"]["name"],
-                "country": airport["country_name"],
-                "current_time_utc": utc_time.strftime("%H:%M"),
-                "current_time_local": local_time.strftime("%H:%M"),
-                "timezone": airport["timezone"],
-            },
-            "weather_info": {
-                "observation_time": weather["observation_time"],
-                "wind_direction": weather["wind_dir"],
-                "wind_speed_km": weather["wind_speed"],
-                "windspeed_knots": windspeed_knots_calc(weather["wind_speed"]),
-                "wind_degree": weather["wind_degree"],
-                "temperature": weather["temperature"],
-                "dew_point": dew_point_calc(
-                    weather["temperature"], weather["humidity"]
-                ),
-                "precipitation_mm": weather["precip"],
-                "visibility_km": weather["visibility"],
-                "visibility_mi": visibility_mi_calc(weather["visibility"]),
-                "cloud_cover_percent": weather["cloudcover"],
-                "cloud_cover_okta": okta_calc(weather["cloudcover"]),
-                "description": weather["weather_descriptions"][0],
-                "weather_icon": weather["weather_icons"][0],
-                "pressure_hpa": weather["pressure"],
-                "pressure_inhg": pressure_inhg_calc(weather["pressure"]),
-                "humidity": weather["humidity"],
-                "weather_rating": weather_risk_calc(
-                    okta=okta_calc(weather["cloudcover"]),
-                    precipitation=weather["precip"],
-                    windspeed=weather["wind_speed"],
-                    visibility=weather["visibility"],
-                ),
-            },
-        }
-        print(
-            f"Generated airport profile: {airport_profile['airport_profile']['name']} at {utc_time.strftime('%H:%M')} UTC"
+        utc_time, local_time = local_time_calc(airport.gmt)
+        okta = okta_calc(weather.cloudcover)
+
+        airport_profile = AirportProfile(
+            airport=airport,
+            weather=weather,
+            utc_time=utc_time,
+            local_time=local_time,
+            dew_point=dew_point_calc(weather.temperature, weather.humidity),
+            windspeed_knots=windspeed_knots_calc(weather.wind_speed),
+            visibility_mi=visibility_mi_calc(weather.visibility),
+            pressure_inhg=pressure_inhg_calc(weather.pressure),
+            cloud_cover_okta=okta,
+            weather_rating=weather_risk_calc(
+                okta=okta,
+                precipitation=weather.precip,
+                windspeed=weather.wind_speed,
+                visibility=weather.visibility,
+            ),
+            traffic=generate_traffic_info(traffic_counts),
         )
-        logging.info(f"Generated airport profile for {airport['icao_code']}")
+        logger.debug("Generated airport profile for %s", airport.icao)
         return airport_profile
     except Exception as e:
-        print(f"Error generating airport profile: {e}")
-        logging.error(f"Error generating airport profile: {e}")
+        logger.error("Error generating airport profile: %s", e)
         raise e
+
+
+def generate_traffic_info(traffic_counts):
+    """This function generates the traffic section of an airport profile.
+
+    Args:
+        traffic_counts (dict or None): Traffic counters for the current window,
+        or None if they have not been collected yet.
+
+    Returns:
+        dict: Arrivals and departures per 15 minutes, delay ratio and traffic rating.
+    """
+    if not traffic_counts:
+        return {
+            "arrivals_15min": None,
+            "departures_15min": None,
+            "delay_ratio": None,
+            "traffic_rating": None,
+        }
+    return {
+        "arrivals_15min": traffic_counts["arrivals"],
+        "departures_15min": traffic_counts["departures"],
+        "delay_ratio": traffic_counts["delay_ratio"],
+        "traffic_rating": traffic_risk_calc(
+            movements=traffic_counts["arrivals"] + traffic_counts["departures"],
+            delay_ratio=traffic_counts["delay_ratio"],
+        ),
+    }
@@ -0,0 +1,77 @@
+import json
+import logging
+from dataclasses import asdict
+import requests
+from app.core.deadline import DeadlineExceeded
+from app.services.admission import Overloaded
+from app.services.flights import PAGE_SIZE, airport_departures, flight_status
+
+logger = logging.getLogger(__name__)
+
+
+def render_flights(total, flights):
+    """This function renders flights as the text of a JSON response, one page of
+    flights per chunk, so the response can be streamed while later pages load.
+
+    Headers are sent before the flights, so a page that fails midway cannot
+    change the status code. The response then ends with the flights rendered so
+    far and an "error" member.
+
+    Args:
+        total (int): The total number of flights of the query upstream.
+        flights (iterator): The Flights, see fetch_flights.
+
+    Yields:
+        str: The response body, in chunks.
+    """
+    yield f'{{"total": {total}, "flights": ['
+    chunk = []
+    count = 0
+    error = ""
+    try:
+        for flight in flights:
+            chunk.append(json.dumps(asdict(flight)))
+            if len(chunk) == PAGE_SIZE:
+                yield ("," if count else "") + ",".join(chunk)
+                count += len(chunk)
+                chunk = []
+    except (requests.exceptions.RequestException, Overloaded, DeadlineExceeded) as e:
+        logger.error("Flights response cut short: %s", e)
+        error = f', "error": {json.dumps(str(e))}'
+    finally:
+        # Stops the page fetches when the client goes away
+        flights.close()
+    if chunk:
+        yield ("," if count else "") + ",".join(chunk)
+        count += len(chunk)
+    yield f'], "count": {count}{error}}}'
+
+
+def flight_status_query(flight_iata: str):
+    """This function returns the status of the flights with an IATA flight number.
+
+    Args:
+        flight_iata (str): IATA flight number, e.g. "BA117".
+
+    Raises:
+        ValueError: If the flight number is invalid.
+
+    Returns:
+        iterator: The JSON response body, in chunks, see render_flights.
+    """
+    return render_flights(*flight_status(flight_iata))
+
+
+def departures_query(airport_code: str):
+    """This function returns the status of the flights departing from an airport.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Raises:
+        ValueError: If the airport code is invalid.
+
+    Returns:
+        iterator: The JSON response body, in chunks, see render_flights.
+    """
+    return render_flights(*airport_departures(airport_code))
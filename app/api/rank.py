@@ -0,0 +1,100 @@
+import heapq
+import logging
+from app.services.aviationstack import get_airport_url, get_region_airports
+from app.services.weather import weather_cache_keys, parse_cached_weather
+from app.services.cache import get_cache_key, check_cache_many
+from app.core.models import Airport
+from app.core.utils import weather_risk_batch, okta_calc
+
+logger = logging.getLogger(__name__)
+
+
+def rank_airports(codes: list = None, region: str = None, k: int = 20):
+    """This function ranks airports by current weather risk using cached data only,
+    and returns the k airports with the highest risk.
+
+    Airports without both a cached airport record and a cached weather observation
+    are not scored, they are listed as unavailable instead.
+
+    Args:
+        codes (list, optional): Airport codes (IATA or ICAO) to rank. Defaults to None.
+        region (str, optional): ISO 3166-1 alpha-2 country code whose indexed airports are ranked. Defaults to None.
+        k (int, optional): Number of airports to return. Defaults to 20.
+
+    Raises:
+        ValueError: If neither codes nor region are provided, or k is not positive.
+
+    Returns:
+        dict: The top-k airports with their risk components, and the unavailable airport codes.
+    """
+    if not codes and not region:
+        raise ValueError("Either codes or region must be provided")
+    if k < 1:
+        raise ValueError("k must be a positive integer")
+
+    candidates = list(dict.fromkeys(code.upper() for code in codes or []))
+    if region:
+        candidates += [c for c in get_region_airports(region) if c not in candidates]
+    candidates = [c for c in candidates if len(c) in (3, 4)]
+
+    # Airport records, then the weather observations at their coordinates
+    airport_infos = check_cache_many(
+        [get_cache_key(get_airport_url(code)) for code in candidates]
+    )
+    airports = {}
+    for code, airport_info in zip(candidates, airport_infos):
+        try:
+            airports[code] = Airport.from_response(airport_info or {})
+        except ValueError:
+            continue
+    # Every weather provider's key per airport, all in one MGET
+    weather_keys = [
+        weather_cache_keys(a.latitude, a.longitude, a.icao) for a in airports.values()
+    ]
+    weather_infos = iter(
+        check_cache_many([key for keys in weather_keys for _, key in keys])
+    )
+
+    scored_codes, observations = [], []
+    for code, keys in zip(airports, weather_keys):
+        weather = parse_cached_weather(keys, [next(weather_infos) for _ in keys])
+        if weather is None:
+            continue
+        scored_codes.append(code)
+        observations.append(
+            (
+                okta_calc(weather.cloudcover),
+                weather.precip,
+                weather.wind_speed,
+                weather.visibility,
+            )
+        )
+    scores = weather_risk_batch(observations)
+
+    ranked = heapq.nlargest(
+        k,
+        (
+            (risk, code, components)
+            for code, (risk, components) in zip(scored_codes, scores)
+            if risk is not None
+        ),
+        key=lambda item: item[0],
+    )
+    scored = set(scored_codes)
+    unavailable = [c for c in candidates if c not in scored]
+    logger.debug("Ranked %d of %d airports", len(scored_codes), len(candidates))
+    return {
+        "airports": [
+            {
+                "code": code,
+                "name": airports[code].name,
+                "country": airports[code].country,
+                "weather_rating": risk,
+                "components": {
+                    name: round(value, 1) for name, value in components.items()
+                },
+            }
+            for risk, code, components in ranked
+        ],
+        "unavailable": unavailable,
+    }
@@ -0,0 +1,325 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from app.api.airport import airport_query
+from app.core.logs import configure_logging
+from app.services.admission import Overloaded
+from app.services.metar import parse_reports, load_observations
+
+"""
+Command line tools.
+
+    python -m app.cli profiles --codes-file codes.txt --out profiles.ndjson
+    python -m app.cli metar --file metars.txt
+
+profiles generates airport profiles through the same service layer as the API,
+so the cache is reused and upstream calls go through admission control.
+metar loads a bulk METAR file into the weather cache.
+"""
+
+MAX_RETRIES = 5  # Retries per airport when an upstream sheds the request
+REPORT_INTERVAL = 10  # Seconds between progress reports
+
+# Columns of a flattened profile and their Parquet types. Declared up front,
+# as a row group may hold only None in a column, e.g. traffic on a cold
+# cache, and weather numbers are ints or floats depending on the provider.
+PROFILE_COLUMNS = [
+    ("code", "string"),
+    ("name", "string"),
+    ("iata", "string"),
+    ("icao", "string"),
+    ("city", "string"),
+    ("country", "string"),
+    ("current_time_utc", "string"),
+    ("current_time_local", "string"),
+    ("timezone", "string"),
+    ("observation_time", "string"),
+    ("wind_direction", "string"),
+    ("wind_speed_km", "float64"),
+    ("windspeed_knots", "int64"),
+    ("wind_degree", "float64"),
+    ("temperature", "float64"),
+    ("dew_point", "int64"),
+    ("precipitation_mm", "float64"),
+    ("visibility_km", "float64"),
+    ("visibility_mi", "int64"),
+    ("cloud_cover_percent", "float64"),
+    ("cloud_cover_okta", "int64"),
+    ("description", "string"),
+    ("weather_icon", "string"),
+    ("pressure_hpa", "float64"),
+    ("pressure_inhg", "float64"),
+    ("humidity", "float64"),
+    ("weather_rating", "int64"),
+    ("arrivals_15min", "int64"),
+    ("departures_15min", "int64"),
+    ("delay_ratio", "float64"),
+    ("traffic_rating", "int64"),
+]
+
+
+def read_codes(codes_file):
+    """This function yields the airport codes of a file, one per line.
+
+    Blank lines and lines starting with # are skipped.
+
+    Args:
+        codes_file (file): An open text file.
+    """
+    for line in codes_file:
+        code = line.strip()
+        if code and not code.startswith("#"):
+            yield code.upper()
+
+
+def fetch_profile(airport_code):
+    """This function generates one airport profile, waiting and retrying when an
+    upstream provider sheds the request.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        dict: The airport profile.
+    """
+    for attempt in range(MAX_RETRIES):
+        try:
+            return airport_query(airport_code)
+        except Overloaded as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(e.retry_after)
+
+
+def flatten_profile(airport_code, profile):
+    """This function flattens a profile into one row, for columnar output.
+
+    Args:
+        airport_code (str): The airport code the profile was requested for.
+        profile (dict): The airport profile.
+
+    Returns:
+        dict: The profile sections merged into one flat mapping.
+    """
+    row = {"code": airport_code}
+    for section in profile.values():
+        row.update(section)
+    return row
+
+
+class NDJSONWriter:
+    """Writes one JSON profile per line."""
+
+    def __init__(self, path):
+        self._file = sys.stdout if path == "-" else open(path, "w")
+
+    def write(self, airport_code, profile):
+        self._file.write(json.dumps({"code": airport_code, **profile}) + "\n")
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetWriter:
+    """Writes profiles to a Parquet file in row groups, so memory stays bounded.
+
+    Every row group is built with the PROFILE_COLUMNS schema, missing values
+    are written as nulls. Requires pyarrow, which is not part of requirements.txt.
+    """
+
+    def __init__(self, path, row_group_size=1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = pyarrow.schema(
+            [(name, pyarrow.type_for_alias(alias)) for name, alias in PROFILE_COLUMNS]
+        )
+        self._path = path
+        self._rows = []
+        self._row_group_size = row_group_size
+        self._writer = None
+
+    def write(self, airport_code, profile):
+        self._rows.append(flatten_profile(airport_code, profile))
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, self._schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+
+def generate_profiles(codes, writer, concurrency=8, report=print):
+    """This function generates profiles for many airports concurrently, writing each
+    one as soon as it completes.
+
+    At most twice the concurrency of codes are in flight, so memory stays bounded
+    however long the input is.
+
+    Args:
+        codes (iterable): Airport codes (IATA or ICAO).
+        writer (NDJSONWriter or ParquetWriter): Where profiles are written.
+        concurrency (int, optional): Profiles generated at once. Defaults to 8.
+        report (callable, optional): Receives progress messages. Defaults to print.
+
+    Returns:
+        dict: Counts of written and failed profiles, elapsed seconds and profiles per second.
+    """
+    started = last_report = time.perf_counter()
+    written = failed = 0
+    codes = iter(codes)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            while len(in_flight) < concurrency * 2:
+                code = next(codes, None)
+                if code is None:
+                    break
+                in_flight[executor.submit(fetch_profile, code)] = code
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                code = in_flight.pop(future)
+                try:
+                    writer.write(code, future.result())
+                    written += 1
+                except Exception as e:
+                    failed += 1
+                    report(f"{code}: {e}")
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL:
+                last_report = now
+                report(
+                    f"{written + failed} processed, {written / (now - started):.1f} profiles/s"
+                )
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "written": written,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "profiles_per_second": round(written / elapsed, 1) if elapsed else 0,
+    }
+    report(
+        f"{written} profiles written, {failed} failed in {stats['seconds']}s "
+        f"({stats['profiles_per_second']} profiles/s)"
+    )
+    return stats
+
+
+def ingest_metar(path, file_format=None, report=print):
+    """This function loads the latest METAR of every station in a file into the
+    weather cache.
+
+    Args:
+        path (str): A METAR text or CSV file, - for stdin.
+        file_format (str, optional): "text" or "csv". Defaults to the file extension.
+        report (callable, optional): Receives progress messages. Defaults to print.
+
+    Returns:
+        dict: Stations loaded, reports skipped and elapsed seconds.
+    """
+    file_format = file_format or ("csv" if path.endswith(".csv") else "text")
+    started = time.perf_counter()
+    errors = []
+    metar_file = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        observations = parse_reports(metar_file, file_format, errors)
+    finally:
+        if metar_file is not sys.stdin:
+            metar_file.close()
+    parsed = time.perf_counter() - started
+    for error in errors[:10]:
+        report(f"Skipped {error}")
+    loaded = load_observations(observations)
+    stats = {
+        "stations": loaded,
+        "skipped": len(errors),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    report(
+        f"{loaded} stations loaded, {len(errors)} reports skipped in {stats['seconds']}s "
+        f"(parsed in {parsed:.2f}s)"
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    profiles = commands.add_parser("profiles", help="Generate airport profiles in bulk")
+    profiles.add_argument(
+        "--codes-file", required=True, help="File with one airport code per line"
+    )
+    profiles.add_argument("--out", required=True, help="Output file, - for stdout")
+    profiles.add_argument(
+        "--format",
+        choices=("ndjson", "parquet"),
+        help="Defaults to the --out extension",
+    )
+    profiles.add_argument(
+        "--concurrency", type=int, default=8, help="Profiles generated at once"
+    )
+
+    metar = commands.add_parser("metar", help="Load a bulk METAR file into the cache")
+    metar.add_argument(
+        "--file", required=True, help="METAR text or CSV file, - for stdin"
+    )
+    metar.add_argument(
+        "--format", choices=("text", "csv"), help="Defaults to the --file extension"
+    )
+
+    args = parser.parse_args(argv)
+    # Profiles may be written to stdout, keep logs out of them
+    configure_logging(sys.stderr)
+    if args.command == "metar":
+        stats = ingest_metar(
+            args.file,
+            args.format,
+            report=lambda message: print(message, file=sys.stderr),
+        )
+        return 0 if stats["stations"] else 1
+
+    output_format = args.format or (
+        "parquet" if args.out.endswith(".parquet") else "ndjson"
+    )
+    writer = (
+        ParquetWriter(args.out)
+        if output_format == "parquet"
+        else NDJSONWriter(args.out)
+    )
+    try:
+        with open(args.codes_file) as codes_file:
+            stats = generate_profiles(
+                read_codes(codes_file),
+                writer,
+                concurrency=args.concurrency,
+                report=lambda message: print(message, file=sys.stderr),
+            )
+    finally:
+        writer.close()
+    return 1 if stats["failed"] and not stats["written"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,10 +12,124 @@ class Settings(BaseSettings):
     # Redis
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
+    # Shards as "primary:port|replica:port,primary:port", overrides REDIS_HOST
+    REDIS_NODES: str = ""
+    REDIS_READ_FROM_REPLICAS: bool = True
     CACHE_EXPIRE: int = 3600  # 1 hour
+    CACHE_BACKEND: str = "redis"  # "redis", or "sqlite" to cache without Redis
+    CACHE_SQLITE_PATH: str = "clearflight-cache.db"
+    CACHE_SQLITE_FLUSH_MS: int = 5  # Writes are committed in batches this often
+    CACHE_SQLITE_BATCH_SIZE: int = 500  # Or as soon as this many are queued
+    CACHE_SQLITE_SWEEP_INTERVAL: int = (
+        60  # Seconds between deletions of expired entries
+    )
+    NEGATIVE_CACHE_EXPIRE: int = 300  # 5 minutes, for "airport not found" results
+
+    # In-process cache of decoded airports and weather, in front of Redis
+    LOCAL_CACHE_SIZE: int = 10000  # Entries per worker
+    LOCAL_WEATHER_EXPIRE: int = 60  # Airports stay for CACHE_EXPIRE
+    LOCAL_SNAPSHOT_PATH: str = ""  # File restored at startup, empty disables snapshots
+    LOCAL_SNAPSHOT_INTERVAL: int = 60  # Seconds, a snapshot is also taken at shutdown
+
+    # Serialized entries shared by the workers of a host, in a memory mapped file
+    SHARED_CACHE_PATH: str = ""  # e.g. /dev/shm/clearflight-cache, empty disables
+    SHARED_CACHE_SLOTS: int = 16384
+    SHARED_CACHE_SLOT_SIZE: int = 2048  # Larger entries are not shared
+    SHARED_CACHE_EXPIRE: int = 60  # Bounds staleness after another host writes
+
+    # Weather and coordinates keyed by airport code, so a warm profile is one MGET
+    AIRPORT_WEATHER_EXPIRE: int = 600  # Bounds staleness after a provider refresh
+    AIRPORT_COORDS_EXPIRE: int = 2592000  # 30 days, airports do not move
+
+    # WeatherStack batching
+    WEATHERSTACK_BULK_ENABLED: bool = False  # Bulk queries need a Professional plan
+    WEATHER_BATCH_WINDOW_MS: int = 0  # 0 disables batching of single lookups
+    WEATHER_BATCH_MAX_SIZE: int = 50  # WeatherStack bulk limit per request
+
+    # Weather providers, "weatherstack", "openmeteo" and "metar", in order of preference
+    WEATHER_PROVIDERS: str = "weatherstack"
+    WEATHER_GRID_DEGREES: float = 0  # Airports in a cell share weather, 0 disables
+    WEATHER_EXACT_AIRPORTS: str = ""  # ICAO codes keeping their own weather
+    WEATHER_HEDGE_ENABLED: bool = False  # Query the next provider after the p95
+    WEATHER_HEDGE_DEFAULT_MS: int = 1000  # p95 assumed until enough samples
+    METAR_EXPIRE: int = 5400  # Ingested METARs are hourly, drop them after 90 minutes
+
+    # Admission control for upstream calls
+    AVIATIONSTACK_MAX_CONCURRENCY: int = 8
+    WEATHERSTACK_MAX_CONCURRENCY: int = 8
+    OPENMETEO_MAX_CONCURRENCY: int = 8
+    ADMISSION_QUEUE_SIZE: int = 32  # Callers waiting per provider before shedding
+    ADMISSION_MAX_WAIT_MS: int = 2000  # Longest wait in the queue
+
+    # Request deadlines, clients may ask for less with X-Request-Timeout-Ms
+    REQUEST_TIMEOUT_MS: int = 10000  # Longest time a request may take
+    UPSTREAM_TIMEOUT_MS: int = 5000  # Longest upstream call, less near the deadline
+    STALE_WITHIN_MS: int = 500  # Serve expired local entries with less time left
+    STALE_MAX_AGE: int = 3600  # Seconds since expiry an entry may still be served
+
+    # Traffic counters
+    TRAFFIC_REFRESH_INTERVAL: int = (
+        900  # Counters older than this are refreshed when read
+    )
+    TRAFFIC_REFRESH_CONCURRENCY: int = 4  # Refreshes running at once per worker
+    TRAFFIC_EXPIRE: int = 7200  # Drop counters of airports no longer queried
+    TRAFFIC_MAX_PAGES: int = 5  # Pages of 100 flights per direction and refresh
+
+    # Network summary, /summary
+    SUMMARY_MAX_AGE: int = 5400  # Airports drop out once their weather is this old
+
+    # Flight status, /flights/{flight_iata} and /airport/{code}/departures
+    FLIGHTS_EXPIRE: int = 300  # Seconds a page of flights is cached
+    FLIGHTS_MAX_PAGES: int = 10  # Pages of 100 flights per response
+    FLIGHTS_CONCURRENCY: int = 4  # Pages fetched at once per response
+
+    # Weather risk map tiles, /tiles/{z}/{x}/{y}
+    TILE_GRID_SIZE: int = 16  # Cells per tile side
+    TILE_MAX_ZOOM: int = 10
+    TILE_EXPIRE: int = 300  # Also dropped when an observation in the tile refreshes
+
+    # Event loop watchdog, reported by /admin/loop
+    LOOP_WATCHDOG_ENABLED: bool = True
+    LOOP_WATCHDOG_INTERVAL_MS: int = 50  # Heartbeat period
+    LOOP_WATCHDOG_THRESHOLD_MS: int = 100  # Blocks longer than this are reported
+    LOOP_WATCHDOG_SAMPLES: int = 1200  # Lag samples kept, a minute of heartbeats
+    LOOP_WATCHDOG_REPORTS: int = 50  # Stacks of blocking code kept
+    LOOP_WATCHDOG_REPORT_INTERVAL: int = 10  # Seconds between two stack reports
+
+    # Tracing
+    TRACE_EXPORTER: str = ""  # "", "file" (OTLP JSON lines) or "otel"
+    TRACE_FILE: str = "traces.jsonl"
+
+    # Inbound rate limiting per API key, or per IP address without a known key
+    RATE_LIMIT_ENABLED: bool = False
+    # Tiers as "{requests}/{seconds}", clients without a known key are anonymous
+    RATE_LIMIT_TIERS: dict[str, str] = {
+        "anonymous": "60/60",
+        "standard": "600/60",
+        "premium": "6000/60",
+    }
+    RATE_LIMIT_API_KEYS: dict[str, str] = {}  # API key to tier name
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # Behind a proxy setting X-Forwarded-For
+    RATE_LIMIT_LOCAL_SIZE: int = 10000  # Blocked clients remembered per worker
+
+    # Admin cache API, disabled while no key is set
+    ADMIN_API_KEY: str = ""  # Sent in the X-Admin-Key header
+    PREWARM_MAX_CODES: int = 100  # Airports per prewarm request
+
+    # Logging, written by a background thread
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" (one object per line) or "text"
+    LOG_QUEUE_SIZE: int = 10000  # Records waiting to be written, more are dropped
+    LOG_SAMPLE_RATE: int = 100  # Keep 1 in N records of high volume events
 
     DEBUG: bool = False  # Enable for local debugging
 
+    # Request profiling, only available with DEBUG enabled
+    PROFILE_SAMPLE_RATE: int = 0  # Profile 1 in N requests, 0 for header only
+    PROFILE_MODE: str = "sample"  # "sample" (folded stacks) or "cprofile"
+    PROFILE_INTERVAL_MS: int = 2  # Stack sampling interval
+    PROFILE_RING_SIZE: int = 20  # Profiles kept in memory
+
     # App config
     model_config = ConfigDict(env_file=".env", extra="ignore")
 
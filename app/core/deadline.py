@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+import requests
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+
+"""
+Per-request deadlines.
+
+Each request gets a deadline, REQUEST_TIMEOUT_MS from its arrival, or sooner
+if the client sends a shorter X-Request-Timeout-Ms header. It is kept in a
+context variable, so it follows the request into the threadpool and into the
+threads fetching on its behalf, like the stage timings.
+
+Upstream calls are given the time left as their timeout, capped by
+UPSTREAM_TIMEOUT_MS, and admission queue waits are cut short at the deadline.
+Work about to start after the deadline raises DeadlineExceeded instead, and
+the client gets a 504 at the deadline at the latest. Lookups that would need
+an upstream call with less than STALE_WITHIN_MS left serve expired entries of
+the local cache instead, when they have one.
+"""
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-Request-Timeout-Ms"
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its work is done."""
+
+    def __init__(self, message="Request deadline exceeded"):
+        super().__init__(message)
+
+
+def remaining():
+    """Return the seconds left before the current request's deadline, None outside of one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def near():
+    """Return whether less than STALE_WITHIN_MS is left before the deadline."""
+    left = remaining()
+    return left is not None and left < settings.STALE_WITHIN_MS / 1000
+
+
+def check():
+    """Raise DeadlineExceeded if the current request's deadline has passed."""
+    if expired():
+        raise DeadlineExceeded()
+
+
+@contextmanager
+def upstream_call():
+    """Context manager for one upstream HTTP call, yielding its timeout in seconds:
+    UPSTREAM_TIMEOUT_MS, or the time left before the deadline if sooner.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed before the call, or the call
+            timed out because of it.
+    """
+    timeout = settings.UPSTREAM_TIMEOUT_MS / 1000
+    left = remaining()
+    if left is not None:
+        if left <= 0:
+            raise DeadlineExceeded()
+        timeout = min(timeout, left)
+    try:
+        yield timeout
+    except requests.exceptions.Timeout as e:
+        if expired():
+            raise DeadlineExceeded() from e
+        raise
+
+
+@contextmanager
+def deadline_after(seconds):
+    """Context manager running the code inside with a deadline, e.g. in tests or jobs."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def request_timeout(header_value):
+    """Return the timeout of a request in seconds, from its header when it is shorter
+    than REQUEST_TIMEOUT_MS. Invalid values are ignored."""
+    timeout = settings.REQUEST_TIMEOUT_MS
+    try:
+        requested = int(header_value) if header_value else None
+    except ValueError:
+        requested = None
+    if requested is not None and 0 < requested < timeout:
+        timeout = requested
+    return timeout / 1000
+
+
+async def apply_deadlines(request, call_next):
+    """HTTP middleware setting each request's deadline and answering 504 once it passes."""
+    timeout = request_timeout(request.headers.get(HEADER))
+    with deadline_after(timeout):
+        try:
+            return await asyncio.wait_for(call_next(request), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "%s %s exceeded its %.0fms deadline",
+                request.method,
+                request.url.path,
+                timeout * 1000,
+            )
+            return JSONResponse(
+                status_code=504, content={"detail": "Request deadline exceeded"}
+            )
@@ -0,0 +1,132 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from app.core.config import settings
+
+"""
+Structured, non-blocking logging.
+
+Modules log through logging.getLogger(__name__) with %-style arguments, so a
+message below LOG_LEVEL costs one level check and no string is built. Records
+that pass are put on a bounded queue and formatted and written to stdout by a
+background thread, never by the thread serving the request. When the queue
+is full records are dropped and counted rather than blocking the request.
+
+High volume events, such as cache hits, go through log_sampled, which keeps
+one record in every LOG_SAMPLE_RATE.
+"""
+
+# Attributes of every LogRecord, anything else was passed in extra
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+_counters = {}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, with its extra fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to the current sys.stdout, even if it was replaced after setup."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves formatting to the listener thread and drops
+    records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # QueueHandler formats the message here, on the logging thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(stream=None):
+    """This function routes the app's loggers through a queue to a background thread
+    writing to stdout, see the module docstring. Calling it again has no effect.
+
+    Args:
+        stream (file, optional): Where records are written. Defaults to sys.stdout.
+
+    Returns:
+        DroppingQueueHandler: The handler installed on the app logger.
+    """
+    global _listener
+    logger = logging.getLogger("app")
+    if _listener is not None:
+        return logger.handlers[0]
+    output = logging.StreamHandler(stream) if stream else StdoutHandler()
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+    handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    logger.addHandler(handler)
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+    # Write out the queued records when the process exits
+    atexit.register(_listener.stop)
+    return handler
+
+
+def log_sampled(logger, level, event, msg, *args):
+    """This function logs one in every LOG_SAMPLE_RATE occurrences of a high volume event.
+
+    The level is checked first, so skipped events cost a counter increment at most.
+    Kept records carry the sample_rate, to scale counts back up.
+
+    Args:
+        logger (Logger): The module logger.
+        level (int): The log level, e.g. logging.DEBUG.
+        event (str): The event name, counted separately from other events.
+        msg (str): The message, with %-style placeholders.
+        *args: The placeholder values, only formatted if the record is kept.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = settings.LOG_SAMPLE_RATE
+    if rate > 1:
+        counter = _counters.get(event)
+        if counter is None:
+            counter = _counters.setdefault(event, itertools.count())
+        if next(counter) % rate:
+            return
+    logger.log(level, msg, *args, extra={"event": event, "sample_rate": rate})
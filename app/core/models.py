@@ -0,0 +1,336 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+"""
+Typed internal models, parsed once from the upstream payloads at the service
+boundary. Slotted dataclasses keep the in-process cache compact, and numeric
+fields are converted once instead of on every request.
+"""
+
+
+def _float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _first(values, default=None):
+    return values[0] if values else default
+
+
+COMPASS_POINTS = (
+    "N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+    "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW",
+)  # fmt: skip
+
+# WMO weather interpretation codes used by Open-Meteo
+WMO_DESCRIPTIONS = {
+    0: "Clear",
+    1: "Mainly clear",
+    2: "Partly cloudy",
+    3: "Overcast",
+    45: "Fog",
+    48: "Freezing fog",
+    51: "Light drizzle",
+    53: "Drizzle",
+    55: "Heavy drizzle",
+    56: "Light freezing drizzle",
+    57: "Freezing drizzle",
+    61: "Light rain",
+    63: "Rain",
+    65: "Heavy rain",
+    66: "Light freezing rain",
+    67: "Freezing rain",
+    71: "Light snow",
+    73: "Snow",
+    75: "Heavy snow",
+    77: "Snow grains",
+    80: "Light rain showers",
+    81: "Rain showers",
+    82: "Heavy rain showers",
+    85: "Light snow showers",
+    86: "Snow showers",
+    95: "Thunderstorm",
+    96: "Thunderstorm with hail",
+    99: "Thunderstorm with heavy hail",
+}
+
+
+def compass_point(degree):
+    """Return the 16-point compass direction of a bearing in degrees, e.g. "SSW"."""
+    if degree is None:
+        return None
+    return COMPASS_POINTS[round(degree / 22.5) % 16]
+
+
+@dataclass(slots=True, frozen=True)
+class Airport:
+    """An airport record from AviationStack."""
+
+    name: str
+    iata: str | None
+    icao: str | None
+    country: str | None
+    country_iso2: str | None
+    timezone: str | None
+    gmt: str | None
+    latitude: float
+    longitude: float
+
+    @classmethod
+    def from_response(cls, airport_info):
+        """This function parses an AviationStack airports response holding one airport.
+
+        Args:
+            airport_info (dict): The decoded AviationStack response.
+
+        Raises:
+            ValueError: If the response does not hold exactly one airport with coordinates.
+
+        Returns:
+            Airport: The parsed airport.
+        """
+        if len(airport_info.get("data") or []) != 1:
+            raise ValueError("Airport response must hold exactly one airport")
+        airport = airport_info["data"][0]
+        latitude = _float(airport.get("latitude"))
+        longitude = _float(airport.get("longitude"))
+        if latitude is None or longitude is None:
+            raise ValueError("Airport response has no valid coordinates")
+        return cls(
+            name=airport.get("airport_name"),
+            iata=airport.get("iata_code"),
+            icao=airport.get("icao_code"),
+            country=airport.get("country_name"),
+            country_iso2=airport.get("country_iso2"),
+            timezone=airport.get("timezone"),
+            gmt=airport.get("gmt"),
+            latitude=latitude,
+            longitude=longitude,
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class WeatherObservation:
+    """A current weather observation, in WeatherStack units (km/h, km, mm, hPa)."""
+
+    city: str | None
+    observation_time: str | None
+    observed_at: int | None  # UNIX time the observation was taken or fetched
+    temperature: float | None
+    wind_speed: float | None
+    wind_degree: float | None
+    wind_dir: str | None
+    pressure: float | None
+    precip: float | None
+    humidity: float | None
+    cloudcover: float | None
+    visibility: float | None
+    description: str | None
+    icon: str | None
+
+    @classmethod
+    def from_response(cls, weather_info):
+        """This function parses a WeatherStack current weather response.
+
+        Args:
+            weather_info (dict): The decoded WeatherStack response.
+
+        Raises:
+            ValueError: If the response holds no current weather.
+
+        Returns:
+            WeatherObservation: The parsed observation.
+        """
+        weather = weather_info.get("current")
+        if not weather:
+            raise ValueError("Weather response holds no current weather")
+        location = weather_info.get("location") or {}
+        return cls(
+            city=location.get("name"),
+            observation_time=weather.get("observation_time"),
+            observed_at=location.get("localtime_epoch"),
+            temperature=weather.get("temperature"),
+            wind_speed=weather.get("wind_speed"),
+            wind_degree=weather.get("wind_degree"),
+            wind_dir=weather.get("wind_dir"),
+            pressure=weather.get("pressure"),
+            precip=weather.get("precip"),
+            humidity=weather.get("humidity"),
+            cloudcover=weather.get("cloudcover"),
+            visibility=weather.get("visibility"),
+            description=_first(weather.get("weather_descriptions")),
+            icon=_first(weather.get("weather_icons")),
+        )
+
+    @classmethod
+    def from_openmeteo(cls, weather_info):
+        """This function parses an Open-Meteo forecast response with current conditions,
+        requested with timeformat=unixtime, into WeatherStack units.
+
+        Open-Meteo reports no place name or icon, so city and icon are None.
+
+        Args:
+            weather_info (dict): The decoded Open-Meteo response.
+
+        Raises:
+            ValueError: If the response holds no current weather.
+
+        Returns:
+            WeatherObservation: The parsed observation.
+        """
+        weather = weather_info.get("current")
+        if not weather:
+            raise ValueError("Weather response holds no current weather")
+        observed_at = weather.get("time")
+        visibility = _float(weather.get("visibility"))
+        return cls(
+            city=None,
+            observation_time=(
+                datetime.fromtimestamp(observed_at, timezone.utc).strftime("%I:%M %p")
+                if observed_at
+                else None
+            ),
+            observed_at=observed_at,
+            temperature=weather.get("temperature_2m"),
+            wind_speed=weather.get("wind_speed_10m"),
+            wind_degree=weather.get("wind_direction_10m"),
+            wind_dir=compass_point(weather.get("wind_direction_10m")),
+            pressure=weather.get("pressure_msl"),
+            precip=weather.get("precipitation"),
+            humidity=weather.get("relative_humidity_2m"),
+            cloudcover=weather.get("cloud_cover"),
+            visibility=visibility / 1000 if visibility is not None else None,
+            description=WMO_DESCRIPTIONS.get(weather.get("weather_code")),
+            icon=None,
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Flight:
+    """A flight's status from AviationStack, with only the fields the API returns."""
+
+    flight_iata: str | None
+    flight_icao: str | None
+    airline: str | None
+    status: str | None
+    date: str | None
+    departure_airport: str | None
+    departure_iata: str | None
+    departure_terminal: str | None
+    departure_gate: str | None
+    departure_scheduled: str | None
+    departure_estimated: str | None
+    departure_actual: str | None
+    departure_delay: int | None  # Minutes
+    arrival_airport: str | None
+    arrival_iata: str | None
+    arrival_terminal: str | None
+    arrival_gate: str | None
+    arrival_scheduled: str | None
+    arrival_estimated: str | None
+    arrival_actual: str | None
+    arrival_delay: int | None
+
+    @classmethod
+    def from_response(cls, flight_info):
+        """This function parses one flight of an AviationStack flights response.
+
+        Args:
+            flight_info (dict): One item of the response's data list.
+
+        Raises:
+            ValueError: If the item is not a flight object.
+
+        Returns:
+            Flight: The parsed flight.
+        """
+        if not isinstance(flight_info, dict):
+            raise ValueError("Flight must be an object")
+        flight = flight_info.get("flight") or {}
+        departure = flight_info.get("departure") or {}
+        arrival = flight_info.get("arrival") or {}
+        return cls(
+            flight_iata=flight.get("iata"),
+            flight_icao=flight.get("icao"),
+            airline=(flight_info.get("airline") or {}).get("name"),
+            status=flight_info.get("flight_status"),
+            date=flight_info.get("flight_date"),
+            departure_airport=departure.get("airport"),
+            departure_iata=departure.get("iata"),
+            departure_terminal=departure.get("terminal"),
+            departure_gate=departure.get("gate"),
+            departure_scheduled=departure.get("scheduled"),
+            departure_estimated=departure.get("estimated"),
+            departure_actual=departure.get("actual"),
+            departure_delay=departure.get("delay"),
+            arrival_airport=arrival.get("airport"),
+            arrival_iata=arrival.get("iata"),
+            arrival_terminal=arrival.get("terminal"),
+            arrival_gate=arrival.get("gate"),
+            arrival_scheduled=arrival.get("scheduled"),
+            arrival_estimated=arrival.get("estimated"),
+            arrival_actual=arrival.get("actual"),
+            arrival_delay=arrival.get("delay"),
+        )
+
+
+@dataclass(slots=True)
+class AirportProfile:
+    """An airport profile, the airport with its current weather and traffic."""
+
+    airport: Airport
+    weather: WeatherObservation
+    utc_time: datetime
+    local_time: datetime | None
+    dew_point: int | None
+    windspeed_knots: int | None
+    visibility_mi: int | None
+    pressure_inhg: float | None
+    cloud_cover_okta: int | None
+    weather_rating: int | None
+    traffic: dict
+
+    def to_dict(self):
+        """This function renders the profile in the /airport response format.
+
+        Returns:
+            dict: A dictionary containing the airport profile and current weather information.
+        """
+        airport, weather = self.airport, self.weather
+        return {
+            "airport_profile": {
+                "name": airport.name,
+                "iata": airport.iata,
+                "icao": airport.icao,
+                "city": weather.city,
+                "country": airport.country,
+                "current_time_utc": self.utc_time.strftime("%H:%M"),
+                "current_time_local": (
+                    self.local_time.strftime("%H:%M") if self.local_time else None
+                ),
+                "timezone": airport.timezone,
+            },
+            "weather_info": {
+                "observation_time": weather.observation_time,
+                "wind_direction": weather.wind_dir,
+                "wind_speed_km": weather.wind_speed,
+                "windspeed_knots": self.windspeed_knots,
+                "wind_degree": weather.wind_degree,
+                "temperature": weather.temperature,
+                "dew_point": self.dew_point,
+                "precipitation_mm": weather.precip,
+                "visibility_km": weather.visibility,
+                "visibility_mi": self.visibility_mi,
+                "cloud_cover_percent": weather.cloudcover,
+                "cloud_cover_okta": self.cloud_cover_okta,
+                "description": weather.description,
+                "weather_icon": weather.icon,
+                "pressure_hpa": weather.pressure,
+                "pressure_inhg": self.pressure_inhg,
+                "humidity": weather.humidity,
+                "weather_rating": self.weather_rating,
+            },
+            "traffic_info": self.traffic,
+        }
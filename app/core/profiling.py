@@ -0,0 +1,241 @@
+import cProfile
+import contextvars
+import functools
+import hmac
+import io
+import itertools
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from app.core.config import settings
+
+"""
+On-demand request profiling, only installed when settings.DEBUG is enabled.
+
+A request is profiled when it carries the PROFILE_HEADER header along with the
+ADMIN_API_KEY in the X-Admin-Key header, or when it is one of every
+PROFILE_SAMPLE_RATE requests. Each profile holds either a
+statistical profile (folded stacks, flamegraph compatible) or cProfile stats,
+plus a tracemalloc snapshot of the allocations made during the request.
+"""
+
+PROFILE_HEADER = "X-Debug-Profile"
+ADMIN_HEADER = "X-Admin-Key"
+PROFILE_MODES = ("sample", "cprofile")
+
+# Finished profiles, oldest dropped first
+profiles = deque(maxlen=settings.PROFILE_RING_SIZE)
+
+_current = contextvars.ContextVar("request_profile", default=None)
+_ids = itertools.count(1)
+_requests = itertools.count(1)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+# Only one cProfile profiler can be active at a time, concurrent requests are sampled instead
+_cprofile_lock = threading.Lock()
+# From Python 3.12 cProfile covers every thread, before that only the thread enabling it
+_CPROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+def should_profile(headers):
+    """This function decides whether a request is profiled and in which mode.
+
+    Args:
+        headers (Mapping): The request headers.
+
+    Returns:
+        str or None: The profile mode, or None if the request is not profiled.
+    """
+    requested = headers.get(PROFILE_HEADER)
+    if requested and _is_admin(headers):
+        return requested if requested in PROFILE_MODES else settings.PROFILE_MODE
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate > 0 and next(_requests) % rate == 0:
+        return settings.PROFILE_MODE
+    return None
+
+
+def _is_admin(headers):
+    # Profiles expose stacks, source paths and allocations, only admins may ask for one
+    admin_key = settings.ADMIN_API_KEY
+    return bool(admin_key) and hmac.compare_digest(
+        headers.get(ADMIN_HEADER, ""), admin_key
+    )
+
+
+def get_profile(profile_id):
+    """This function returns a finished profile from the ring, or None if it was dropped."""
+    return next((p for p in profiles if p["id"] == profile_id), None)
+
+
+def to_folded(profile):
+    """This function renders a profile's stacks in the folded format read by
+    flamegraph.pl, speedscope and inferno: one "frame;frame;frame count" line per stack.
+    """
+    return "\n".join(f"{stack} {count}" for stack, count in profile["stacks"]) + "\n"
+
+
+class RequestProfile:
+    """Profile of one request, possibly spanning several threads.
+
+    The thread running the middleware is attached on start. Threads running the
+    request handler attach through the profiled decorator.
+    """
+
+    def __init__(self, path, mode):
+        self.id = next(_ids)
+        self.path = path
+        self.mode = mode
+        self.threads = set()
+        self.stacks = Counter()
+        self._profilers = {}
+        self._running = False
+        self._sampler = None
+
+    def start(self):
+        global _tracemalloc_users
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracemalloc_users += 1
+        if self.mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            self.mode = "sample"
+        self._started = time.perf_counter()
+        self._started_at = time.time()
+        self._running = True
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return _current.set(self)
+
+    def attach(self):
+        """Include the current thread in the profile until detach is called."""
+        thread_id = threading.get_ident()
+        self.threads.add(thread_id)
+        if self.mode == "cprofile" and not (_CPROFILE_ALL_THREADS and self._profilers):
+            profiler = self._profilers[thread_id] = cProfile.Profile()
+            profiler.enable()
+        return thread_id
+
+    def detach(self, thread_id):
+        self.threads.discard(thread_id)
+        if thread_id in self._profilers:
+            self._profilers[thread_id].disable()
+
+    def stop(self, token, status_code):
+        global _tracemalloc_users
+        _current.reset(token)
+        self._running = False
+        duration = time.perf_counter() - self._started
+        if self._sampler is not None:
+            self._sampler.join()
+        if self.mode == "cprofile":
+            _cprofile_lock.release()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+
+        profile = {
+            "id": self.id,
+            "path": self.path,
+            "mode": self.mode,
+            "status_code": status_code,
+            "started_at": self._started_at,
+            "duration_ms": round(duration * 1000, 2),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "allocations": [
+                {
+                    "location": str(stat.traceback[0]),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                }
+                for stat in snapshot.statistics("lineno")[:20]
+            ],
+            "stacks": self.stacks.most_common(),
+            "stats": self._cprofile_stats(),
+        }
+        profiles.append(profile)
+        return profile
+
+    def _sample(self):
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        while self._running:
+            frames = sys._current_frames()
+            for thread_id in list(self.threads):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+
+    def _cprofile_stats(self):
+        if not self._profilers:
+            return None
+        output = io.StringIO()
+        stats = None
+        for profiler in self._profilers.values():
+            if stats is None:
+                stats = pstats.Stats(profiler, stream=output)
+            else:
+                stats.add(profiler)
+        stats.sort_stats("cumulative").print_stats(30)
+        return output.getvalue()
+
+
+def profiled(func):
+    """Decorator attaching the thread running func to the active request profile.
+
+    Without settings.DEBUG the function is returned unchanged, so there is no
+    overhead when profiling is disabled.
+    """
+    if not settings.DEBUG:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or threading.get_ident() in profile.threads:
+            return func(*args, **kwargs)
+        thread_id = profile.attach()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.detach(thread_id)
+
+    return wrapper
+
+
+async def profile_requests(request, call_next):
+    """HTTP middleware profiling the requests selected by should_profile."""
+    mode = should_profile(request.headers)
+    if mode is None:
+        return await call_next(request)
+    profile = RequestProfile(request.url.path, mode)
+    token = profile.start()
+    thread_id = profile.attach()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers[PROFILE_HEADER + "-Id"] = str(profile.id)
+        return response
+    finally:
+        profile.detach(thread_id)
+        profile.stop(token, status_code)
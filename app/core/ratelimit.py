@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import math
+import time
+import redis
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.cache import redis_client, LocalCache
+
+"""
+Per-client rate limiting, by API key or else by IP address.
+
+Each client has a sliding window counter in Redis, checked and incremented by
+one Lua script call per request. Clients that are over their limit are
+remembered in-process until they may retry, so their requests are rejected
+without reaching Redis.
+"""
+
+logger = logging.getLogger(__name__)
+
+API_KEY_HEADER = "X-API-Key"
+EXEMPT_PATHS = {"/"}  # Health checks are never limited
+
+# Sliding window counter, the previous window's count is weighted by the share
+# of it still inside the sliding window. TIME is read in the script so every
+# worker agrees on the window.
+# KEYS[1] = the client's counters
+# ARGV[1] = requests allowed per window, ARGV[2] = window in milliseconds
+# Returns {allowed, remaining, milliseconds until the window resets,
+#          milliseconds until a rejected request may retry}
+_SLIDING_WINDOW_SCRIPT = r"""
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local index = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'window', 'current', 'previous')
+local stored = tonumber(state[1])
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if stored ~= index then
+    if stored == index - 1 then previous = current else previous = 0 end
+    current = 0
+end
+local reset = window - (now - index * window)
+local used = previous * reset / window + current
+if used + 1 > limit then
+    local retry
+    if current + 1 <= limit then
+        retry = reset - (limit - current - 1) * window / previous
+    else
+        retry = reset + math.max(window - (limit - 1) * window / current, 0)
+    end
+    return {0, 0, reset, math.ceil(retry)}
+end
+current = current + 1
+redis.call('HSET', KEYS[1], 'window', index, 'current', current, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.floor(limit - used - 1), reset, 0}
+"""
+_sliding_window = redis_client.register_script(_SLIDING_WINDOW_SCRIPT)
+
+# Clients known to be over their limit, mapped to the time they may retry
+_blocked = LocalCache(settings.RATE_LIMIT_LOCAL_SIZE)
+
+
+def parse_tier(tier):
+    """This function parses a rate limit tier.
+
+    Args:
+        tier (str): "{requests}/{seconds}", e.g. "60/60" for 60 requests a minute.
+
+    Raises:
+        ValueError: If the tier is not two positive integers.
+
+    Returns:
+        tuple: The requests allowed per window and the window in seconds.
+    """
+    requests_, _, seconds = tier.partition("/")
+    if not (requests_.isdigit() and seconds.isdigit()) or not (
+        int(requests_) and int(seconds)
+    ):
+        raise ValueError(f"Rate limit tier must be requests/seconds, got {tier!r}")
+    return int(requests_), int(seconds)
+
+
+# Parsed once, so a misconfigured tier fails at startup
+TIERS = {name: parse_tier(tier) for name, tier in settings.RATE_LIMIT_TIERS.items()}
+if "anonymous" not in TIERS:
+    raise ValueError("RATE_LIMIT_TIERS must define the anonymous tier")
+for api_key_tier in settings.RATE_LIMIT_API_KEYS.values():
+    if api_key_tier not in TIERS:
+        raise ValueError(f"RATE_LIMIT_API_KEYS uses an unknown tier {api_key_tier!r}")
+
+
+def get_client(request):
+    """This function identifies the client of a request and its rate limit tier.
+
+    Clients sending a known API key are limited per key, with the key's tier.
+    Everyone else is limited per IP address with the anonymous tier, so unknown
+    keys cannot be used to dodge the limit.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        tuple: The client id and the name of its tier.
+    """
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and api_key in settings.RATE_LIMIT_API_KEYS:
+        digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        return f"key:{digest}", settings.RATE_LIMIT_API_KEYS[api_key]
+    forwarded = request.headers.get("X-Forwarded-For")
+    if settings.RATE_LIMIT_TRUST_FORWARDED and forwarded:
+        ip = forwarded.split(",")[0].strip()
+    else:
+        ip = request.client.host if request.client else "unknown"
+    return f"ip:{ip}", "anonymous"
+
+
+def check_rate_limit(client, limit, window):
+    """This function counts one request against a client's sliding window, in one
+    Redis round trip.
+
+    Args:
+        client (str): The client id, see get_client.
+        limit (int): Requests allowed per window.
+        window (int): Window length in seconds.
+
+    Raises:
+        RedisError: If Redis cannot be reached.
+
+    Returns:
+        tuple: Whether the request is allowed, the requests remaining, seconds until
+        the window resets and seconds until a rejected client may retry.
+    """
+    allowed, remaining, reset_ms, retry_ms = _sliding_window(
+        keys=[f"ratelimit:{{{client}}}"], args=[limit, window * 1000]
+    )
+    return bool(allowed), remaining, math.ceil(reset_ms / 1000), retry_ms / 1000
+
+
+def rate_limit_headers(limit, window, remaining, reset):
+    return {
+        "RateLimit-Limit": str(limit),
+        "RateLimit-Remaining": str(max(remaining, 0)),
+        "RateLimit-Reset": str(reset),
+        "RateLimit-Policy": f"{limit};w={window}",
+    }
+
+
+def too_many_requests(limit, window, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    headers = rate_limit_headers(limit, window, 0, retry_after)
+    headers["Retry-After"] = str(retry_after)
+    return JSONResponse(
+        status_code=429, content={"detail": "Rate limit exceeded"}, headers=headers
+    )
+
+
+async def limit_requests(request, call_next):
+    """HTTP middleware rejecting clients over their rate limit with a 429, and adding
+    the RateLimit-* headers to every limited response.
+
+    Requests are let through if Redis cannot be reached.
+    """
+    if request.url.path in EXEMPT_PATHS:
+        return await call_next(request)
+    client, tier = get_client(request)
+    limit, window = TIERS[tier]
+
+    retry_at = _blocked.get(client)
+    if retry_at is not None:
+        return too_many_requests(limit, window, retry_at - time.time())
+
+    try:
+        allowed, remaining, reset, retry_after = await run_in_threadpool(
+            check_rate_limit, client, limit, window
+        )
+    except redis.RedisError as e:
+        logger.error("Error checking rate limit: %s", e)
+        return await call_next(request)
+
+    if not allowed:
+        _blocked.set(client, time.time() + retry_after, retry_after)
+        return too_many_requests(limit, window, retry_after)
+    response = await call_next(request)
+    response.headers.update(rate_limit_headers(limit, window, remaining, reset))
+    return response
@@ -0,0 +1,213 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from app.core.config import settings
+
+"""
+Per-request stage timings, reported in the Server-Timing response header and
+optionally exported as OpenTelemetry spans.
+
+Set TRACE_EXPORTER to "file" to append spans to TRACE_FILE as OTLP JSON lines,
+which an OpenTelemetry collector can ingest with its otlpjsonfile receiver, or
+to "otel" to record them through the opentelemetry API when it is installed.
+"""
+
+logger = logging.getLogger(__name__)
+
+STAGES = {
+    "lookup_cache": "Airport and weather cache lookup",
+    "airport_cache": "Airport cache lookup",
+    "aviationstack": "AviationStack fetch",
+    "weather_cache": "Weather cache lookup",
+    "weatherstack": "WeatherStack fetch",
+    "openmeteo": "Open-Meteo fetch",
+    "traffic_cache": "Traffic counters lookup",
+    "flights_cache": "Flights page cache lookup",
+    "profile": "Profile generation",
+}
+
+_trace = contextvars.ContextVar("request_trace", default=None)
+_exports = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+
+_tracer = None
+if settings.TRACE_EXPORTER == "otel":
+    try:
+        from opentelemetry import trace as otel_trace
+
+        _tracer = otel_trace.get_tracer("clearflight")
+    except ImportError:
+        logger.warning("TRACE_EXPORTER is otel but opentelemetry is not installed")
+
+
+class RequestTrace:
+    """Stage durations and spans recorded for one request."""
+
+    def __init__(self, name, traceparent=None):
+        self.name = name
+        self.trace_id, self.parent_span_id = _parse_traceparent(traceparent)
+        self.trace_id = self.trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.durations = {}
+        self.spans = []
+
+    def record(self, name, start_ns, end_ns):
+        duration = (end_ns - start_ns) / 1e6
+        self.durations[name] = self.durations.get(name, 0) + duration
+        if settings.TRACE_EXPORTER == "file":
+            self.spans.append(
+                _otlp_span(
+                    name,
+                    self.trace_id,
+                    os.urandom(8).hex(),
+                    self.span_id,
+                    start_ns,
+                    end_ns,
+                )
+            )
+
+    def server_timing(self):
+        """Render the recorded stages as a Server-Timing header value."""
+        return ", ".join(
+            f'{name};dur={duration:.2f};desc="{STAGES.get(name, name)}"'
+            for name, duration in self.durations.items()
+        )
+
+
+@contextmanager
+def stage(name):
+    """Context manager timing one stage of the current request.
+
+    Outside of a request, or for stages running in threads that did not inherit
+    the request context, it does nothing beyond the wrapped code.
+
+    Args:
+        name (str): The stage name, one of STAGES.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start_ns = time.time_ns()
+    if _tracer is not None:
+        with _tracer.start_as_current_span(name):
+            try:
+                yield
+            finally:
+                trace.record(name, start_ns, time.time_ns())
+    else:
+        try:
+            yield
+        finally:
+            trace.record(name, start_ns, time.time_ns())
+
+
+async def time_requests(request, call_next):
+    """HTTP middleware adding the Server-Timing header and exporting the request spans."""
+    trace = RequestTrace(
+        f"{request.method} {request.url.path}", request.headers.get("traceparent")
+    )
+    token = _trace.set(trace)
+    try:
+        if _tracer is not None:
+            with _tracer.start_as_current_span(trace.name):
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+    finally:
+        _trace.reset(token)
+    if trace.durations:
+        response.headers["Server-Timing"] = trace.server_timing()
+    if settings.TRACE_EXPORTER == "file":
+        root = _otlp_span(
+            trace.name,
+            trace.trace_id,
+            trace.span_id,
+            trace.parent_span_id,
+            trace.start_ns,
+            time.time_ns(),
+            kind=2,  # SERVER
+        )
+        root["attributes"].append(
+            {
+                "key": "http.status_code",
+                "value": {"intValue": str(response.status_code)},
+            }
+        )
+        export_spans([root] + trace.spans)
+    return response
+
+
+def export_spans(spans):
+    """This function queues spans to be appended to TRACE_FILE by a background thread,
+    so the request never waits on file I/O.
+
+    Args:
+        spans (list): Spans in OTLP JSON format.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_spans, daemon=True)
+            _writer.start()
+    _exports.put(spans)
+
+
+def _write_spans():
+    while True:
+        spans = _exports.get()
+        line = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "clearflight-api"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "clearflight"}, "spans": spans}],
+                }
+            ]
+        }
+        try:
+            with open(settings.TRACE_FILE, "a") as trace_file:
+                trace_file.write(json.dumps(line) + "\n")
+        except OSError as e:
+            logger.error("Error exporting spans: %s", e)
+
+
+def _otlp_span(name, trace_id, span_id, parent_span_id, start_ns, end_ns, kind=1):
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": kind,  # 1 = INTERNAL, 2 = SERVER
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [],
+    }
+    if parent_span_id:
+        span["parentSpanId"] = parent_span_id
+    return span
+
+
+def _parse_traceparent(traceparent):
+    """Return the trace and parent span ids of a W3C traceparent header, or Nones if it is invalid."""
+    parts = (traceparent or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        if int(parts[1], 16) and int(parts[2], 16):
+            return parts[1], parts[2]
+    except ValueError:
+        pass
+    return None, None
@@ -1,11 +1,14 @@
 import math
 import logging
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timezone, timedelta
 
 """
 Utility calculators for various metrics.
 """
 
+logger = logging.getLogger(__name__)
+
 
 def weather_risk_calc(okta, precipitation, windspeed, visibility):
     """This function calculates weather risk index (0 = no risk, 10 = severe).
@@ -32,69 +35,271 @@ def weather_risk_calc(okta, precipitation, windspeed, visibility):
     Returns:
         int: Weather risk index from 0 to 10.
     """
+    try:
+        components = weather_risk_components(okta, precipitation, windspeed, visibility)
+        weather_risk = weather_risk_weighted_sum(components)
+        logger.debug(
+            "Calculated weather risk %s from okta %s, precipitation %s mm/hr, "
+            "wind speed %s km/h, visibility %s km",
+            weather_risk,
+            okta,
+            precipitation,
+            windspeed,
+            visibility,
+        )
+
+        return round(weather_risk)
+
+    except Exception as e:
+        logger.error("Error calculating weather risk: %s", e)
+        return None
+
+
+def weather_risk_components(okta, precipitation, windspeed, visibility):
+    """This function calculates the individual weather risk components, each on a 0-10 scale.
+
+    Args:
+        okta (int or float): Cloud cover in okta (0-8).
+        precipitation (int or float): Precipitation in mm/hr.
+        windspeed (int or float): Wind speed in km/h.
+        visibility (int or float): Visibility in km.
+
+    Raises:
+        ValueError: If any parameter is not a non-negative number or okta is above 8.
+
+    Returns:
+        dict: The cloud, precipitation, wind and visibility risks.
+    """
+    # Validate inputs
+    # All parameters must be int or float and non-negative
+    if not all(
+        isinstance(param, (int, float)) and param >= 0
+        for param in [okta, precipitation, windspeed, visibility]
+    ):
+        raise ValueError("All parameters must be non-negative numbers")
+    if not (0 <= okta <= 8):
+        raise ValueError("Okta must be between 0 and 8")
+
+    # cloud risk calculation
+    cloud_risk = round((okta / 8) * 10)  # Okta scale is 0-8
+
+    # precipitation risk calculation
+    precip_calc = 4 * math.log(1 + precipitation)
+    precip_risk = min(10, precip_calc)
+
+    # wind risk calculation
+    if windspeed <= 10:
+        wind_risk = 0
+    elif windspeed <= 30:
+        wind_risk = 3
+    elif windspeed <= 50:
+        wind_risk = 7
+    else:  # > 50 km/h
+        wind_risk = 10
+
+    # visibility risk calculation
+    if visibility >= 10:
+        visibility_risk = 0
+    elif visibility >= 6:
+        visibility_risk = 3
+    elif visibility >= 2:
+        visibility_risk = 6
+    else:  # < 2 km
+        visibility_risk = 10
+
+    return {
+        "cloud_risk": cloud_risk,
+        "precip_risk": precip_risk,
+        "wind_risk": wind_risk,
+        "visibility_risk": visibility_risk,
+    }
+
+
+def weather_risk_weighted_sum(components):
+    """This function combines weather risk components into the weighted risk index.
+
+    Args:
+        components (dict): The components returned by weather_risk_components.
+
+    Returns:
+        float: The unrounded weather risk index.
+    """
+    return (
+        (components["cloud_risk"] * 0.2)
+        + (components["precip_risk"] * 0.3)
+        + (components["wind_risk"] * 0.3)
+        + (components["visibility_risk"] * 0.2)
+    )
+
+
+def weather_risk_batch(observations):
+    """This function calculates the weather risk index for many observations at once.
+
+    It applies the same scale as weather_risk_calc but skips per-observation logging,
+    which dominates the cost when scoring thousands of airports.
+
+    Args:
+        observations (list): A list of (okta, precipitation, windspeed, visibility) tuples.
+
+    Returns:
+        list: A (risk, components) tuple per observation, in the same order.
+        Both are None for observations with invalid inputs.
+    """
+    results = []
+    invalid = 0
+    for observation in observations:
+        try:
+            components = weather_risk_components(*observation)
+            results.append((round(weather_risk_weighted_sum(components)), components))
+        except (TypeError, ValueError):
+            invalid += 1
+            results.append((None, None))
+    logger.debug(
+        "Calculated weather risk for %d observations, %d invalid",
+        len(observations),
+        invalid,
+    )
+    return results
+
+
+# Step tables of weather_risk_components, for the columnar calculators
+WIND_LIMITS = (10, 30, 50)  # Upper bounds in km/h, inclusive
+WIND_RISKS = (0, 3, 7, 10)
+VISIBILITY_LIMITS = (2, 6, 10)  # Lower bounds in km, inclusive
+VISIBILITY_RISKS = (10, 6, 3, 0)
+
+
+def _valid_number(value):
+    return isinstance(value, (int, float)) and value >= 0
+
+
+def okta_columns(cloud_covers):
+    """This function converts a column of cloud cover percentages to okta, like okta_calc.
+
+    Args:
+        cloud_covers (list): Cloud cover percentages (0-100).
+
+    Returns:
+        list: Cloud cover in okta (0-8), None for invalid values.
+    """
+    return [
+        (
+            round(cover * 0.08)
+            if isinstance(cover, (int, float)) and 0 <= cover <= 100
+            else None
+        )
+        for cover in cloud_covers
+    ]
+
+
+def weather_risk_columns(okta, precipitation, windspeed, visibility):
+    """This function calculates the weather risk index and its components for columns
+    of observations, with the same scale as weather_risk_calc.
+
+    Each component is computed for a whole column at once, with the step
+    thresholds looked up by bisection, instead of validating and building a
+    dictionary per observation.
+
+    Args:
+        okta (list): Cloud cover in okta (0-8).
+        precipitation (list): Precipitation in mm/hr.
+        windspeed (list): Wind speed in km/h.
+        visibility (list): Visibility in km.
+
+    Returns:
+        dict: Columns of weather_rating, cloud_risk, precip_risk, wind_risk and
+        visibility_risk, in the order of the input. Every column is None at
+        observations with invalid inputs.
+    """
+    valid = [
+        _valid_number(o) and o <= 8 and _valid_number(p)
+        and _valid_number(w) and _valid_number(v)
+        for o, p, w, v in zip(okta, precipitation, windspeed, visibility)
+    ]  # fmt: skip
+    cloud = [round(o / 8 * 10) if ok else None for o, ok in zip(okta, valid)]
+    precip = [
+        min(10, 4 * math.log(1 + p)) if ok else None
+        for p, ok in zip(precipitation, valid)
+    ]
+    wind = [
+        WIND_RISKS[bisect_left(WIND_LIMITS, w)] if ok else None
+        for w, ok in zip(windspeed, valid)
+    ]
+    vis = [
+        VISIBILITY_RISKS[bisect_right(VISIBILITY_LIMITS, v)] if ok else None
+        for v, ok in zip(visibility, valid)
+    ]
+    rating = [
+        round(c * 0.2 + p * 0.3 + w * 0.3 + v * 0.2) if ok else None
+        for c, p, w, v, ok in zip(cloud, precip, wind, vis, valid)
+    ]
+    return {
+        "weather_rating": rating,
+        "cloud_risk": cloud,
+        "precip_risk": precip,
+        "wind_risk": wind,
+        "visibility_risk": vis,
+    }
+
+
+def traffic_risk_calc(movements, delay_ratio):
+    """This function calculates traffic risk index (0 = no risk, 10 = severe).
+
+    Factors:
+    - Movements (arrivals + departures) in the current 15 minute window
+    - Delay ratio (share of recent flights delayed by more than 15 minutes)
+    All factors are normalized to a 0-10 scale.
+
+    Weights:
+    - Movements = 40%
+    - Delays = 60%
+
+    Args:
+        movements (int): Scheduled arrivals and departures per 15 minutes.
+        delay_ratio (int or float): Ratio of delayed flights (0-1).
+
+    Returns:
+        int: Traffic risk index from 0 to 10.
+    """
     try:
         # Validate inputs
-        # All parameters must be int or float and non-negative
         if not all(
             isinstance(param, (int, float)) and param >= 0
-            for param in [okta, precipitation, windspeed, visibility]
+            for param in [movements, delay_ratio]
         ):
             raise ValueError("All parameters must be non-negative numbers")
-        if not (0 <= okta <= 8):
-            raise ValueError("Okta must be between 0 and 8")
-
-        # cloud risk calculation
-        cloud_risk = round((okta / 8) * 10)  # Okta scale is 0-8
-        logging.info(f"Cloud cover (okta): {okta}")
-
-        # precipitation risk calculation
-        precip_calc = 4 * math.log(1 + precipitation)
-        precip_risk = min(10, precip_calc)
-        logging.info(f"Precipitation: {precipitation} mm/hr")
-
-        # wind risk calculation
-        if windspeed <= 10:
-            wind_risk = 0
-        elif windspeed <= 30:
-            wind_risk = 3
-        elif windspeed <= 50:
-            wind_risk = 7
-        else:  # > 50 km/h
-            wind_risk = 10
-        logging.info(f"Wind speed: {windspeed} km/h")
-
-        # visibility risk calculation
-        if visibility >= 10:
-            visibility_risk = 0
-        elif visibility >= 6:
-            visibility_risk = 3
-        elif visibility >= 2:
-            visibility_risk = 6
-        else:  # < 2 km
-            visibility_risk = 10
-        logging.info(f"Visibility: {visibility} km")
+        if delay_ratio > 1:
+            raise ValueError("Delay ratio must be between 0 and 1")
+
+        # congestion risk calculation
+        if movements <= 10:
+            movement_risk = 0
+        elif movements <= 25:
+            movement_risk = 3
+        elif movements <= 50:
+            movement_risk = 7
+        else:  # > 50 movements per 15 minutes
+            movement_risk = 10
+
+        # delay risk calculation
+        delay_risk = delay_ratio * 10
 
         # Weighted sum
-        weather_risk = (
-            (cloud_risk * 0.2)
-            + (precip_risk * 0.3)
-            + (wind_risk * 0.3)
-            + (visibility_risk * 0.2)
+        traffic_risk = (movement_risk * 0.4) + (delay_risk * 0.6)
+        logger.debug(
+            "Calculated traffic risk %s from %s movements per 15 min, delay ratio %s",
+            traffic_risk,
+            movements,
+            delay_ratio,
         )
-        logging.info(f"Calculated weather risk: {weather_risk}")
 
-        return round(weather_risk)
+        return round(traffic_risk)
 
     except Exception as e:
-        logging.error(f"Error calculating weather risk: {e}")
+        logger.error("Error calculating traffic risk: %s", e)
         return None
 
 
-def traffic_risk_calc():
-    # TODO: Implement traffic risk calculation
-    pass
-
-
 def okta_calc(cloud_cover):
     """This function converts cloud cover percentage to okta scale (0-8).
 
@@ -111,10 +316,10 @@ def okta_calc(cloud_cover):
             raise ValueError("Cloud cover must be between 0 and 100")
 
         okta = round(cloud_cover * 0.08)
-        logging.info(f"Calculated okta: {okta} from cloud cover: {cloud_cover}%")
+        logger.debug("Calculated okta %s from cloud cover %s%%", okta, cloud_cover)
         return okta
     except Exception as e:
-        logging.error(f"Error calculating okta: {e}")
+        logger.error("Error calculating okta: %s", e)
         return None
 
 
@@ -147,7 +352,7 @@ def dew_point_calc(temperature, humidity):
         dewpoint = round(temperature - ((100 - humidity) / 5))
         return dewpoint
     except Exception as e:
-        logging.error(f"Error calculating dew point: {e}")
+        logger.error("Error calculating dew point: %s", e)
         return None
 
 
@@ -177,7 +382,7 @@ def local_time_calc(utc_offset):
             local_time = current_utc.astimezone(tz_offset)
             return current_utc, local_time
     except Exception as e:
-        logging.error(f"Error calculating local time: {e}")
+        logger.error("Error calculating local time: %s", e)
         return current_utc, None  # Fallback to UTC if error
 
 
@@ -193,7 +398,7 @@ def pressure_inhg_calc(pressure_hpa: int | float):
     try:
         return round(pressure_hpa * 0.02953, 2)
     except Exception as e:
-        logging.error(f"Error converting pressure: {e}")
+        logger.error("Error converting pressure: %s", e)
         return None
 
 
@@ -209,7 +414,7 @@ def visibility_mi_calc(visibility_km: int):
     try:
         return round(visibility_km * 0.621371)
     except Exception as e:
-        logging.error(f"Error converting visibility: {e}")
+        logger.error("Error converting visibility: %s", e)
         return None
 
 
@@ -225,5 +430,5 @@ def windspeed_knots_calc(windspeed_kmh):
     try:
         return round(windspeed_kmh * 0.539957)
     except Exception as e:
-        logging.error(f"Error converting wind speed: {e}")
+        logger.error("Error converting wind speed: %s", e)
         return None
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from app.core.config import settings
+
+"""
+Event loop watchdog.
+
+A heartbeat task sleeps for LOOP_WATCHDOG_INTERVAL_MS at a time and records
+how late it wakes up, which is the time the loop spent running other
+callbacks. Percentiles of this lag are reported by GET /admin/loop.
+
+A monitor thread checks that the heartbeat keeps beating. When the loop has
+been blocked for longer than LOOP_WATCHDOG_THRESHOLD_MS, it captures the stack
+of the loop thread, which is the code blocking it, e.g. a sync Redis or HTTP
+call inside an async endpoint. At most one stack is kept per
+LOOP_WATCHDOG_REPORT_INTERVAL seconds, in a ring of LOOP_WATCHDOG_REPORTS.
+"""
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAMES = 40  # Innermost frames kept per stack
+
+
+def format_stack(frame):
+    """This function renders a frame and its callers, outermost first.
+
+    Args:
+        frame (frame): The innermost frame.
+
+    Returns:
+        list: "function (file:line)" per frame, at most MAX_FRAMES innermost ones.
+    """
+    stack = []
+    while frame is not None and len(stack) < MAX_FRAMES:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return stack[::-1]
+
+
+def percentile(ordered, fraction):
+    """Return the value at a fraction (0-1) of an ordered list, or None if it is empty."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoopWatchdog:
+    """Measures the lag of one event loop and reports what blocks it."""
+
+    def __init__(self, interval, threshold, samples, reports, report_interval):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self.lags = deque(maxlen=samples)
+        self.reports = deque(maxlen=reports)
+        self.blocked = 0  # Heartbeats later than the threshold
+        self.suppressed = 0  # Blocks not reported because of the rate limit
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._beat = None  # When the heartbeat last ran
+        self._captured_beat = None  # The beat whose block was already handled
+        self._pending = None  # Report of the block in progress
+        self._last_report = None
+        self._loop_thread = None
+        self._running = False
+        self._task = None
+        self._monitor = None
+
+    def start(self):
+        """Start the heartbeat on the running event loop and the monitor thread."""
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._monitor = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._monitor.start()
+
+    def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record(self, lag):
+        """Record how late the heartbeat woke up, closing the report of a block."""
+        self.lags.append(lag)
+        if lag < self.threshold:
+            return
+        with self._lock:
+            self.blocked += 1
+            if self._pending is not None:
+                self._pending["blocked_ms"] = round(lag * 1000, 1)
+                self._pending = None
+
+    def stats(self):
+        """Lag percentiles over the recent samples, block counts and the kept reports.
+
+        Returns:
+            dict: The watchdog metrics, in milliseconds.
+        """
+        lags = sorted(self.lags)
+        with self._lock:
+            reports = list(reversed(self.reports))
+        return {
+            "interval_ms": round(self.interval * 1000),
+            "threshold_ms": round(self.threshold * 1000),
+            "samples": len(lags),
+            "lag_ms": {
+                name: round(value * 1000, 1) if value is not None else None
+                for name, value in (
+                    ("p50", percentile(lags, 0.5)),
+                    ("p95", percentile(lags, 0.95)),
+                    ("p99", percentile(lags, 0.99)),
+                    ("max", lags[-1] if lags else None),
+                )
+            },
+            "blocked": self.blocked,
+            "suppressed": self.suppressed,
+            "reports": reports,
+        }
+
+    async def _heartbeat(self):
+        self._loop_thread = threading.get_ident()
+        while self._running:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - self._beat - self.interval))
+
+    def _watch(self):
+        check_every = min(self.interval, self.threshold) / 2
+        while self._running:
+            time.sleep(check_every)
+            beat = self._beat
+            if beat is None or beat == self._captured_beat:
+                continue
+            stalled = time.perf_counter() - beat - self.interval
+            if stalled >= self.threshold:
+                self._captured_beat = beat
+                self._capture(beat, stalled)
+
+    def _capture(self, beat, stalled):
+        now = time.time()
+        with self._lock:
+            if (
+                self._last_report is not None
+                and now - self._last_report < self.report_interval
+            ):
+                self.suppressed += 1
+                return
+            frame = sys._current_frames().get(self._loop_thread)
+            if self._beat != beat:
+                return  # The loop ran again meanwhile, the stack would be wrong
+            self._last_report = now
+            report = {
+                "id": next(self._ids),
+                "at": now,
+                "blocked_ms": round(stalled * 1000, 1),  # Updated once the loop runs
+                "stack": format_stack(frame),
+            }
+            self.reports.append(report)
+            self._pending = report
+        where = report["stack"][-1] if report["stack"] else "unknown"
+        logger.warning(
+            "Event loop blocked for over %sms in %s",
+            report["blocked_ms"],
+            where,
+            extra={"stack": report["stack"]},
+        )
+
+
+# The watchdog of this worker's event loop, started by the app lifespan
+watchdog = LoopWatchdog(
+    settings.LOOP_WATCHDOG_INTERVAL_MS / 1000,
+    settings.LOOP_WATCHDOG_THRESHOLD_MS / 1000,
+    settings.LOOP_WATCHDOG_SAMPLES,
+    settings.LOOP_WATCHDOG_REPORTS,
+    settings.LOOP_WATCHDOG_REPORT_INTERVAL,
+)
@@ -1,7 +1,189 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+import redis
+import requests
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from app.core.config import settings
+from app.core import deadline, profiling, ratelimit, timing
+from app.core.deadline import DeadlineExceeded
+from app.core.logs import configure_logging
+from app.core.watchdog import watchdog
+from app.api import admin
 from app.api.airport import airport_query
+from app.api.flights import departures_query, flight_status_query
+from app.api.rank import rank_airports
+from app.services.summary import get_summary
+from app.services.tiles import LAYERS, get_tile, encode_tile
+from app.services.admission import Overloaded
+from app.services.cache import listen_for_invalidations
+from app.services.snapshot import restore_snapshot, save_snapshot, snapshot_periodically
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.CACHE_BACKEND == "redis":
+        # Evict entries invalidated by any worker from this worker's local cache
+        listen_for_invalidations()
+    snapshots = None
+    if settings.LOCAL_SNAPSHOT_PATH:
+        # Start warm with the entries the previous workers had cached
+        restore_snapshot()
+        snapshots = asyncio.create_task(snapshot_periodically())
+    if settings.LOOP_WATCHDOG_ENABLED:
+        watchdog.start()
+    yield
+    watchdog.stop()
+    if snapshots is not None:
+        snapshots.cancel()
+        try:
+            save_snapshot()
+        except OSError as e:
+            logger.error("Error writing local cache snapshot: %s", e)
+
+
+def require_admin(x_admin_key: str = Header(default="")):
+    """Allow admin requests only with the configured ADMIN_API_KEY."""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not hmac.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+configure_logging()
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(deadline.apply_deadlines)
+app.middleware("http")(timing.time_requests)
+if settings.DEBUG:
+    # Profiling is only installed in debug mode, so it costs nothing otherwise
+    app.middleware("http")(profiling.profile_requests)
+
+    @app.get("/admin/profiles", status_code=200, dependencies=[Depends(require_admin)])
+    async def get_profiles():
+        """List the request profiles kept in memory, newest first."""
+        return [
+            {k: v for k, v in profile.items() if k not in ("stacks", "stats")}
+            for profile in reversed(profiling.profiles)
+        ]
+
+    @app.get(
+        "/admin/profiles/{profile_id}",
+        status_code=200,
+        dependencies=[Depends(require_admin)],
+    )
+    async def get_profile(profile_id: int, format: str = "json"):
+        """Return one request profile, as JSON or as folded stacks for flamegraphs.
+
+        Args:
+            profile_id (int): The id returned in the X-Debug-Profile-Id response header.
+            format (str, optional): "json" or "folded". Defaults to "json".
+        """
+        profile = profiling.get_profile(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        if format == "folded":
+            return PlainTextResponse(profiling.to_folded(profile))
+        return profile
+
+
+if settings.RATE_LIMIT_ENABLED:
+    # Added last so it runs first, rejected requests cost nothing else
+    app.middleware("http")(ratelimit.limit_requests)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed requests that cannot reach an upstream provider in time."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    """Report requests whose deadline passed before an answer was ready."""
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.post(
+    "/admin/cache/invalidate", status_code=200, dependencies=[Depends(require_admin)]
+)
+def invalidate_cache(tag: str):
+    """Delete every cache entry under a tag.
+
+    Args:
+        tag (str): "airport:{CODE}", "ns:{airport|weather|traffic|flights}" or "provider:{aviationstack|weatherstack}".
+    """
+    try:
+        return admin.invalidate(tag)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except redis.RedisError:
+        # Admin cache operations need Redis, other routes degrade without it
+        raise HTTPException(status_code=503, detail="Cache unavailable")
+
+
+@app.post(
+    "/admin/cache/prewarm", status_code=200, dependencies=[Depends(require_admin)]
+)
+def prewarm_cache(codes: str):
+    """Load airports, their weather and traffic into the cache.
+
+    Args:
+        codes (str): Comma separated airport codes, e.g. "JFK,LHR,CDG".
+    """
+    try:
+        return admin.prewarm(codes.split(","))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.get("/admin/cache/inspect", status_code=200, dependencies=[Depends(require_admin)])
+def inspect_cache(tag: str, limit: int = 100):
+    """List the cache entries under a tag with their ttl, size and age.
+
+    Args:
+        tag (str): See invalidate_cache.
+        limit (int, optional): Maximum number of entries listed. Defaults to 100.
+    """
+    try:
+        return admin.inspect(tag, limit)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Cache unavailable")
+
+
+@app.get("/admin/cache/stats", status_code=200, dependencies=[Depends(require_admin)])
+def get_cache_stats():
+    """Estimate the keys and memory used per cache namespace."""
+    try:
+        return admin.stats()
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Cache unavailable")
+
+
+@app.get("/admin/providers", status_code=200, dependencies=[Depends(require_admin)])
+def get_provider_stats():
+    """Report upstream admission queues and weather provider latency and health."""
+    return admin.providers()
+
+
+@app.get("/admin/loop", status_code=200, dependencies=[Depends(require_admin)])
+async def get_loop_stats():
+    """Report this worker's event loop lag percentiles and the stacks of code that blocked it."""
+    return watchdog.stats()
 
 
 @app.get("/", status_code=200)
@@ -9,8 +191,100 @@ async def get_health_check():
     return {"status": "ok"}
 
 
+@app.get("/airports/rank", status_code=200)
+def get_airports_rank(codes: str = None, region: str = None, k: int = 20):
+    """Rank airports by current weather risk, using cached observations only.
+
+    Args:
+        codes (str, optional): Comma separated airport codes, e.g. "JFK,LHR,CDG".
+        region (str, optional): ISO 3166-1 alpha-2 country code, e.g. "US".
+        k (int, optional): Number of airports to return. Defaults to 20.
+    """
+    try:
+        return rank_airports(
+            codes=codes.split(",") if codes else None, region=region, k=k
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.get("/summary", status_code=200)
+def get_network_summary(group_by: str = None):
+    """Count airports per weather_rating band, optionally per country_name or timezone.
+
+    Args:
+        group_by (str, optional): "country_name" or "timezone".
+    """
+    try:
+        return get_summary(group_by)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.get("/tiles/{z}/{x}/{y}", status_code=200)
+def get_risk_tile(z: int, x: int, y: int, format: str = "json"):
+    """Grid of the weather risk and its components over a map tile, from cached observations.
+
+    Args:
+        z (int): Zoom level.
+        x (int): Tile x.
+        y (int): Tile y.
+        format (str, optional): "json" for matrices or "bin" for packed bytes, see encode_tile.
+    """
+    if format not in ("json", "bin"):
+        raise HTTPException(status_code=400, detail="format must be json or bin")
+    try:
+        tile = get_tile(z, x, y)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    if format == "bin":
+        return Response(
+            encode_tile(tile),
+            media_type="application/octet-stream",
+            headers={
+                "X-Tile-Size": str(tile["size"]),
+                "X-Tile-Layers": ",".join(LAYERS),
+            },
+        )
+    return tile
+
+
+@app.get("/flights/{flight_iata}", status_code=200)
+def get_flight_status(flight_iata: str):
+    """Status of the flights with an IATA flight number, streamed as they are fetched.
+
+    Args:
+        flight_iata (str): IATA flight number, e.g. "BA117".
+    """
+    try:
+        body = flight_status_query(flight_iata)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return StreamingResponse(body, media_type="application/json")
+
+
+@app.get("/airport/{airport_code}/departures", status_code=200)
+def get_airport_departures(airport_code: str):
+    """Status of the flights departing from an airport, streamed as they are fetched.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+    """
+    try:
+        body = departures_query(airport_code)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return StreamingResponse(body, media_type="application/json")
+
+
 @app.get("/airport/{airport_code}", status_code=200)
-async def get_airport_info(airport_code: str):
+def get_airport_info(airport_code: str):
+    # Sync endpoint, FastAPI runs it in its threadpool so that upstream calls
+    # do not block the event loop and admission control can queue them
     return airport_query(airport_code)
     # """
     # Get airport information by airport ID.
@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from app.core import deadline
+from app.core.config import settings
+
+
+class Overloaded(Exception):
+    """Raised when an upstream provider has no capacity left for a request.
+
+    Attributes:
+        provider (str): The provider that shed the request.
+        retry_after (int): Suggested seconds before retrying.
+    """
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} is overloaded, retry after {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue for one upstream provider.
+
+    At most max_concurrency calls run at once. Up to max_queue more callers wait,
+    each for at most max_wait seconds. Callers beyond that are rejected at once
+    with Overloaded, so a traffic spike is shed instead of piling up until
+    workers time out.
+    """
+
+    def __init__(self, provider, max_concurrency, max_queue, max_wait):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._latency = 0.5  # Moving average of call duration in seconds
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def admit(self, timeout=None):
+        """Context manager holding one concurrency slot for the duration of an upstream call.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait in the queue. Defaults to max_wait.
+
+        Raises:
+            Overloaded: If the queue is full or no slot frees up before the timeout.
+        """
+        self._acquire(self.max_wait if timeout is None else min(timeout, self.max_wait))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._condition:
+                self._latency = 0.8 * self._latency + 0.2 * elapsed
+                self.active -= 1
+                self._condition.notify()
+
+    def retry_after(self):
+        """Estimate how long until the current backlog has drained, in whole seconds."""
+        backlog = self.active + self.waiting
+        return max(1, math.ceil(self._latency * backlog / self.max_concurrency))
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "latency_ms": round(self._latency * 1000, 1),
+        }
+
+    def _acquire(self, timeout):
+        with self._condition:
+            if self.active < self.max_concurrency and self.waiting == 0:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue or timeout <= 0:
+                self.rejected += 1
+                raise Overloaded(self.provider, self.retry_after())
+            deadline = time.monotonic() + timeout
+            self.waiting += 1
+            try:
+                while self.active >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise Overloaded(self.provider, self.retry_after())
+                    self._condition.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+
+controllers = {
+    "aviationstack": AdmissionController(
+        "aviationstack",
+        settings.AVIATIONSTACK_MAX_CONCURRENCY,
+        settings.ADMISSION_QUEUE_SIZE,
+        settings.ADMISSION_MAX_WAIT_MS / 1000,
+    ),
+    "weatherstack": AdmissionController(
+        "weatherstack",
+        settings.WEATHERSTACK_MAX_CONCURRENCY,
+        settings.ADMISSION_QUEUE_SIZE,
+        settings.ADMISSION_MAX_WAIT_MS / 1000,
+    ),
+    "openmeteo": AdmissionController(
+        "openmeteo",
+        settings.OPENMETEO_MAX_CONCURRENCY,
+        settings.ADMISSION_QUEUE_SIZE,
+        settings.ADMISSION_MAX_WAIT_MS / 1000,
+    ),
+}
+
+
+def admit(provider, timeout=None):
+    """This function admits one upstream call to a provider, see AdmissionController.admit.
+
+    Only upstream calls go through admission, cache hits never wait. Within a
+    request, the wait also ends at the request's deadline.
+
+    Args:
+        provider (str): "aviationstack", "weatherstack" or "openmeteo".
+        timeout (float, optional): Maximum seconds to wait in the queue. Defaults to ADMISSION_MAX_WAIT_MS.
+
+    Raises:
+        DeadlineExceeded: If the request's deadline has passed, nothing is queued then.
+
+    Returns:
+        contextmanager: Holds a concurrency slot while the call runs.
+    """
+    left = deadline.remaining()
+    if left is not None:
+        deadline.check()
+        timeout = left if timeout is None else min(timeout, left)
+    return controllers[provider].admit(timeout)
@@ -1,10 +1,121 @@
+import logging
 import requests
+import redis
 from app.core.config import settings
-from .cache import get_cache_key, check_cache, cache_response
+from app.core.deadline import upstream_call
+from app.core.logs import log_sampled
+from app.core.models import Airport
+from app.core.timing import stage
+from .admission import admit
+from .cache import (
+    get_cache_key,
+    check_cache,
+    cache_response,
+    get_airport_tags,
+    redis_client,
+    local_cache,
+)
+
+logger = logging.getLogger(__name__)
 
 # Load the AviationStack API key from environment variables
 as_api_key = settings.AVIATIONSTACK_API_KEY
 
+# Response classes returned by classify_airport_response
+AIRPORT_FOUND = "found"
+AIRPORT_NOT_FOUND = "not_found"
+UPSTREAM_ERROR = "error"
+
+AIRPORT_TAGS = ["ns:airport", "provider:aviationstack"]
+
+
+def classify_airport_response(airport_info):
+    """This function classifies an AviationStack airports response so that only
+    valid payloads are cached.
+
+    Args:
+        airport_info (dict): The decoded JSON body returned by the AviationStack API.
+
+    Returns:
+        str: - AIRPORT_FOUND if the response contains airport data.
+             - AIRPORT_NOT_FOUND if the request succeeded but no airport matched.
+             - UPSTREAM_ERROR if the body is an error payload (bad key, quota exceeded, missing data).
+    """
+    if not isinstance(airport_info, dict) or "error" in airport_info:
+        return UPSTREAM_ERROR
+    if not isinstance(airport_info.get("data"), list):
+        return UPSTREAM_ERROR
+    if len(airport_info["data"]) == 0:
+        return AIRPORT_NOT_FOUND
+    return AIRPORT_FOUND
+
+
+def get_airport_url(airport_code, as_api_key: str = as_api_key):
+    """This function builds the AviationStack airports URL for an airport code.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+        as_api_key (str, optional): AviationStack API key. Defaults to the value from environment variables.
+
+    Raises:
+        ValueError: If the airport code is not 3 or 4 characters long.
+
+    Returns:
+        str: The AviationStack URL, also used to derive the airport cache key.
+    """
+    # Determine the query based on the airport code length
+    if len(airport_code) == 3:
+        query = f"iata_code={airport_code}"
+    elif len(airport_code) == 4:
+        query = f"icao_code={airport_code}"
+    else:
+        raise ValueError("Airport code must be 3 or 4 characters long")
+    return f"https://api.aviationstack.com/v1/airports?access_key={as_api_key}&{query}"
+
+
+def get_region_key(region):
+    """This function returns the Redis set listing the airport codes seen in a region.
+
+    Args:
+        region (str): ISO 3166-1 alpha-2 country code, e.g. "US".
+
+    Returns:
+        str: The Redis key of the region index.
+    """
+    return f"airports:region:{region.upper()}"
+
+
+def index_airport_region(airport_code, airport):
+    """This function adds an airport code to the index of its region, so that
+    region-wide queries can find airports without calling AviationStack.
+
+    Args:
+        airport_code (str): The airport code (IATA or ICAO) the airport was looked up by.
+        airport (dict): The airport record returned by AviationStack.
+    """
+    if not airport.get("country_iso2"):
+        return
+    try:
+        redis_client.sadd(get_region_key(airport["country_iso2"]), airport_code)
+    except redis.RedisError as e:
+        logger.error("Error indexing airport region: %s", e)
+
+
+def get_region_airports(region):
+    """This function lists the airport codes indexed for a region.
+
+    Args:
+        region (str): ISO 3166-1 alpha-2 country code, e.g. "US".
+
+    Returns:
+        list: The airport codes seen in the region, sorted.
+    """
+    try:
+        return sorted(redis_client.smembers(get_region_key(region)))
+    except redis.RedisError as e:
+        logger.error("Error reading airport region: %s", e)
+        return []
+
 
 def get_airport_info(airport_code: str = None, as_api_key: str = as_api_key):
     """This function retrieves airport information from the AviationStack API based
@@ -20,7 +131,10 @@ def get_airport_info(airport_code: str = None, as_api_key: str = as_api_key):
                     - If the airport code is not found or if multiple results are returned.
                     - If the airport code is not provided.
                     - If there is any other validation error with the input parameters.
-        RequestException: If there is an error with the request to the AviationStack API.
+        RequestException: - If there is an error with the request to the AviationStack API.
+                          - If the AviationStack API returns an error payload.
+        Overloaded: If AviationStack has no capacity left for the request.
+        DeadlineExceeded: If the request's deadline passed first.
         Exception: If any unexpected errors during the execution.
 
     Returns:
@@ -35,32 +149,56 @@ def get_airport_info(airport_code: str = None, as_api_key: str = as_api_key):
         if not airport_code:
             raise ValueError("Airport code must be provided")
 
-        # Determine the query based on the airport code length
-        if len(airport_code) == 3:
-            query = f"iata_code={airport_code}"
-        elif len(airport_code) == 4:
-            query = f"icao_code={airport_code}"
-        else:
-            raise ValueError("Airport code must be 3 or 4 characters long")
-
         # Construct the URL with the query
-        url = (
-            f"https://api.aviationstack.com/v1/airports?access_key={as_api_key}&{query}"
-        )
+        url = get_airport_url(airport_code, as_api_key)
         cache_key = get_cache_key(url)
+        cache_data = None
         if cache_key:
             # Check if the data is already cached
-            cache_data = check_cache(cache_key)
+            with stage("airport_cache"):
+                cache_data = check_cache(cache_key)
 
-        if cache_data:
-            print("Using cached data...")
+        if cache_data and classify_airport_response(cache_data) != UPSTREAM_ERROR:
+            log_sampled(
+                logger, logging.DEBUG, "airport_cache_hit", "Using cached airport"
+            )
             airport_info = cache_data
         else:
             # Make the API request
-            print("Making API request...")
-            response = requests.get(url)
-            airport_info = response.json()
-            cache_response(cache_key, airport_info)
+            logger.debug("AviationStack request for %s", airport_code)
+            with admit("aviationstack"), stage(
+                "aviationstack"
+            ), upstream_call() as timeout:
+                response = requests.get(url, timeout=timeout)
+                airport_info = response.json()
+            status = classify_airport_response(airport_info)
+            if status == UPSTREAM_ERROR:
+                # Never cache error payloads, the next request should retry upstream
+                error = (
+                    airport_info.get("error", {})
+                    if isinstance(airport_info, dict)
+                    else {}
+                )
+                raise requests.exceptions.RequestException(
+                    f"AviationStack error: {error.get('message', 'invalid response')}"
+                )
+            tags = AIRPORT_TAGS + get_airport_tags(
+                airport_code,
+                *(
+                    code
+                    for airport in airport_info["data"]
+                    for code in (airport.get("iata_code"), airport.get("icao_code"))
+                ),
+            )
+            if status == AIRPORT_NOT_FOUND:
+                # Negative cache unknown codes for a short time only
+                cache_response(
+                    cache_key, airport_info, settings.NEGATIVE_CACHE_EXPIRE, tags
+                )
+            else:
+                cache_response(cache_key, airport_info, tags=tags)
+                if len(airport_info["data"]) == 1:
+                    index_airport_region(airport_code, airport_info["data"][0])
 
         # If the response does not contain exactly one airport, raise an error
         if len(airport_info["data"]) != 1:
@@ -69,15 +207,37 @@ def get_airport_info(airport_code: str = None, as_api_key: str = as_api_key):
             )
 
         # If the response is valid, return the airport information
-        print(f"airport info for {airport_code} retrieved successfully")
         return airport_info
 
     except requests.exceptions.RequestException as e:
-        print(f"Request error: {e}")
+        logger.error("AviationStack request error: %s", e)
         raise e
     except ValueError as e:
-        print(f"Value error: {e}")
+        logger.info("Airport lookup failed: %s", e)
         raise e
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.exception("Unexpected AviationStack error: %s", e)
         raise e
+
+
+def get_airport(airport_code: str = None, as_api_key: str = as_api_key):
+    """This function returns an airport as a typed model, parsed once and kept in
+    the in-process cache so repeated lookups skip Redis and JSON decoding.
+
+    Args:
+        airport_code (str, optional): Airport code (IATA or ICAO) to look up. Defaults to None.
+        as_api_key (str, optional): AviationStack API key. Defaults to the value from environment variables.
+
+    Raises:
+        ValueError: If the airport code is invalid or not found, see get_airport_info.
+        RequestException: If there is an error with the request to the AviationStack API.
+
+    Returns:
+        Airport: The airport.
+    """
+    local_key = f"airport:{airport_code.upper()}" if airport_code else None
+    airport = local_cache.get(local_key) if local_key else None
+    if airport is None:
+        airport = Airport.from_response(get_airport_info(airport_code, as_api_key))
+        local_cache.set(local_key, airport, settings.CACHE_EXPIRE)
+    return airport
@@ -1,16 +1,157 @@
 from app.core.config import settings
+from app.core.logs import log_sampled
+from app.core.models import Airport
+from .sharding import ShardedRedis
+from .shared_cache import SharedCache
+from .sqlite_cache import SQLiteCache
+from collections import OrderedDict
+from typing import Protocol
 import redis
 import json
 import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def create_redis_client():
+    """This function creates the Redis client, sharded over REDIS_NODES when set,
+    else connected to the single node at REDIS_HOST and REDIS_PORT.
+
+    Returns:
+        redis.Redis or ShardedRedis: The Redis client.
+    """
+    if settings.REDIS_NODES:
+        return ShardedRedis.from_spec(
+            settings.REDIS_NODES, settings.REDIS_READ_FROM_REPLICAS
+        )
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        decode_responses=True,
+    )
+
 
 # Initialise Redis client
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    decode_responses=True,
-)
+redis_client = create_redis_client()
 cache_expiry = settings.CACHE_EXPIRE
 
+# Errors of the cache backends, entries are then treated as missing
+CACHE_ERRORS = (redis.RedisError, sqlite3.Error)
+
+
+class CacheBackend(Protocol):
+    """Storage of cache entries, serialized values under string keys with an expiry."""
+
+    def get(self, key):
+        """Return the value under key, or None if it is missing or expired."""
+
+    def get_many(self, keys):
+        """Return the values under keys in order, with None for missing keys."""
+
+    def set_many(self, items, expire, tags=None):
+        """Store a mapping of key to value for expire seconds, indexed under tags."""
+
+    def ttl(self, key):
+        """Return the seconds before key expires, -2 if it is missing."""
+
+    def delete(self, *keys):
+        """Delete keys, returning how many existed."""
+
+
+class RedisBackend:
+    """Cache backend on the Redis client, indexing entries by tag as they are written."""
+
+    def get(self, key):
+        return redis_client.get(key)
+
+    def get_many(self, keys):
+        return redis_client.mget(keys)
+
+    def set_many(self, items, expire, tags=None):
+        if len(items) == 1 and not tags:
+            [(key, value)] = items.items()
+            redis_client.setex(key, expire, value)
+            return
+        pipeline = redis_client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.setex(key, expire, value)
+        if tags:
+            index_tags(pipeline, list(items), tags, expire)
+        pipeline.execute()
+
+    def ttl(self, key):
+        return redis_client.ttl(key)
+
+    def delete(self, *keys):
+        return redis_client.delete(*keys)
+
+
+def create_cache_backend():
+    """This function creates the backend selected by CACHE_BACKEND, "redis" or "sqlite".
+
+    Raises:
+        ValueError: If CACHE_BACKEND names no backend.
+
+    Returns:
+        CacheBackend: The cache backend.
+    """
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend()
+    if settings.CACHE_BACKEND == "sqlite":
+        return SQLiteCache(
+            settings.CACHE_SQLITE_PATH,
+            flush_interval=settings.CACHE_SQLITE_FLUSH_MS / 1000,
+            batch_size=settings.CACHE_SQLITE_BATCH_SIZE,
+            sweep_interval=settings.CACHE_SQLITE_SWEEP_INTERVAL,
+        )
+    raise ValueError(f"Unknown cache backend {settings.CACHE_BACKEND!r}")
+
+
+# Cache entries are read and written through the backend. Tags, invalidation
+# and the other data structures below are kept in Redis.
+cache_backend = create_cache_backend()
+
+# Serialized entries shared by the workers of this host, in front of the backend
+shared_cache = (
+    SharedCache(
+        settings.SHARED_CACHE_PATH,
+        settings.SHARED_CACHE_SLOTS,
+        settings.SHARED_CACHE_SLOT_SIZE,
+    )
+    if settings.SHARED_CACHE_PATH
+    else None
+)
+
+
+def share_entries(items, cache_expiry=cache_expiry):
+    """This function copies serialized entries to the host's shared cache, when enabled,
+    for at most SHARED_CACHE_EXPIRE seconds.
+
+    Args:
+        items (dict): A mapping of cache key to serialized value, None values are skipped.
+        cache_expiry (int, optional): Seconds left before the entries expire. Defaults to CACHE_EXPIRE.
+    """
+    if shared_cache is None:
+        return
+    shared_cache.set_many(
+        {cache_key: value for cache_key, value in items.items() if value},
+        min(cache_expiry, settings.SHARED_CACHE_EXPIRE),
+    )
+
+
+# Cache entries are indexed by tag, one Redis set of cache keys per tag:
+#   airport:{CODE}   every entry fetched for an airport (IATA and ICAO)
+#   ns:{namespace}   every entry of a namespace, see NAMESPACES
+#   provider:{name}  every entry fetched from an upstream provider
+TAG_PREFIX = "tag:"
+NAMESPACES = ("airport", "weather", "traffic", "flights")
+WRITTEN_KEY = "cache:written"  # Sorted set of tagged cache keys by write time
+INVALIDATION_CHANNEL = "cache:invalidate"  # Tags invalidated, for local caches
+
 
 def get_cache_key(url, params=None):
     """This function generates a unique cache key based on the URL and optional parameters.
@@ -29,42 +170,440 @@ def get_cache_key(url, params=None):
             raw_key += json.dumps(params, sort_keys=True)
         return hashlib.sha256(raw_key.encode()).hexdigest()
     except Exception as e:
-        print(f"Error generating cache key: {e}")
+        logger.error("Error generating cache key: %s", e)
         return None
 
 
 def check_cache(cache_key):
-    """This function checks if a response is cached in Redis using the provided cache key.
+    """This function checks if a response is cached using the provided cache key.
 
     Args:
-        cache_key (str): The cache key to query in Redis.
+        cache_key (str): The cache key to query.
 
     Returns:
         dict or None: Returns the cached data as a dictionary if found, otherwise returns None.
     """
     try:
-        # Check cache first
-        cached_response = redis_client.get(cache_key)
+        # Check the host's shared cache first, then the backend
+        cached_response = shared_cache.get(cache_key) if shared_cache else None
+        if cached_response is None:
+            cached_response = cache_backend.get(cache_key)
+            share_entries({cache_key: cached_response})
         if cached_response:
-            print("Cache hit!")
+            log_sampled(logger, logging.DEBUG, "cache_hit", "Cache hit %s", cache_key)
             return json.loads(cached_response)
-        print("Cache miss!")
+        log_sampled(logger, logging.DEBUG, "cache_miss", "Cache miss %s", cache_key)
         return None
-    except redis.RedisError as e:
-        print(f"Error checking cache: {e}")
+    except CACHE_ERRORS as e:
+        logger.error("Error checking cache: %s", e)
         return None
 
 
-def cache_response(cache_key, data, cache_expiry=cache_expiry):
-    """This function caches the response data in Redis with a specified expiry time.
+def cache_response(cache_key, data, cache_expiry=cache_expiry, tags=None):
+    """This function caches the response data with a specified expiry time.
 
     Args:
         cache_key (str): The cache key under which the data will be stored.
         data (dict): The data to be cached, which will be converted to JSON format.
         cache_expiry (int, optional): The time in seconds after which the cache will expire. Defaults to 3600 seconds (1 hour).
+        tags (list, optional): Tags to index the entry under, in the same round trip. Defaults to None.
+    """
+    try:
+        items = {cache_key: json.dumps(data)}
+        cache_backend.set_many(items, cache_expiry, tags)
+        share_entries(items, cache_expiry)
+        log_sampled(logger, logging.DEBUG, "cache_write", "Cached %s", cache_key)
+    except CACHE_ERRORS as e:
+        logger.error("Error caching response: %s", e)
+
+
+def check_cache_many(cache_keys):
+    """This function checks several cache keys with a single MGET round trip.
+
+    Args:
+        cache_keys (list): The cache keys to query.
+
+    Returns:
+        list: The cached data as dictionaries, in the same order as cache_keys,
+        with None for every key that is not cached.
     """
     try:
-        redis_client.setex(cache_key, cache_expiry, json.dumps(data))
-        print("Response cached successfully.")
+        if not cache_keys:
+            return []
+        if shared_cache is None:
+            cached_responses = cache_backend.get_many(cache_keys)
+        else:
+            cached_responses = shared_cache.get_many(cache_keys)
+            missing = [k for k, c in zip(cache_keys, cached_responses) if c is None]
+            if missing:
+                read = dict(zip(missing, cache_backend.get_many(missing)))
+                share_entries(read)
+                cached_responses = [
+                    read[k] if c is None else c
+                    for k, c in zip(cache_keys, cached_responses)
+                ]
+        return [json.loads(cached) if cached else None for cached in cached_responses]
+    except CACHE_ERRORS as e:
+        logger.error("Error checking cache: %s", e)
+        return [None] * len(cache_keys)
+
+
+def cache_many(items, cache_expiry=cache_expiry, tags=None):
+    """This function caches several responses with a single pipelined round trip.
+
+    Args:
+        items (dict): A mapping of cache key to the data to be cached.
+        cache_expiry (int, optional): The time in seconds after which the cache will expire. Defaults to 3600 seconds (1 hour).
+        tags (list, optional): Tags to index every entry under. Defaults to None.
+    """
+    try:
+        if not items:
+            return
+        serialized = {cache_key: json.dumps(data) for cache_key, data in items.items()}
+        cache_backend.set_many(serialized, cache_expiry, tags)
+        share_entries(serialized, cache_expiry)
+        log_sampled(
+            logger, logging.DEBUG, "cache_write", "Cached %d responses", len(items)
+        )
+    except CACHE_ERRORS as e:
+        logger.error("Error caching responses: %s", e)
+
+
+def get_tag_key(tag):
+    return f"{TAG_PREFIX}{tag}"
+
+
+def get_airport_tags(*airport_codes):
+    """This function returns the airport tags for the given codes, skipping empty ones.
+
+    Args:
+        *airport_codes (str): Airport codes (IATA or ICAO).
+
+    Returns:
+        list: One "airport:{CODE}" tag per distinct code.
+    """
+    return list(
+        dict.fromkeys(f"airport:{code.upper()}" for code in airport_codes if code)
+    )
+
+
+def index_tags(pipeline, cache_keys, tags, cache_expiry=cache_expiry):
+    """This function queues the commands indexing cache keys under tags on a pipeline,
+    so tagging costs no round trip of its own.
+
+    A tag set expires with the longest lived entry written to it, so sets of
+    entries that are no longer written do not outlive them.
+
+    Args:
+        pipeline (redis.client.Pipeline): The pipeline the cache writes are queued on.
+        cache_keys (list): The cache keys written.
+        tags (list): The tags to index the keys under.
+        cache_expiry (int, optional): Expiry of the cache keys in seconds. Defaults to 3600 seconds (1 hour).
+    """
+    index_key_tags(pipeline, dict.fromkeys(cache_keys, tags), cache_expiry)
+
+
+def index_key_tags(pipeline, key_tags, cache_expiry=cache_expiry):
+    """This function queues the commands indexing cache keys each under their own tags,
+    with one SADD per tag, see index_tags.
+
+    Args:
+        pipeline (redis.client.Pipeline): The pipeline the cache writes are queued on.
+        key_tags (dict): A mapping of cache key to the tags to index it under.
+        cache_expiry (int, optional): Expiry of the cache keys in seconds. Defaults to 3600 seconds (1 hour).
+    """
+    now = time.time()
+    pipeline.zadd(WRITTEN_KEY, dict.fromkeys(key_tags, now))
+    # Forget write times of entries that have expired by now
+    pipeline.zremrangebyscore(
+        WRITTEN_KEY,
+        "-inf",
+        now
+        - max(settings.CACHE_EXPIRE, settings.TRAFFIC_EXPIRE, settings.METAR_EXPIRE),
+    )
+    tagged = {}
+    for cache_key, tags in key_tags.items():
+        for tag in tags:
+            tagged.setdefault(tag, []).append(cache_key)
+    for tag, cache_keys in tagged.items():
+        tag_key = get_tag_key(tag)
+        pipeline.sadd(tag_key, *cache_keys)
+        pipeline.expire(tag_key, cache_expiry, nx=True)
+        pipeline.expire(tag_key, cache_expiry, gt=True)
+
+
+def tag_keys(cache_keys, tags, cache_expiry=cache_expiry):
+    """This function indexes already cached keys under more tags.
+
+    Args:
+        cache_keys (list): The cache keys to tag.
+        tags (list): The tags to index the keys under.
+        cache_expiry (int, optional): Expiry of the cache keys in seconds. Defaults to 3600 seconds (1 hour).
+    """
+    try:
+        if not cache_keys or not tags:
+            return
+        pipeline = redis_client.pipeline(transaction=False)
+        index_tags(pipeline, cache_keys, tags, cache_expiry)
+        pipeline.execute()
     except redis.RedisError as e:
-        print(f"Error caching response: {e}")
+        logger.error("Error tagging cache keys: %s", e)
+
+
+def invalidate_tag(tag):
+    """This function deletes every cache entry indexed under a tag.
+
+    Takes two round trips whatever the number of entries: one SMEMBERS and one
+    pipeline unlinking the entries and the tag set. The tag is published on
+    INVALIDATION_CHANNEL so every worker evicts it from its local cache.
+
+    Args:
+        tag (str): The tag, e.g. "airport:JFK", "ns:weather" or "provider:weatherstack".
+
+    Raises:
+        RedisError: If Redis cannot be reached.
+
+    Returns:
+        int: The number of cache entries deleted.
+    """
+    tag_key = get_tag_key(tag)
+    cache_keys = list(redis_client.smembers(tag_key))
+    pipeline = redis_client.pipeline(transaction=False)
+    if cache_keys:
+        pipeline.unlink(*cache_keys)
+        pipeline.zrem(WRITTEN_KEY, *cache_keys)
+    pipeline.unlink(tag_key)
+    pipeline.publish(INVALIDATION_CHANNEL, tag)
+    results = pipeline.execute()
+    evict_local(tag)
+    deleted = results[0] if cache_keys else 0
+    logger.info("Invalidated %d cache entries tagged %s", deleted, tag)
+    return deleted
+
+
+def inspect_tag(tag, limit=100):
+    """This function describes the cache entries indexed under a tag.
+
+    Args:
+        tag (str): The tag, e.g. "airport:JFK".
+        limit (int, optional): Maximum number of entries described. Defaults to 100.
+
+    Raises:
+        RedisError: If Redis cannot be reached.
+
+    Returns:
+        list: One dictionary per live entry with its key, ttl in seconds, size in bytes
+        and age in seconds (None if its write time is unknown).
+    """
+    cache_keys = sorted(redis_client.smembers(get_tag_key(tag)))[:limit]
+    pipeline = redis_client.pipeline(transaction=False)
+    for cache_key in cache_keys:
+        pipeline.ttl(cache_key)
+        pipeline.memory_usage(cache_key)
+        pipeline.zscore(WRITTEN_KEY, cache_key)
+    results = iter(pipeline.execute())
+    now = time.time()
+    entries = []
+    for cache_key, ttl, size, written in zip(cache_keys, results, results, results):
+        if ttl == -2:
+            continue  # Expired since it was tagged
+        entries.append(
+            {
+                "key": cache_key,
+                "ttl": ttl,
+                "size_bytes": size,
+                "age_seconds": round(now - written) if written else None,
+            }
+        )
+    return entries
+
+
+def keyspace_stats(sample_size=50):
+    """This function estimates the number of keys and memory used per namespace, for
+    memory planning.
+
+    Each namespace is estimated from a random sample of its tag set, which may
+    still list expired keys, so the estimate costs three round trips however
+    large the keyspace is.
+
+    Args:
+        sample_size (int, optional): Keys sampled per namespace. Defaults to 50.
+
+    Raises:
+        RedisError: If Redis cannot be reached.
+
+    Returns:
+        dict: Total keys and memory, and per namespace the estimated live keys,
+        average entry size and total bytes.
+    """
+    pipeline = redis_client.pipeline(transaction=False)
+    for namespace in NAMESPACES:
+        tag_key = get_tag_key(f"ns:{namespace}")
+        pipeline.scard(tag_key)
+        pipeline.srandmember(tag_key, sample_size)
+    results = pipeline.execute()
+
+    samples = {
+        namespace: results[i * 2 + 1] or [] for i, namespace in enumerate(NAMESPACES)
+    }
+    pipeline = redis_client.pipeline(transaction=False)
+    for namespace in NAMESPACES:
+        for cache_key in samples[namespace]:
+            pipeline.memory_usage(cache_key)
+    sizes = iter(pipeline.execute())
+
+    stats = {"namespaces": {}}
+    for i, namespace in enumerate(NAMESPACES):
+        indexed = results[i * 2]
+        sampled = [next(sizes) for _ in samples[namespace]]
+        live = [size for size in sampled if size is not None]
+        keys = round(indexed * len(live) / len(sampled)) if sampled else 0
+        average = round(sum(live) / len(live)) if live else 0
+        stats["namespaces"][namespace] = {
+            "keys": keys,
+            "average_bytes": average,
+            "total_bytes": keys * average,
+        }
+    memory = redis_client.info("memory")
+    stats["used_memory_bytes"] = memory.get("used_memory")
+    stats["keys"] = redis_client.dbsize()
+    return stats
+
+
+class LocalCache:
+    """Bounded in-process LRU cache with a per-entry expiry.
+
+    Holds decoded values (typed models) in front of Redis, so hot entries cost
+    neither a round trip nor a JSON decode. Least recently used entries are
+    evicted once max_size is reached. Expired entries are kept until then, for
+    requests about to miss their deadline, see get_stale.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value cached under key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_stale(self, key, max_stale):
+        """Return the value cached under key, even if it expired up to max_stale
+        seconds ago, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + max_stale <= time.time():
+                return None
+            return entry[1]
+
+    def set(self, key, value, expire):
+        """Cache value under key for expire seconds."""
+        with self._lock:
+            self._entries[key] = (time.time() + expire, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Delete every entry for which predicate(key, value) is true."""
+        with self._lock:
+            for key in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def items(self):
+        """Return (key, expires_at, value) for every entry, least recently used first."""
+        with self._lock:
+            return [
+                (key, expires_at, value)
+                for key, (expires_at, value) in self._entries.items()
+            ]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Decoded airports and weather observations, per worker process
+local_cache = LocalCache(settings.LOCAL_CACHE_SIZE)
+
+
+# Local cache key prefix evicted when a namespace or provider tag is invalidated
+LOCAL_PREFIXES = {
+    "provider:metar": "weather:",
+    "ns:airport": "airport:",
+    "provider:aviationstack": "airport:",
+    "ns:weather": "weather:",
+    "provider:weatherstack": "weather:",
+    "provider:openmeteo": "weather:",
+}
+
+
+def evict_local(tag):
+    """This function evicts the entries of an invalidated tag from this worker's local cache.
+
+    An airport tag evicts the airport under any of its codes. Its weather
+    observation is keyed by location and expires within LOCAL_WEATHER_EXPIRE.
+
+    Args:
+        tag (str): The invalidated tag.
+    """
+    kind, _, value = tag.partition(":")
+    if kind == "airport":
+        local_cache.delete_where(
+            lambda key, entry: key == tag
+            or (isinstance(entry, Airport) and value in (entry.iata, entry.icao))
+        )
+    elif tag in LOCAL_PREFIXES:
+        prefix = LOCAL_PREFIXES[tag]
+        local_cache.delete_where(lambda key, entry: key.startswith(prefix))
+    if shared_cache is not None:
+        # Shared entries are keyed by hash, so all of them are dropped
+        shared_cache.clear()
+
+
+_listener = None
+
+
+def listen_for_invalidations():
+    """This function starts a daemon thread evicting tags invalidated by any worker
+    from this worker's local cache. Calling it again has no effect.
+
+    Invalidations published while the subscription is down are missed, so the
+    local cache is cleared whenever it reconnects. The first subscription keeps
+    it, so entries restored from a snapshot at startup survive.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    def listen():
+        reconnecting = False
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                if reconnecting:
+                    local_cache.clear()
+                    reconnecting = False
+                for message in pubsub.listen():
+                    evict_local(message["data"])
+            except redis.RedisError as e:
+                logger.error("Error listening for cache invalidations: %s", e)
+                reconnecting = True
+                time.sleep(1)
+
+    _listener = threading.Thread(target=listen, name="cache-invalidations", daemon=True)
+    _listener.start()
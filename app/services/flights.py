@@ -0,0 +1,331 @@
+import codecs
+import contextvars
+import json
+import logging
+import math
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+import requests
+from app.core.config import settings
+from app.core.deadline import upstream_call
+from app.core.models import Flight
+from app.core.timing import stage
+from .admission import admit
+from .cache import get_cache_key, check_cache, cache_response, get_airport_tags
+
+"""
+Flight status from AviationStack flights queries.
+
+Flight lists are paginated and can be large. The first page is fetched
+first, as its pagination tells how many pages follow, then up to
+FLIGHTS_CONCURRENCY of the next pages are fetched at once, and flights are
+yielded in page order while the later pages load. At most FLIGHTS_MAX_PAGES
+pages of PAGE_SIZE flights are read per query.
+
+Each page is parsed as its body arrives: the members of the response object
+are decoded one at a time and the items of its data list one flight at a
+time, so a page is never held as one decoded dict. Flights are reduced to
+the Flight model as they are parsed, and each page is cached as its list of
+flights for FLIGHTS_EXPIRE seconds.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Load the AviationStack API key from environment variables
+as_api_key = settings.AVIATIONSTACK_API_KEY
+
+PAGE_SIZE = 100  # Flights per page, the AviationStack maximum
+CHUNK_SIZE = 16384  # Bytes read from the response body at a time
+FLIGHT_TAGS = ["ns:flights", "provider:aviationstack"]
+FLIGHT_IATA = re.compile(r"^[A-Z0-9]{2}[0-9]{1,4}[A-Z]?$")
+AIRPORT_CODE = re.compile(r"^[A-Z0-9]{3,4}$")
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="flights")
+
+
+class _JSONReader:
+    """Reads JSON values one at a time from text chunks, keeping only the text
+    of the value being decoded."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.position = 0
+        self.done = False
+
+    def peek(self):
+        """Return the next character that is not whitespace, "" at the end."""
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read():
+                return ""
+
+    def take(self):
+        """Return and consume the next character that is not whitespace."""
+        char = self.peek()
+        self.position += 1
+        return char
+
+    def value(self):
+        """Decode the next value, reading more chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+                # A number may go on in the next chunk, a value is only
+                # complete when followed by more text
+                if end < len(self.buffer) or self.done:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self._read()
+
+    def _read(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            return False
+        start = self.position
+        self.buffer = self.buffer[start:] + chunk
+        self.position = 0
+        return True
+
+
+def iter_members(chunks, array_key="data"):
+    """This function parses a JSON object from text chunks as they arrive.
+
+    Args:
+        chunks (iterable): The text of the object, in chunks of any size.
+        array_key (str, optional): The member whose array is yielded item by item. Defaults to "data".
+
+    Raises:
+        ValueError: If the text is not a JSON object.
+
+    Yields:
+        tuple: (key, value) per member of the object, and (array_key, item) per
+        item of the array under array_key.
+    """
+    reader = _JSONReader(chunks)
+    if reader.take() != "{":
+        raise ValueError("Expected a JSON object")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str) or reader.take() != ":":
+            raise ValueError("Expected an object member")
+        if key == array_key and reader.peek() == "[":
+            reader.take()
+            if reader.peek() == "]":
+                reader.take()
+            else:
+                while True:
+                    yield key, reader.value()
+                    separator = reader.take()
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError("Expected , or ] in array")
+        else:
+            yield key, reader.value()
+        separator = reader.take()
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError("Expected , or } in object")
+
+
+def _iter_text(response):
+    # The body is UTF-8 JSON, decoded incrementally so characters split
+    # across chunks are kept whole
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in response.iter_content(CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def get_flights_url(query, page, as_api_key: str = as_api_key):
+    """This function builds the AviationStack flights URL of one page of a query.
+
+    Args:
+        query (str): The query parameters, e.g. "flight_iata=BA117".
+        page (int): The page, from 0.
+        as_api_key (str, optional): AviationStack API key. Defaults to the value from environment variables.
+
+    Returns:
+        str: The AviationStack URL, also used to derive the page's cache key.
+    """
+    return (
+        f"https://api.aviationstack.com/v1/flights?access_key={as_api_key}"
+        f"&{query}&limit={PAGE_SIZE}&offset={page * PAGE_SIZE}"
+    )
+
+
+def fetch_flights_page(query, page, as_api_key: str = as_api_key, tags=None):
+    """This function returns one page of a flights query, from the cache or parsed
+    from AviationStack as it is received, see the module docstring.
+
+    Args:
+        query (str): The query parameters, e.g. "flight_iata=BA117".
+        page (int): The page, from 0.
+        as_api_key (str, optional): AviationStack API key. Defaults to the value from environment variables.
+        tags (list, optional): Cache tags besides the flights namespace. Defaults to None.
+
+    Raises:
+        RequestException: If the request fails or AviationStack returns an error payload.
+        Overloaded: If AviationStack has no capacity left for the request.
+        DeadlineExceeded: If the request's deadline passed first.
+
+    Returns:
+        tuple: The total number of flights of the query, and the page's Flights.
+    """
+    url = get_flights_url(query, page, as_api_key)
+    cache_key = get_cache_key(url)
+    with stage("flights_cache"):
+        cached = check_cache(cache_key)
+    if cached:
+        return cached["total"], [Flight(**flight) for flight in cached["data"]]
+
+    logger.debug("AviationStack flights request for %s, page %d", query, page)
+    total = None
+    flights = []
+    with admit("aviationstack"), stage("aviationstack"), upstream_call() as timeout:
+        with requests.get(url, timeout=timeout, stream=True) as response:
+            try:
+                for key, value in iter_members(_iter_text(response)):
+                    if key == "data":
+                        flights.append(Flight.from_response(value))
+                    elif key == "pagination" and isinstance(value, dict):
+                        total = value.get("total")
+                    elif key == "error":
+                        message = (value or {}).get("message", "unknown error")
+                        raise requests.exceptions.RequestException(
+                            f"AviationStack error: {message}"
+                        )
+            except ValueError as e:
+                raise requests.exceptions.RequestException(
+                    f"AviationStack error: invalid response, {e}"
+                ) from e
+    if not isinstance(total, int):
+        raise requests.exceptions.RequestException(
+            "AviationStack error: invalid response"
+        )
+    cache_response(
+        cache_key,
+        {"total": total, "data": [asdict(flight) for flight in flights]},
+        settings.FLIGHTS_EXPIRE,
+        tags=FLIGHT_TAGS + (tags or []),
+    )
+    return total, flights
+
+
+def fetch_flights(query, as_api_key: str = as_api_key, tags=None):
+    """This function fetches the first page of a flights query and returns an
+    iterator over all its flights, fetching the next pages concurrently.
+
+    Errors of the first page are raised here, before any flight is returned.
+    Errors of later pages are raised by the iterator.
+
+    Args:
+        query (str): The query parameters, e.g. "dep_iata=JFK".
+        as_api_key (str, optional): AviationStack API key. Defaults to the value from environment variables.
+        tags (list, optional): Cache tags besides the flights namespace. Defaults to None.
+
+    Raises:
+        ValueError: If the API key is missing.
+        RequestException: If the first page could not be fetched.
+        Overloaded: If AviationStack has no capacity left for the request.
+
+    Returns:
+        tuple: The total number of flights of the query, and an iterator of Flights.
+    """
+    if not as_api_key:
+        raise ValueError(
+            "AVIATIONSTACK_API_KEY is not set in the environment variables"
+        )
+    total, first = fetch_flights_page(query, 0, as_api_key, tags)
+    pages = min(settings.FLIGHTS_MAX_PAGES, math.ceil(total / PAGE_SIZE))
+    return total, _iter_pages(query, first, pages, as_api_key, tags)
+
+
+def _iter_pages(query, first, pages, as_api_key, tags):
+    pending = deque()
+    next_page = 1
+    try:
+        while True:
+            # Keep the next pages loading while earlier ones are consumed
+            while next_page < pages and len(pending) < settings.FLIGHTS_CONCURRENCY:
+                context = contextvars.copy_context()
+                pending.append(
+                    _executor.submit(
+                        context.run,
+                        fetch_flights_page,
+                        query,
+                        next_page,
+                        as_api_key,
+                        tags,
+                    )
+                )
+                next_page += 1
+            yield from first
+            if not pending:
+                return
+            _, first = pending.popleft().result()
+    finally:
+        # The client went away or a page failed, drop the pages not started
+        for future in pending:
+            future.cancel()
+
+
+def flight_status(flight_iata):
+    """This function returns the flights with an IATA flight number, e.g. today's
+    and recent ones.
+
+    Args:
+        flight_iata (str): IATA flight number, e.g. "BA117".
+
+    Raises:
+        ValueError: If the flight number is invalid or the API key is missing.
+        RequestException: If the flights could not be fetched.
+
+    Returns:
+        tuple: The total number of flights, and an iterator of Flights.
+    """
+    flight_iata = (flight_iata or "").upper()
+    if not FLIGHT_IATA.match(flight_iata):
+        raise ValueError("Flight number must be an IATA flight number, e.g. BA117")
+    return fetch_flights(f"flight_iata={flight_iata}")
+
+
+def airport_departures(airport_code):
+    """This function returns the flights departing from an airport.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Raises:
+        ValueError: If the airport code is not 3 or 4 letters or digits long or the API key is missing.
+        RequestException: If the flights could not be fetched.
+
+    Returns:
+        tuple: The total number of departures, and an iterator of Flights.
+    """
+    airport_code = (airport_code or "").upper()
+    # Checked in full, the code goes into the AviationStack query string
+    if not AIRPORT_CODE.match(airport_code):
+        raise ValueError("Airport code must be 3 or 4 letters or digits long")
+    code_type = "iata" if len(airport_code) == 3 else "icao"
+    query = f"dep_{code_type}={airport_code}"
+    return fetch_flights(query, tags=get_airport_tags(airport_code))
@@ -0,0 +1,320 @@
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+import redis
+from app.core import deadline
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.core.models import Airport, WeatherObservation
+from app.core.timing import stage
+from .aviationstack import (
+    AIRPORT_FOUND,
+    as_api_key,
+    classify_airport_response,
+    get_airport,
+    get_airport_url,
+)
+from .cache import (
+    RedisBackend,
+    cache_backend,
+    get_cache_key,
+    check_cache_many,
+    get_airport_tags,
+    index_key_tags,
+    local_cache,
+    redis_client,
+)
+from .summary import update_weather_summary
+from .tiles import index_observation
+from .weather import get_current_weather, get_local_weather_key
+
+"""
+Airport and weather lookup by airport code.
+
+Provider weather entries are keyed by location, so reading them needs the
+airport's coordinates first, two dependent round trips. A copy of the latest
+observation is also kept under the airport code, with the airport's
+coordinates in a long lived mapping beside it, so a warm lookup reads the
+airport record, its weather and its coordinates in one MGET.
+
+On a miss the weather fetch starts as soon as coordinates are known, from the
+local cache, the cached airport record or the coordinate mapping, while the
+airport itself is still being fetched.
+
+When the request's deadline is too close for an upstream call, or passes
+during one, the airport and weather are served from the local cache even if
+they expired, up to STALE_MAX_AGE seconds ago.
+"""
+
+logger = logging.getLogger(__name__)
+
+WEATHER_TAGS = ["ns:weather"]
+COORDS_TAGS = ["ns:airport"]
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="lookup")
+
+
+def get_airport_weather_key(airport_code):
+    """This function returns the cache key of the weather copy kept under an airport code.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        str: The cache key.
+    """
+    return f"weather:airport:{airport_code.upper()}"
+
+
+def get_coords_key(airport_code):
+    """This function returns the cache key of an airport code's coordinates.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        str: The cache key.
+    """
+    return f"airport:coords:{airport_code.upper()}"
+
+
+def _parse_weather(weather_info):
+    if not weather_info:
+        return None
+    try:
+        return WeatherObservation(**weather_info)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_airport(airport_info):
+    if not airport_info or classify_airport_response(airport_info) != AIRPORT_FOUND:
+        return None
+    try:
+        return Airport.from_response(airport_info)
+    except ValueError:
+        return None
+
+
+def _fetch_weather(latitude, longtitude, airport_code, iata=None, icao=None):
+    tags = get_airport_tags(airport_code, iata, icao)
+    return get_current_weather(latitude, longtitude, tags=tags, icao=icao)
+
+
+def store_airport_weather(airport_code, airport, weather, coords=True):
+    """This function writes the weather copy and coordinates of an airport code in one
+    pipelined round trip, and counts the refreshed weather in the network summary.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO) the airport was looked up by.
+        airport (Airport): The airport.
+        weather (WeatherObservation or None): Its current weather, None to skip the copy.
+        coords (bool, optional): Whether to write the coordinate mapping. Defaults to True.
+    """
+    coords_info = {
+        "latitude": airport.latitude,
+        "longitude": airport.longitude,
+        "iata": airport.iata,
+        "icao": airport.icao,
+    }
+    if not isinstance(cache_backend, RedisBackend):
+        # Embedded backends have no pipelines, tags, location index or summary
+        if weather is not None:
+            cache_backend.set_many(
+                {get_airport_weather_key(airport_code): json.dumps(asdict(weather))},
+                settings.AIRPORT_WEATHER_EXPIRE,
+            )
+        if coords:
+            cache_backend.set_many(
+                {get_coords_key(airport_code): json.dumps(coords_info)},
+                settings.AIRPORT_COORDS_EXPIRE,
+            )
+        return
+    airport_tags = get_airport_tags(airport_code, airport.iata, airport.icao)
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        key_tags = {}
+        if weather is not None:
+            weather_key = get_airport_weather_key(airport_code)
+            pipeline.setex(
+                weather_key,
+                settings.AIRPORT_WEATHER_EXPIRE,
+                json.dumps(asdict(weather)),
+            )
+            key_tags[weather_key] = WEATHER_TAGS + airport_tags
+            index_observation(
+                pipeline, weather_key, airport.latitude, airport.longitude
+            )
+        if coords:
+            coords_key = get_coords_key(airport_code)
+            pipeline.setex(
+                coords_key,
+                settings.AIRPORT_COORDS_EXPIRE,
+                json.dumps(coords_info),
+            )
+            key_tags[coords_key] = COORDS_TAGS + airport_tags
+        if not key_tags:
+            return
+        index_key_tags(
+            pipeline,
+            key_tags,
+            (
+                settings.AIRPORT_COORDS_EXPIRE
+                if coords
+                else settings.AIRPORT_WEATHER_EXPIRE
+            ),
+        )
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.error("Error caching airport weather: %s", e)
+        return
+    if weather is not None:
+        # Counted once whichever code the airport was looked up by
+        update_weather_summary(
+            airport.icao or airport.iata or airport_code,
+            weather,
+            {"country_name": airport.country, "timezone": airport.timezone},
+        )
+
+
+def get_stale_airport_weather(airport_code):
+    """This function returns an airport and its weather from the local cache, even if
+    they expired up to STALE_MAX_AGE seconds ago.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        tuple or None: The Airport and its WeatherObservation, or None if either is missing.
+    """
+    airport = local_cache.get_stale(f"airport:{airport_code}", settings.STALE_MAX_AGE)
+    if airport is None:
+        return None
+    weather = local_cache.get_stale(
+        get_local_weather_key(airport.latitude, airport.longitude),
+        settings.STALE_MAX_AGE,
+    )
+    return None if weather is None else (airport, weather)
+
+
+def lookup_airport_weather(airport_code: str = None):
+    """This function returns an airport and its current weather, in one Redis round
+    trip when both are cached, see the module docstring.
+
+    Args:
+        airport_code (str, optional): Airport code (IATA or ICAO). Defaults to None.
+
+    Raises:
+        ValueError: If the airport code is invalid or not found, see get_airport.
+        RequestException: If the airport or its weather could not be fetched.
+        Overloaded: If an upstream provider has no capacity left for the request.
+        DeadlineExceeded: If the request's deadline passed and nothing stale is cached.
+
+    Returns:
+        tuple: The Airport and its WeatherObservation.
+    """
+    if not airport_code:
+        raise ValueError("Airport code must be provided")
+    airport_code = airport_code.upper()
+    local_key = f"airport:{airport_code}"
+    airport = local_cache.get(local_key)
+    if airport is not None:
+        weather = local_cache.get(
+            get_local_weather_key(airport.latitude, airport.longitude)
+        )
+        if weather is not None:
+            return airport, weather
+    try:
+        return _lookup_uncached(airport_code, airport)
+    except DeadlineExceeded:
+        stale = get_stale_airport_weather(airport_code)
+        if stale is None:
+            raise
+        logger.warning("Deadline exceeded, serving stale %s", airport_code)
+        return stale
+
+
+def _lookup_uncached(airport_code, airport):
+    # The rest of lookup_airport_weather, airport is None unless cached locally
+    local_key = f"airport:{airport_code}"
+    deadline.check()
+    # One MGET for everything the request needs, the airport is skipped when local
+    cache_keys = [get_airport_weather_key(airport_code)]
+    if airport is None:
+        cache_keys += [
+            get_cache_key(get_airport_url(airport_code, as_api_key)),
+            get_coords_key(airport_code),
+        ]
+    with stage("lookup_cache"):
+        weather_info, *airport_infos = check_cache_many(cache_keys)
+    weather = _parse_weather(weather_info)
+    coords = None
+    missing_coords = False
+    if airport is None:
+        airport_info, coords = airport_infos
+        missing_coords = not coords
+        airport = _parse_airport(airport_info)
+        if airport is not None:
+            local_cache.set(local_key, airport, settings.CACHE_EXPIRE)
+
+    if (airport is None or weather is None) and deadline.near():
+        # An upstream call would not finish in time
+        stale = get_stale_airport_weather(airport_code)
+        if stale is not None:
+            logger.warning("Deadline close, serving stale %s", airport_code)
+            return stale
+
+    if airport is not None:
+        if weather is None:
+            weather = _fetch_weather(
+                airport.latitude,
+                airport.longitude,
+                airport_code,
+                airport.iata,
+                airport.icao,
+            )
+            store_airport_weather(airport_code, airport, weather, missing_coords)
+        elif missing_coords:
+            store_airport_weather(airport_code, airport, None)
+    elif weather is not None:
+        airport = get_airport(airport_code)
+        if missing_coords:
+            store_airport_weather(airport_code, airport, None)
+    elif coords:
+        # Start the weather fetch now, the airport is fetched meanwhile
+        context = contextvars.copy_context()
+        future = _executor.submit(
+            context.run,
+            _fetch_weather,
+            coords["latitude"],
+            coords["longitude"],
+            airport_code,
+            coords.get("iata"),
+            coords.get("icao"),
+        )
+        try:
+            airport = get_airport(airport_code)
+        except Exception:
+            future.cancel()
+            raise
+        weather = future.result()
+        store_airport_weather(airport_code, airport, weather, coords=False)
+    else:
+        airport = get_airport(airport_code)
+        weather = _fetch_weather(
+            airport.latitude,
+            airport.longitude,
+            airport_code,
+            airport.iata,
+            airport.icao,
+        )
+        store_airport_weather(airport_code, airport, weather)
+
+    local_cache.set(
+        get_local_weather_key(airport.latitude, airport.longitude),
+        weather,
+        settings.LOCAL_WEATHER_EXPIRE,
+    )
+    return airport, weather
@@ -0,0 +1,387 @@
+import csv
+import json
+import logging
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.core.models import WeatherObservation, compass_point
+from .cache import (
+    RedisBackend,
+    cache_backend,
+    redis_client,
+    get_airport_tags,
+    index_key_tags,
+)
+from .summary import update_weather_summary
+
+"""
+METAR ingestion, a weather source that needs no upstream call per airport.
+
+Bulk METAR files are parsed as a stream, one report at a time, into
+WeatherObservation in WeatherStack units, and loaded into the weather cache
+keyed by ICAO code. Plain text files hold one report per line, optionally
+preceded by "YYYY/MM/DD HH:MM" date lines as in the NOAA cycle files. CSV
+files, as published by aviationweather.gov, are read from their raw_text
+column.
+
+The parser splits each report into tokens and recognises groups by their
+shape, which is several times faster than matching a regular expression for
+every group.
+"""
+
+logger = logging.getLogger(__name__)
+
+METAR_TAGS = ["ns:weather", "provider:metar"]
+LOAD_BATCH_SIZE = 1000  # Stations written per pipeline
+
+KNOTS_TO_KMH = 1.852
+MPS_TO_KMH = 3.6
+MILES_TO_KM = 1.609344
+INHG_TO_HPA = 33.8639
+INCHES_TO_MM = 25.4
+
+# Okta of each cloud cover group, the middle of its WMO range
+CLOUD_OKTA = {"FEW": 2, "SCT": 4, "BKN": 6, "OVC": 8, "VV": 8}
+CLEAR_SKY = {"SKC", "CLR", "NSC", "NCD"}
+SKY_DESCRIPTIONS = {
+    0: "Clear",
+    2: "Partly cloudy",
+    4: "Partly cloudy",
+    6: "Cloudy",
+    8: "Overcast",
+}
+
+# Present weather codes, descriptors first
+WEATHER_CODES = {
+    "MI": "shallow",
+    "PR": "partial",
+    "BC": "patches of",
+    "DR": "drifting",
+    "BL": "blowing",
+    "SH": "showers of",
+    "TS": "thunderstorm",
+    "FZ": "freezing",
+    "DZ": "drizzle",
+    "RA": "rain",
+    "SN": "snow",
+    "SG": "snow grains",
+    "IC": "ice crystals",
+    "PL": "ice pellets",
+    "GR": "hail",
+    "GS": "small hail",
+    "UP": "unknown precipitation",
+    "BR": "mist",
+    "FG": "fog",
+    "FU": "smoke",
+    "VA": "volcanic ash",
+    "DU": "dust",
+    "SA": "sand",
+    "HZ": "haze",
+    "PY": "spray",
+    "PO": "dust whirls",
+    "SQ": "squalls",
+    "FC": "funnel cloud",
+    "SS": "sandstorm",
+    "DS": "duststorm",
+}
+PRECIPITATION = {"DZ", "RA", "SN", "SG", "IC", "PL", "GR", "GS", "UP"}
+# Precipitation in mm/h assumed from the intensity when no amount is reported,
+# inside the light (< 2.5), moderate and heavy (> 7.6) rain rate classes
+INTENSITY_PRECIP = {"-": 1.0, "": 5.0, "+": 10.0}
+
+
+def get_metar_key(icao_code):
+    """This function returns the cache key of an airport's latest METAR observation.
+
+    Args:
+        icao_code (str): ICAO airport code.
+
+    Returns:
+        str: The cache key.
+    """
+    return f"metar:{icao_code.upper()}"
+
+
+def _weather_group(token):
+    """Return the intensity and codes of a present weather group, or None."""
+    intensity = ""
+    if token[0] in "+-":
+        intensity, token = token[0], token[1:]
+    if token.startswith("VC"):
+        token = token[2:]
+    if not token or len(token) % 2:
+        return None
+    codes = [first + second for first, second in zip(token[::2], token[1::2])]
+    if not all(code in WEATHER_CODES for code in codes):
+        return None
+    return intensity, codes
+
+
+def _visibility_miles(token):
+    """Return the visibility of a statute mile group such as 10SM, 1/2SM or M1/4SM."""
+    value = token[:-2].lstrip("PM")
+    whole, _, fraction = value.rpartition(" ")
+    numerator, slash, denominator = fraction.partition("/")
+    miles = int(numerator) / int(denominator) if slash else int(numerator)
+    if whole:
+        miles += int(whole)
+    return miles
+
+
+def _temperature(value):
+    if not value:
+        return None
+    return -int(value[1:]) if value[0] == "M" else int(value)
+
+
+def parse_metar(report, reference=None):
+    """This function parses one METAR or SPECI report.
+
+    Args:
+        report (str): The report, e.g. "KJFK 231551Z 17010KT 10SM FEW250 27/18 A3027".
+        reference (datetime, optional): A UTC time shortly after the observation, used
+            to complete its day of month into a date. Defaults to now.
+
+    Raises:
+        ValueError: If the report has no station and observation time.
+
+    Returns:
+        tuple: The ICAO code and the WeatherObservation, or None if the report is NIL.
+    """
+    tokens = report.rstrip("= \n").split()
+    i = 1 if tokens and tokens[0] in ("METAR", "SPECI") else 0
+    if len(tokens) < i + 2:
+        raise ValueError("METAR must start with a station and observation time")
+    station, issued = tokens[i], tokens[i + 1]
+    if len(station) != 4 or not station.isalnum():
+        raise ValueError(f"Invalid METAR station {station!r}")
+    if len(issued) != 7 or issued[-1] != "Z" or not issued[:6].isdigit():
+        raise ValueError(f"Invalid METAR observation time {issued!r}")
+
+    reference = reference or datetime.now(timezone.utc)
+    day, hour, minute = int(issued[:2]), int(issued[2:4]), int(issued[4:6])
+    month_start = reference.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(2):
+        try:
+            observed = month_start.replace(day=day, hour=hour, minute=minute)
+        except ValueError:
+            observed = None
+        if observed is not None and observed <= reference + timedelta(hours=1):
+            break
+        # Reported on a day of the previous month
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    else:
+        raise ValueError(f"Invalid METAR observation time {issued!r}")
+
+    wind_degree = wind_speed = visibility = temperature = dew_point = None
+    pressure = precip = None
+    okta = None
+    phenomena = []
+    del tokens[: i + 2]
+    remarks = []
+    if "RMK" in tokens:
+        rmk = tokens.index("RMK")
+        tokens, remarks = tokens[:rmk], tokens[rmk:]
+
+    previous = None
+    for token in tokens:
+        if token == "NIL":
+            return None
+        if token in ("AUTO", "COR"):
+            pass
+        elif token.endswith(("KT", "MPS", "KMH")) and len(token) >= 7:
+            unit = "KT" if token.endswith("KT") else token[-3:]
+            group = token[: -len(unit)]
+            direction, speed = group[:3], group[3:].partition("G")[0]
+            if speed.isdigit():
+                factor = {"KT": KNOTS_TO_KMH, "MPS": MPS_TO_KMH}.get(unit, 1)
+                wind_speed = round(int(speed) * factor, 1)
+                wind_degree = int(direction) if direction.isdigit() else None
+        elif token == "CAVOK":
+            visibility, okta = 10.0, 0
+        elif token.endswith("SM"):
+            if previous is not None and previous.isdigit() and "/" in token:
+                token = f"{previous} {token}"  # e.g. "1 1/2SM"
+            try:
+                visibility = round(_visibility_miles(token) * MILES_TO_KM, 1)
+            except (ValueError, ZeroDivisionError):
+                pass
+            if token.startswith("P"):
+                visibility = max(visibility or 0, 10.0)
+        elif len(token) in (4, 7) and token[:4].isdigit() and visibility is None:
+            # Metres, 9999 means 10 km or more, optionally followed by NDV
+            visibility = 10.0 if token[:4] == "9999" else int(token[:4]) / 1000
+        elif token[:3] in CLOUD_OKTA or token[:2] == "VV":
+            cover = "VV" if token[:2] == "VV" else token[:3]
+            okta = max(okta or 0, CLOUD_OKTA[cover])
+        elif token in CLEAR_SKY:
+            okta = okta or 0
+        elif "/" in token and token[0] != "R" and temperature is None:
+            temp, _, dew = token.partition("/")
+            if temp.lstrip("M").isdigit() and (not dew or dew.lstrip("M").isdigit()):
+                temperature, dew_point = _temperature(temp), _temperature(dew)
+        elif len(token) == 5 and token[0] in "QA" and token[1:].isdigit():
+            value = int(token[1:])
+            pressure = value if token[0] == "Q" else round(value / 100 * INHG_TO_HPA)
+        else:
+            group = _weather_group(token)
+            if group:
+                phenomena.append(group)
+        previous = token
+
+    for token in remarks:
+        if len(token) == 9 and token[0] == "T" and token[1:].isdigit():
+            # Tenths of a degree, e.g. T02720183 is 27.2/18.3
+            sign = [-1 if token[1] == "1" else 1, -1 if token[5] == "1" else 1]
+            temperature = sign[0] * int(token[2:5]) / 10
+            dew_point = sign[1] * int(token[6:9]) / 10
+        elif len(token) == 5 and token[0] == "P" and token[1:].isdigit():
+            # Precipitation in the past hour, in hundredths of an inch
+            precip = round(int(token[1:]) / 100 * INCHES_TO_MM, 1)
+
+    if precip is None:
+        precip = 0.0
+        for intensity, codes in phenomena:
+            if PRECIPITATION.intersection(codes):
+                precip = max(precip, INTENSITY_PRECIP[intensity])
+
+    humidity = None
+    if temperature is not None and dew_point is not None:
+        # Inverse of the dew point approximation used by dew_point_calc
+        humidity = round(min(100, max(0, 100 - 5 * (temperature - dew_point))))
+
+    if phenomena:
+        intensity, codes = phenomena[0]
+        words = [WEATHER_CODES[code] for code in codes]
+        prefix = {"-": "light ", "+": "heavy "}.get(intensity, "")
+        description = (prefix + " ".join(words)).capitalize()
+    elif okta is not None:
+        description = SKY_DESCRIPTIONS[okta]
+    else:
+        description = None
+
+    return station, WeatherObservation(
+        city=None,
+        observation_time=observed.strftime("%I:%M %p"),
+        observed_at=int(observed.timestamp()),
+        temperature=temperature,
+        wind_speed=wind_speed,
+        wind_degree=wind_degree,
+        wind_dir=compass_point(wind_degree) if wind_degree is not None else "VRB",
+        pressure=pressure,
+        precip=precip,
+        humidity=humidity,
+        cloudcover=okta * 12.5 if okta is not None else None,
+        visibility=visibility,
+        description=description,
+        icon=None,
+    )
+
+
+def iter_reports(lines, file_format="text"):
+    """This function yields the reports of a METAR file with the time they refer to.
+
+    Args:
+        lines (iterable): The lines of the file.
+        file_format (str, optional): "text" or "csv". Defaults to "text".
+
+    Yields:
+        tuple: The report and the reference time to parse it with, or None for now.
+    """
+    if file_format == "csv":
+        column = None
+        for row in csv.reader(lines):
+            if column is None:
+                # aviationweather.gov files start with a few lines of metadata
+                if "raw_text" in row:
+                    column = row.index("raw_text")
+                continue
+            if len(row) > column and row[column]:
+                yield row[column], None
+        return
+
+    reference = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line[:4].isdigit() and line[4:5] == "/":
+            try:
+                reference = datetime.strptime(line, "%Y/%m/%d %H:%M").replace(
+                    tzinfo=timezone.utc
+                )
+                continue
+            except ValueError:
+                pass
+        yield line, reference
+
+
+def parse_reports(lines, file_format="text", errors=None):
+    """This function parses a METAR file, keeping the latest observation of each station.
+
+    Args:
+        lines (iterable): The lines of the file.
+        file_format (str, optional): "text" or "csv". Defaults to "text".
+        errors (list, optional): Receives the reports that could not be parsed. Defaults to None.
+
+    Returns:
+        dict: A mapping of ICAO code to its latest WeatherObservation.
+    """
+    latest = {}
+    for report, reference in iter_reports(lines, file_format):
+        try:
+            parsed = parse_metar(report, reference)
+        except (ValueError, IndexError) as e:
+            if errors is not None:
+                errors.append(f"{report}: {e}")
+            continue
+        if parsed is None:
+            continue
+        station, weather = parsed
+        current = latest.get(station)
+        if current is None or weather.observed_at >= current.observed_at:
+            latest[station] = weather
+    return latest
+
+
+def load_observations(observations, expire=None):
+    """This function writes METAR observations into the weather cache, tagged by airport,
+    in pipelines of LOAD_BATCH_SIZE stations.
+
+    Args:
+        observations (dict): A mapping of ICAO code to WeatherObservation.
+        expire (int, optional): Seconds the observations are kept. Defaults to METAR_EXPIRE.
+
+    Raises:
+        RedisError: If Redis cannot be reached.
+
+    Returns:
+        int: The number of observations written.
+    """
+    expire = expire or settings.METAR_EXPIRE
+    stations = list(observations)
+    for start in range(0, len(stations), LOAD_BATCH_SIZE):
+        end = start + LOAD_BATCH_SIZE
+        if not isinstance(cache_backend, RedisBackend):
+            # Embedded backends keep no tags
+            cache_backend.set_many(
+                {
+                    get_metar_key(station): json.dumps(asdict(observations[station]))
+                    for station in stations[start:end]
+                },
+                expire,
+            )
+            continue
+        pipeline = redis_client.pipeline(transaction=False)
+        key_tags = {}
+        for station in stations[start:end]:
+            key = get_metar_key(station)
+            pipeline.setex(key, expire, json.dumps(asdict(observations[station])))
+            key_tags[key] = METAR_TAGS + get_airport_tags(station)
+        index_key_tags(pipeline, key_tags, expire)
+        pipeline.execute()
+        for station in stations[start:end]:
+            # Stations have no airport data, the groups counted before are kept
+            update_weather_summary(station, observations[station])
+    logger.info("%d METAR observations loaded", len(stations))
+    return len(stations)
@@ -0,0 +1,87 @@
+import logging
+import requests
+from app.core.deadline import upstream_call
+from app.core.timing import stage
+from .admission import admit
+from .cache import get_cache_key, cache_response
+
+OPENMETEO_URL = "https://api.open-meteo.com/v1/forecast"
+# Current conditions requested, in km/h, mm, hPa and metres (Open-Meteo defaults)
+CURRENT_FIELDS = (
+    "temperature_2m",
+    "relative_humidity_2m",
+    "precipitation",
+    "weather_code",
+    "cloud_cover",
+    "pressure_msl",
+    "wind_speed_10m",
+    "wind_direction_10m",
+    "visibility",
+)
+
+logger = logging.getLogger(__name__)
+OPENMETEO_TAGS = ["ns:weather", "provider:openmeteo"]
+
+# Shared session, so connections are reused
+_session = requests.Session()
+
+
+def get_openmeteo_url(latitude, longtitude):
+    """This function builds the Open-Meteo current weather URL for one location.
+
+    Args:
+        latitude (str): Latitude of the location.
+        longtitude (str): Longitude of the location.
+
+    Returns:
+        str: The Open-Meteo URL, also used to derive the weather cache key.
+    """
+    return (
+        f"{OPENMETEO_URL}?latitude={latitude}&longitude={longtitude}"
+        f"&current={','.join(CURRENT_FIELDS)}&timeformat=unixtime"
+    )
+
+
+def validate_openmeteo_response(weather_info):
+    """This function checks that an Open-Meteo response holds current weather data.
+
+    Args:
+        weather_info (dict): The decoded JSON body returned by the Open-Meteo API.
+
+    Raises:
+        RequestException: If the body is an error payload.
+    """
+    if not isinstance(weather_info, dict) or "current" not in weather_info:
+        reason = weather_info.get("reason") if isinstance(weather_info, dict) else None
+        raise requests.exceptions.RequestException(
+            f"Open-Meteo error: {reason or 'invalid response'}"
+        )
+
+
+def fetch_openmeteo_info(latitude, longtitude, tags: list = None):
+    """This function fetches the current weather at a location from the Open-Meteo API,
+    without checking the cache first, and caches the response.
+
+    Open-Meteo needs no API key.
+
+    Args:
+        latitude (str): Latitude of the location.
+        longtitude (str): Longitude of the location.
+        tags (list, optional): Cache tags besides the weather namespace, e.g. the airport's. Defaults to None.
+
+    Raises:
+        RequestException: If the request fails or Open-Meteo returns an error payload.
+        Overloaded: If Open-Meteo has no capacity left for the request.
+        DeadlineExceeded: If the request's deadline passed first.
+
+    Returns:
+        dict: The Open-Meteo response.
+    """
+    url = get_openmeteo_url(latitude, longtitude)
+    logger.debug("Open-Meteo request for %s, %s", latitude, longtitude)
+    with admit("openmeteo"), stage("openmeteo"), upstream_call() as timeout:
+        response = _session.get(url, timeout=timeout)
+        weather_info = response.json()
+    validate_openmeteo_response(weather_info)
+    cache_response(get_cache_key(url), weather_info, tags=OPENMETEO_TAGS + (tags or []))
+    return weather_info
@@ -0,0 +1,358 @@
+import bisect
+import hashlib
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+import redis
+
+"""
+Client-side sharding over several Redis nodes.
+
+Keys are placed on shards with a consistent hash ring, so adding or removing
+a shard only moves the keys of the ring segments it gains or loses. Like Redis
+Cluster, only the part of a key inside {braces} is hashed when present, so
+keys a script touches together can be kept on one shard.
+
+Each shard has a primary and optional replicas. Writes, scripts and
+transactions go to the primary, reads to a random replica, falling back to
+the primary if the replica cannot be reached.
+"""
+
+logger = logging.getLogger(__name__)
+
+VIRTUAL_NODES = 160  # Ring points per shard, evens out the key distribution
+
+# Commands routed to replicas. SMEMBERS stays on the primary, because a tag set
+# read for invalidation must list entries written just before.
+READ_COMMANDS = frozenset(
+    {
+        "get",
+        "mget",
+        "exists",
+        "ttl",
+        "strlen",
+        "hget",
+        "hmget",
+        "hgetall",
+        "scard",
+        "srandmember",
+        "zscore",
+        "memory_usage",
+    }
+)
+# Commands taking several keys, split per shard and their results added up
+MULTI_KEY_COMMANDS = frozenset({"delete", "unlink", "exists"})
+
+
+def parse_nodes(spec):
+    """This function parses a list of Redis nodes.
+
+    Args:
+        spec (str): Comma separated shards, each a primary followed by its replicas
+            separated by "|", e.g. "redis-a:6379|redis-a-replica:6379,redis-b:6379".
+
+    Raises:
+        ValueError: If a node is not in host:port form.
+
+    Returns:
+        list: One (primary, replicas) tuple of (host, port) addresses per shard.
+    """
+    shards = []
+    for shard in spec.split(","):
+        addresses = []
+        for node in shard.strip().split("|"):
+            host, _, port = node.strip().rpartition(":")
+            if not host or not port.isdigit():
+                raise ValueError(f"Redis node must be host:port, got {node!r}")
+            addresses.append((host, int(port)))
+        shards.append((addresses[0], addresses[1:]))
+    return shards
+
+
+def get_hash_tag(key):
+    """This function returns the part of a key that decides its shard, the text
+    inside the first {braces} if any, else the whole key."""
+    start = key.find("{") + 1
+    if start:
+        end = key.find("}", start)
+        if end > start:
+            return key[start:end]
+    return key
+
+
+def _hash(value):
+    return int.from_bytes(
+        hashlib.md5(value.encode(), usedforsecurity=False).digest()[:8], "big"
+    )
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to shard names."""
+
+    def __init__(self, names, virtual_nodes=VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"{name}#{i}"), name) for name in names for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def get(self, key):
+        """Return the name of the shard owning key."""
+        i = bisect.bisect(self._hashes, _hash(get_hash_tag(key)))
+        return self._names[i % len(self._names)]
+
+
+class Shard:
+    """A primary Redis client with its replicas."""
+
+    def __init__(self, name, primary, replicas=()):
+        self.name = name
+        self.primary = primary
+        self.replicas = list(replicas)
+
+    def reader(self):
+        return random.choice(self.replicas) if self.replicas else self.primary
+
+
+class ShardedRedis:
+    """Redis client spreading keys over shards, with the subset of the redis.Redis
+    interface the cache layer uses.
+
+    Single key commands run on the shard owning their first argument. MGET, DEL,
+    UNLINK and EXISTS are split per shard, and pipelines run one pipeline per
+    shard in parallel. Publish and subscribe use the first shard.
+    """
+
+    def __init__(self, shards, read_from_replicas=True):
+        self.shards = {shard.name: shard for shard in shards}
+        self.ring = HashRing(list(self.shards))
+        self.read_from_replicas = read_from_replicas
+        self._pubsub_shard = shards[0]
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(shards), thread_name_prefix="redis-shard"
+        )
+
+    @classmethod
+    def from_spec(cls, spec, read_from_replicas=True, client_factory=redis.Redis):
+        """This function creates a sharded client from a node list, see parse_nodes.
+
+        Args:
+            spec (str): The Redis nodes.
+            read_from_replicas (bool, optional): Route reads to replicas. Defaults to True.
+            client_factory (callable, optional): Creates the client of one node. Defaults to redis.Redis.
+
+        Returns:
+            ShardedRedis: The sharded client.
+        """
+
+        def connect(address):
+            host, port = address
+            return client_factory(host=host, port=port, decode_responses=True)
+
+        return cls(
+            [
+                Shard(
+                    f"{primary[0]}:{primary[1]}",
+                    connect(primary),
+                    map(connect, replicas),
+                )
+                for primary, replicas in parse_nodes(spec)
+            ],
+            read_from_replicas,
+        )
+
+    def get_shard(self, key):
+        return self.shards[self.ring.get(key)]
+
+    def group_keys(self, keys):
+        """Group keys by the name of their shard, keeping their positions."""
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self.ring.get(key), []).append(i)
+        return groups
+
+    def run(self, shard, read, operation):
+        """Run operation(client) on a replica for reads, else on the primary."""
+        if read and self.read_from_replicas and shard.replicas:
+            try:
+                return operation(shard.reader())
+            except redis.ConnectionError as e:
+                logger.warning(
+                    "Redis replica of %s unavailable, reading from primary: %s",
+                    shard.name,
+                    e,
+                )
+        return operation(shard.primary)
+
+    def map_shards(self, function, items):
+        """Apply function to every (shard name, value) item, in parallel if there are several."""
+        items = list(items)
+        if len(items) == 1:
+            return [function(*items[0])]
+        return list(self._executor.map(lambda item: function(*item), items))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        read = name in READ_COMMANDS
+
+        def command(key, *args, **kwargs):
+            return self.run(
+                self.get_shard(key),
+                read,
+                lambda client: getattr(client, name)(key, *args, **kwargs),
+            )
+
+        return command
+
+    def mget(self, keys, *args):
+        keys = list(keys) + list(args)
+        groups = self.group_keys(keys)
+
+        def fetch(name, positions):
+            return self.run(
+                self.shards[name],
+                True,
+                lambda client: client.mget([keys[i] for i in positions]),
+            )
+
+        values = [None] * len(keys)
+        for positions, found in zip(
+            groups.values(), self.map_shards(fetch, groups.items())
+        ):
+            for i, value in zip(positions, found):
+                values[i] = value
+        return values
+
+    def _multi_key(self, name, keys):
+        groups = self.group_keys(keys)
+
+        def apply(shard_name, positions):
+            return self.run(
+                self.shards[shard_name],
+                name in READ_COMMANDS,
+                lambda client: getattr(client, name)(*(keys[i] for i in positions)),
+            )
+
+        return sum(self.map_shards(apply, groups.items()))
+
+    def delete(self, *keys):
+        return self._multi_key("delete", keys)
+
+    def unlink(self, *keys):
+        return self._multi_key("unlink", keys)
+
+    def exists(self, *keys):
+        return self._multi_key("exists", keys)
+
+    def pipeline(self, transaction=True):
+        return ShardedPipeline(self, transaction)
+
+    def register_script(self, script):
+        return ShardedScript(self, script)
+
+    def publish(self, channel, message):
+        return self._pubsub_shard.primary.publish(channel, message)
+
+    def pubsub(self, **kwargs):
+        return self._pubsub_shard.primary.pubsub(**kwargs)
+
+    def info(self, section=None):
+        """Return INFO of every primary, numeric fields added up."""
+        merged = {}
+        for shard in self.shards.values():
+            for field, value in shard.primary.info(section).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    merged[field] = merged.get(field, 0) + value
+                else:
+                    merged.setdefault(field, value)
+        return merged
+
+    def dbsize(self):
+        return sum(shard.primary.dbsize() for shard in self.shards.values())
+
+
+class ShardedPipeline:
+    """Pipeline queuing commands for several shards, executed as one pipeline per
+    shard. With transaction=True each shard's commands are atomic, but the shards
+    are not atomic with each other."""
+
+    def __init__(self, client, transaction=True):
+        self._client = client
+        self._transaction = transaction
+        self._commands = []
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        client = self._client
+        plan = {}
+        for position, (name, args, kwargs) in enumerate(self._commands):
+            if name in MULTI_KEY_COMMANDS:
+                for shard_name, positions in client.group_keys(args).items():
+                    keys = [args[i] for i in positions]
+                    plan.setdefault(shard_name, []).append(
+                        (position, name, keys, kwargs)
+                    )
+            elif name == "publish":
+                shard_name = client._pubsub_shard.name
+                plan.setdefault(shard_name, []).append((position, name, args, kwargs))
+            else:
+                shard_name = client.ring.get(args[0])
+                plan.setdefault(shard_name, []).append((position, name, args, kwargs))
+
+        def run(shard_name, commands):
+            read = not self._transaction and all(
+                name in READ_COMMANDS for _, name, _, _ in commands
+            )
+
+            def execute(node):
+                pipeline = node.pipeline(transaction=self._transaction)
+                for _, name, args, kwargs in commands:
+                    getattr(pipeline, name)(*args, **kwargs)
+                return pipeline.execute()
+
+            return client.run(client.shards[shard_name], read, execute)
+
+        results = [
+            0 if name in MULTI_KEY_COMMANDS else None for name, _, _ in self._commands
+        ]
+        for commands, outputs in zip(
+            plan.values(), client.map_shards(run, plan.items())
+        ):
+            for (position, name, _, _), output in zip(commands, outputs):
+                if name in MULTI_KEY_COMMANDS:
+                    results[position] += output
+                else:
+                    results[position] = output
+        self._commands = []
+        return results
+
+
+class ShardedScript:
+    """Lua script run on the shard owning its keys, registered per shard on first use."""
+
+    def __init__(self, client, script):
+        self._client = client
+        self._script = script
+        self._scripts = {}
+
+    def __call__(self, keys=None, args=None, client=None):
+        keys = keys or []
+        shard_names = {self._client.ring.get(key) for key in keys}
+        if len(shard_names) != 1:
+            raise redis.RedisError(
+                "Script keys must belong to one shard, use a common {hash tag}"
+            )
+        shard = self._client.shards[shard_names.pop()]
+        if shard.name not in self._scripts:
+            self._scripts[shard.name] = shard.primary.register_script(self._script)
+        return self._scripts[shard.name](keys=keys, args=args)
@@ -0,0 +1,253 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+"""
+Cache shared by the workers of a host.
+
+Every worker reads the same cached airports and responses from Redis and
+keeps them in its own local cache. This table holds the serialized entries
+once per host, in a memory mapped file under SHARED_CACHE_PATH (/dev/shm keeps
+it in memory), so a worker finds entries any other worker has read or
+written without a Redis round trip.
+
+The file is a fixed size open addressing hash table of SHARED_CACHE_SLOTS
+slots of SHARED_CACHE_SLOT_SIZE bytes, probed linearly from the key's hash.
+Each slot holds a sequence number, the key hash, its expiry and generation,
+then the key and value. Entries too large for a slot are not shared.
+
+Reads take no lock. A writer makes the slot's sequence number odd, writes the
+entry and makes it even again, and a reader retries when the number was odd
+or changed while it copied the slot (a seqlock). Writers lock the slot they
+write, with a thread lock and a POSIX record lock on its bytes, so each slot,
+and so each key, has one writer at a time across workers.
+
+Expired entries are skipped and their slots reused. When no slot of the probe
+sequence is free, the one expiring first is replaced. clear() increments the
+table's generation, which expires every entry at once.
+"""
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CFSH"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHIIQ")  # Magic, version, slots, slot size, generation
+GENERATION_OFFSET = 14
+SLOT = struct.Struct("<IQdQHI")  # Sequence, key hash, expires at, generation, sizes
+PROBES = 8  # Slots tried per key
+READ_RETRIES = 4  # Reads racing a write are retried, then treated as misses
+LOCK_STRIPES = 64
+
+
+def key_hash(key):
+    """Return the non-zero 64-bit hash of a key, 0 marks slots never written."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class SharedCache:
+    """Hash table in a memory mapped file shared by processes, see the module docstring."""
+
+    def __init__(self, path, slots=16384, slot_size=2048):
+        self.path = path
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER.size + slots * slot_size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) < HEADER.size or HEADER.unpack(header)[:4] != (
+                MAGIC,
+                FORMAT_VERSION,
+                slots,
+                slot_size,
+            ):
+                # New file, or created with another layout
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(
+                    self._fd, HEADER.pack(MAGIC, FORMAT_VERSION, slots, slot_size, 1), 0
+                )
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.capacity = slot_size - SLOT.size  # Bytes for the key and value
+        self._map = mmap.mmap(self._fd, size)
+
+    def get(self, key):
+        """Return the value cached under key, or None if it is missing or expired."""
+        encoded = key.encode()
+        hashed = key_hash(key)
+        now = time.time()
+        generation = self._generation()
+        for offset in self._probe(hashed):
+            for _ in range(READ_RETRIES):
+                entry = self._read(offset)
+                if entry is not None:
+                    break
+            else:
+                continue
+            slot_hash, expires_at, slot_generation, data, key_length = entry
+            if slot_hash == 0:
+                return None  # Never written, the key is not further along
+            if (
+                slot_hash == hashed
+                and data[:key_length] == encoded
+                and expires_at > now
+                and slot_generation == generation
+            ):
+                return data[key_length:].decode()
+        return None
+
+    def get_many(self, keys):
+        """Return the values cached under keys, in order, with None for missing keys."""
+        return [self.get(key) for key in keys]
+
+    def set_many(self, items, expire):
+        """Cache items, a mapping of key to serialized value, for expire seconds.
+        Entries larger than a slot are skipped."""
+        expires_at = time.time() + expire
+        generation = self._generation()
+        for key, value in items.items():
+            encoded = key.encode()
+            data = encoded + value.encode()
+            if len(data) <= self.capacity:
+                self._write(key, data, len(encoded), expires_at, generation)
+
+    def delete(self, *keys):
+        """Delete keys, so they are missed until written again."""
+        for key in keys:
+            self._write(key, None, 0, 0, 0)
+
+    def clear(self):
+        """Expire every entry, by moving the table to the next generation."""
+        with self._locks[0]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+            try:
+                struct.pack_into(
+                    "<Q", self._map, GENERATION_OFFSET, self._generation() + 1
+                )
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _generation(self):
+        return struct.unpack_from("<Q", self._map, GENERATION_OFFSET)[0]
+
+    def _probe(self, hashed):
+        for i in range(min(PROBES, self.slots)):
+            yield HEADER.size + (hashed + i) % self.slots * self.slot_size
+
+    def _read(self, offset):
+        # Copies one slot, None if a write was in progress or happened meanwhile
+        sequence, slot_hash, expires_at, generation, key_length, value_length = (
+            SLOT.unpack_from(self._map, offset)
+        )
+        if sequence & 1:
+            return None
+        start = offset + SLOT.size
+        end = start + min(key_length + value_length, self.capacity)
+        data = self._map[start:end]
+        if struct.unpack_from("<I", self._map, offset)[0] != sequence:
+            return None
+        return slot_hash, expires_at, generation, data, key_length
+
+    def _peek(self, offset):
+        # The hash, expiry, generation and key of a slot, consistent if it is locked
+        _, slot_hash, expires_at, generation, key_length, _ = SLOT.unpack_from(
+            self._map, offset
+        )
+        start = offset + SLOT.size
+        end = start + min(key_length, self.capacity)
+        return slot_hash, expires_at, generation, self._map[start:end]
+
+    def _write(self, key, data, key_length, expires_at, generation):
+        # Writes data to the slot holding key, else to the first free or expired
+        # slot, else over the entry expiring first. data None deletes the key.
+        hashed = key_hash(key)
+        encoded = key.encode()
+        now = time.time()
+        current = self._generation()
+        matches = []
+        free = None
+        victim = None
+        for offset in self._probe(hashed):
+            slot_hash, slot_expires, slot_generation, slot_key = self._peek(offset)
+            if slot_hash == hashed and slot_key == encoded:
+                matches.append(offset)
+            elif slot_hash == 0 or slot_expires <= now or slot_generation != current:
+                free = offset if free is None else free
+                if slot_hash == 0:
+                    break
+            elif victim is None or slot_expires < victim[1]:
+                victim = (offset, slot_expires)
+
+        if data is None:
+            duplicates = matches
+        else:
+            duplicates = matches[1:]
+            target = matches[0] if matches else free
+            if target is None:
+                target = victim[0]
+            with self._lock(target):
+                slot_hash, slot_expires, slot_generation, slot_key = self._peek(target)
+                taken = not (slot_hash == hashed and slot_key == encoded) and (
+                    slot_expires > now and slot_generation == current
+                )
+                if target == free and taken:
+                    return  # Another key took the free slot meanwhile, keep it
+                self._store(target, hashed, expires_at, generation, data, key_length)
+        for offset in duplicates:
+            with self._lock(offset):
+                slot_hash, _, _, slot_key = self._peek(offset)
+                if slot_hash == hashed and slot_key == encoded:
+                    self._store(offset, hashed, 0, 0, b"", 0)
+
+    def _store(self, offset, hashed, expires_at, generation, data, key_length):
+        # Called with the slot locked, readers retry while the sequence is odd
+        sequence = struct.unpack_from("<I", self._map, offset)[0]
+        sequence = sequence + 1 if sequence % 2 == 0 else sequence  # Odd, writing
+        struct.pack_into("<I", self._map, offset, sequence)
+        start = offset + SLOT.size
+        end = start + len(data)
+        self._map[start:end] = data
+        SLOT.pack_into(
+            self._map,
+            offset,
+            sequence,
+            hashed,
+            expires_at,
+            generation,
+            key_length,
+            len(data) - key_length,
+        )
+        struct.pack_into("<I", self._map, offset, (sequence + 1) & 0xFFFFFFFF)
+
+    def _lock(self, offset):
+        return _SlotLock(self, offset)
+
+
+class _SlotLock:
+    """Locks one slot against the threads of this process and other processes."""
+
+    def __init__(self, cache, offset):
+        self.cache = cache
+        self.offset = offset
+        self.lock = cache._locks[offset // cache.slot_size % LOCK_STRIPES]
+
+    def __enter__(self):
+        self.lock.acquire()
+        fcntl.lockf(self.cache._fd, fcntl.LOCK_EX, self.cache.slot_size, self.offset)
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(self.cache._fd, fcntl.LOCK_UN, self.cache.slot_size, self.offset)
+        self.lock.release()
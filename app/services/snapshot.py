@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+from dataclasses import asdict, fields
+from app.core.config import settings
+from app.core.models import Airport, WeatherObservation
+from .cache import local_cache
+
+"""
+Local cache snapshots.
+
+Workers start with an empty local cache, so after a restart or deploy every
+request goes to Redis, and often upstream, until the hot airports are loaded
+again. The local cache is written to LOCAL_SNAPSHOT_PATH every
+LOCAL_SNAPSHOT_INTERVAL seconds and at shutdown, and new workers restore it at
+startup, skipping entries that have expired since.
+
+File layout, little endian:
+
+    header  magic "CFLC", format version, schema hash, entry count, saved at
+    index   one fixed size record per entry: expires at, kind, offset of the
+            entry in the data section, key length, value length
+    data    each entry's UTF-8 key followed by its value as compact JSON
+
+The file is memory mapped when restored, so the index is read in place and
+only entries that are still fresh are decoded. Files of another format
+version, or written while the models had other fields, are ignored. Workers
+write the file in turn, each replacing it atomically, so the last snapshot
+wins.
+"""
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CFLC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHIId")
+ENTRY = struct.Struct("<dBIHI")
+
+# Kinds of values snapshotted, by their index in the file
+KINDS = (Airport, WeatherObservation)
+SCHEMA_HASH = zlib.crc32(
+    ";".join(
+        f"{kind.__name__}:{','.join(field.name for field in fields(kind))}"
+        for kind in KINDS
+    ).encode()
+)
+
+
+def save_snapshot(cache=local_cache, path=None):
+    """This function writes the unexpired airports and weather of a local cache to a
+    snapshot file, replacing it atomically.
+
+    Args:
+        cache (LocalCache, optional): The cache to snapshot. Defaults to local_cache.
+        path (str, optional): The snapshot file. Defaults to LOCAL_SNAPSHOT_PATH.
+
+    Returns:
+        int: The number of entries written.
+    """
+    path = path or settings.LOCAL_SNAPSHOT_PATH
+    now = time.time()
+    index = bytearray()
+    data = bytearray()
+    count = 0
+    for key, expires_at, value in cache.items():
+        if expires_at <= now or type(value) not in KINDS:
+            continue
+        encoded_key = key.encode()
+        encoded_value = json.dumps(asdict(value), separators=(",", ":")).encode()
+        index += ENTRY.pack(
+            expires_at,
+            KINDS.index(type(value)),
+            len(data),
+            len(encoded_key),
+            len(encoded_value),
+        )
+        data += encoded_key + encoded_value
+        count += 1
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        try:
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, SCHEMA_HASH, count, now))
+            file.write(index)
+            file.write(data)
+        except OSError:
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+    return count
+
+
+def restore_snapshot(cache=local_cache, path=None):
+    """This function loads the entries of a snapshot file that have not expired into a
+    local cache, keeping their original expiry.
+
+    Missing, corrupt or incompatible files are skipped, the cache then fills up
+    from Redis as usual.
+
+    Args:
+        cache (LocalCache, optional): The cache to fill. Defaults to local_cache.
+        path (str, optional): The snapshot file. Defaults to LOCAL_SNAPSHOT_PATH.
+
+    Returns:
+        int: The number of entries restored.
+    """
+    path = path or settings.LOCAL_SNAPSHOT_PATH
+    try:
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                return _restore(cache, view)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning("Ignoring local cache snapshot %s: %s", path, e)
+        return 0
+
+
+def _restore(cache, view):
+    magic, version, schema_hash, count, saved_at = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"unsupported format {magic!r} version {version}")
+    if schema_hash != SCHEMA_HASH:
+        raise ValueError("written for other model fields")
+    data_start = HEADER.size + count * ENTRY.size
+    if data_start > len(view):
+        raise ValueError("truncated index")
+
+    now = time.time()
+    restored = 0
+    for position in range(HEADER.size, data_start, ENTRY.size):
+        expires_at, kind, offset, key_length, value_length = ENTRY.unpack_from(
+            view, position
+        )
+        if expires_at <= now or kind >= len(KINDS):
+            continue
+        key_start = data_start + offset
+        value_start = key_start + key_length
+        value_end = value_start + value_length
+        if value_end > len(view):
+            raise ValueError("truncated data")
+        key = view[key_start:value_start].decode()
+        try:
+            value = KINDS[kind](**json.loads(view[value_start:value_end]))
+        except (TypeError, ValueError):
+            continue
+        cache.set(key, value, expires_at - now)
+        restored += 1
+    logger.info(
+        "Restored %s local cache entries from a snapshot taken %.0fs ago",
+        restored,
+        now - saved_at,
+    )
+    return restored
+
+
+async def snapshot_periodically():
+    """This function writes a snapshot every LOCAL_SNAPSHOT_INTERVAL seconds, in a
+    thread so the event loop keeps serving requests, until it is cancelled."""
+    while True:
+        await asyncio.sleep(settings.LOCAL_SNAPSHOT_INTERVAL)
+        try:
+            await asyncio.to_thread(save_snapshot)
+        except OSError as e:
+            logger.error("Error writing local cache snapshot: %s", e)
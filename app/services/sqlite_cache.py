@@ -0,0 +1,202 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+"""
+Embedded cache backend on SQLite.
+
+Lets a single node cache without running Redis, with CACHE_BACKEND=sqlite.
+Entries live in one table of a database file in WAL mode, so every worker
+process on the node shares them and readers never wait for the writer.
+
+Reads run on a connection per thread. Writes are queued in memory, where
+reads see them at once, and a writer thread commits them in one transaction
+every CACHE_SQLITE_FLUSH_MS or as soon as CACHE_SQLITE_BATCH_SIZE are queued.
+Expired entries are never returned, and the writer deletes them every
+CACHE_SQLITE_SWEEP_INTERVAL seconds.
+"""
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+"""
+MAX_VARIABLES = 500  # Keys per SELECT, below SQLite's bound parameter limit
+SWEEP_BATCH_SIZE = 1000  # Expired entries deleted per transaction
+DELETED = None  # Queued in place of a value for deleted keys
+_MISSING = object()
+
+
+class SQLiteCache:
+    """Cache backend storing entries in a SQLite database, see the module docstring."""
+
+    def __init__(self, path, flush_interval=0.005, batch_size=500, sweep_interval=60):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = {}  # Writes not committed yet, key: (value, expires_at)
+        self._flushing = {}  # Writes being committed, still visible to reads
+        self._wake = threading.Event()
+        self._running = True
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        self._writer = threading.Thread(
+            target=self._write, name="sqlite-cache", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def get(self, key):
+        """Return the value cached under key, or None if it is missing or expired."""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        """Return the values cached under keys, in order, with None for missing keys."""
+        now = time.time()
+        values = {}
+        uncached = []  # Keys without a queued write, read from the database
+        with self._lock:
+            for key in keys:
+                entry = self._queued(key)
+                if entry is _MISSING:
+                    uncached.append(key)
+                elif entry is not DELETED and entry[1] > now:
+                    values[key] = entry[0]
+        connection = self._connection()
+        while uncached:
+            batch, uncached = uncached[:MAX_VARIABLES], uncached[MAX_VARIABLES:]
+            rows = connection.execute(
+                "SELECT key, value FROM entries"
+                f" WHERE key IN ({','.join('?' * len(batch))}) AND expires_at > ?",
+                (*batch, now),
+            )
+            values.update(rows)
+        return [values.get(key) for key in keys]
+
+    def set_many(self, items, expire, tags=None):
+        """Queue items, a mapping of key to serialized value, to expire after expire
+        seconds. Tags are not indexed, invalidation by tag needs Redis."""
+        expires_at = time.time() + expire
+        with self._lock:
+            for key, value in items.items():
+                self._pending[key] = (value, expires_at)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def ttl(self, key):
+        """Return the seconds left before key expires, -2 if it is missing, like Redis."""
+        now = time.time()
+        with self._lock:
+            entry = self._queued(key)
+        if entry is _MISSING:
+            entry = (
+                self._connection()
+                .execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,))
+                .fetchone()
+            )
+        if entry is None or entry[1] <= now:
+            return -2
+        return int(entry[1] - now)
+
+    def delete(self, *keys):
+        """Delete keys, returning how many of them were cached."""
+        deleted = sum(value is not None for value in self.get_many(keys))
+        with self._lock:
+            for key in keys:
+                self._pending[key] = DELETED
+        self._wake.set()
+        return deleted
+
+    def flush(self):
+        """Commit the queued writes in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+        writes = []
+        deletes = []
+        for key, entry in self._flushing.items():
+            if entry is DELETED:
+                deletes.append((key,))
+            else:
+                writes.append((key, *entry))
+        connection = self._connection()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", writes
+                )
+                connection.executemany("DELETE FROM entries WHERE key = ?", deletes)
+        finally:
+            with self._lock:
+                self._flushing = {}
+
+    def sweep(self):
+        """Delete expired entries, in batches so readers are not held up.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        connection = self._connection()
+        deleted = 0
+        while True:
+            with connection:
+                count = connection.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries"
+                    " WHERE expires_at <= ? LIMIT ?)",
+                    (time.time(), SWEEP_BATCH_SIZE),
+                ).rowcount
+            deleted += count
+            if count < SWEEP_BATCH_SIZE:
+                return deleted
+
+    def close(self):
+        """Stop the writer thread, committing the writes still queued."""
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        self._writer.join()
+
+    def _queued(self, key):
+        # Called with the lock held, pending writes are newer than those flushing
+        entry = self._pending.get(key, _MISSING)
+        if entry is _MISSING:
+            entry = self._flushing.get(key, _MISSING)
+        return entry
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _write(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            running = self._running
+            try:
+                self.flush()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.sweep_interval
+                    self.sweep()
+            except sqlite3.Error as e:
+                logger.error("Error writing to the SQLite cache: %s", e)
+            if not running:
+                return
@@ -0,0 +1,204 @@
+import logging
+import time
+import redis
+from app.core.config import settings
+from app.core.utils import okta_calc, weather_risk_calc
+from .cache import redis_client
+
+"""
+Network risk summary, counters of airports per weather_rating band and group.
+
+The summary is updated whenever an airport's weather copy is written to the
+cache, by lookups, prewarms and batch profiles, and by METAR loads. METAR
+stations carry no airport data, so they update the bands and keep the groups
+the airport was last counted under. Airports whose weather was not refreshed
+for SUMMARY_MAX_AGE seconds are dropped from the counters when the summary is
+read.
+"""
+
+logger = logging.getLogger(__name__)
+
+# The keys share the {network} hash tag so the scripts run on one shard
+SUMMARY_KEY = "summary:{network}"  # Counters per rating band and group
+SUMMARY_STATE_KEY = (
+    "summary:{network}:airports"  # Band and groups each airport is counted under
+)
+SUMMARY_SEEN_KEY = (
+    "summary:{network}:seen"  # Sorted set of airports by last update time
+)
+SUMMARY_KEYS = [SUMMARY_KEY, SUMMARY_STATE_KEY, SUMMARY_SEEN_KEY]
+GROUPS = ("country_name", "timezone")
+EXPIRE_BATCH_SIZE = 1000  # Stale airports dropped per read at most
+
+# An airport's state is its band followed by its groups, e.g.
+# "3\31country_name:France\31timezone:Europe/Paris", and it is counted under
+# "weather_rating:{band}" and "{group}:{band}" for each group.
+_COUNT_STATE = r"""
+local function count(counters, state, increment)
+    local band
+    for part in string.gmatch(state, '[^\31]+') do
+        if band then
+            redis.call('HINCRBY', counters, part .. ':' .. band, increment)
+        else
+            band = part
+            redis.call('HINCRBY', counters, 'weather_rating:' .. band, increment)
+        end
+    end
+end
+"""
+
+# Moves an airport between counters atomically in one round trip.
+# KEYS = SUMMARY_KEYS
+# ARGV[1] = airport code, ARGV[2] = update time, ARGV[3] = band,
+# ARGV[4..] = its groups, the previous ones are kept when there are none
+_UPDATE_SCRIPT = _COUNT_STATE + r"""
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+local previous = redis.call('HGET', KEYS[2], ARGV[1])
+local state = table.concat(ARGV, '\31', 3)
+if #ARGV == 3 and previous then
+    local groups = string.find(previous, '\31')
+    if groups then
+        state = state .. string.sub(previous, groups)
+    end
+end
+if previous == state then
+    return 0
+end
+if previous then
+    count(KEYS[1], previous, -1)
+end
+count(KEYS[1], state, 1)
+redis.call('HSET', KEYS[2], ARGV[1], state)
+return 1
+"""
+
+# Drops the airports not updated since a cutoff from the counters.
+# KEYS = SUMMARY_KEYS
+# ARGV[1] = cutoff time, ARGV[2] = airports dropped at most
+_EXPIRE_SCRIPT = _COUNT_STATE + r"""
+local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, airport in ipairs(stale) do
+    local previous = redis.call('HGET', KEYS[2], airport)
+    if previous then
+        count(KEYS[1], previous, -1)
+        redis.call('HDEL', KEYS[2], airport)
+    end
+    redis.call('ZREM', KEYS[3], airport)
+end
+return #stale
+"""
+_update_summary = redis_client.register_script(_UPDATE_SCRIPT)
+_expire_summary = redis_client.register_script(_EXPIRE_SCRIPT)
+
+
+def update_summary(airport_code, groups, weather_rating):
+    """This function updates the network summary when an airport's weather is refreshed,
+    moving the airport from its previous rating band to the new one.
+
+    Args:
+        airport_code (str): The airport's canonical code, its ICAO code when it has one,
+            so that lookups by IATA and ICAO code count it once.
+        groups (dict or None): The airport's value for each of GROUPS, e.g. its
+            country_name. None keeps the groups it was last counted under.
+        weather_rating (int or None): The airport's current weather risk index.
+
+    Returns:
+        bool: True if the counters changed, False if the airport stayed in its band
+        or Redis could not be reached.
+    """
+    band = "unknown" if weather_rating is None else str(weather_rating)
+    values = [
+        f"{group}:{groups[group]}" for group in GROUPS if groups and groups.get(group)
+    ]
+    try:
+        return bool(
+            _update_summary(
+                keys=SUMMARY_KEYS, args=[airport_code, time.time(), band, *values]
+            )
+        )
+    except redis.RedisError as e:
+        logger.error("Error updating summary: %s", e)
+        return False
+
+
+def update_weather_summary(airport_code, weather, groups=None):
+    """This function updates the network summary with a refreshed weather observation,
+    rated as in airport profiles.
+
+    Args:
+        airport_code (str): The airport's canonical code, see update_summary.
+        weather (WeatherObservation): The airport's current weather.
+        groups (dict, optional): The airport's value for each of GROUPS. Defaults to
+            None, keeping the groups it was last counted under.
+
+    Returns:
+        bool: True if the counters changed, see update_summary.
+    """
+    weather_rating = weather_risk_calc(
+        okta=okta_calc(weather.cloudcover),
+        precipitation=weather.precip,
+        windspeed=weather.wind_speed,
+        visibility=weather.visibility,
+    )
+    return update_summary(airport_code, groups, weather_rating)
+
+
+def expire_summary(max_age=None):
+    """This function drops the airports whose weather was not refreshed for max_age
+    seconds from the summary, at most EXPIRE_BATCH_SIZE per call.
+
+    Args:
+        max_age (int, optional): Seconds since the last update. Defaults to SUMMARY_MAX_AGE.
+
+    Returns:
+        int: The number of airports dropped.
+    """
+    cutoff = time.time() - (max_age or settings.SUMMARY_MAX_AGE)
+    try:
+        return _expire_summary(keys=SUMMARY_KEYS, args=[cutoff, EXPIRE_BATCH_SIZE])
+    except redis.RedisError as e:
+        logger.error("Error expiring summary: %s", e)
+        return 0
+
+
+def get_summary(group_by: str = None):
+    """This function returns the network summary, the number of airports per
+    weather_rating band and optionally per group.
+
+    Stale airports are dropped first, see expire_summary. The summary is then read
+    with a single HGETALL, its size depends on the number of bands and groups, not
+    on the number of airports.
+
+    Args:
+        group_by (str, optional): "country_name" or "timezone". Defaults to None.
+
+    Raises:
+        ValueError: If group_by is not a supported group.
+
+    Returns:
+        dict: The total airport count, the counts per band and the counts per group if requested.
+    """
+    if group_by is not None and group_by not in GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUPS)}")
+    expire_summary()
+    try:
+        counters = redis_client.hgetall(SUMMARY_KEY)
+    except redis.RedisError as e:
+        logger.error("Error reading summary: %s", e)
+        counters = {}
+
+    summary = {"airports": 0, "weather_rating": {}}
+    if group_by:
+        summary[group_by] = {}
+    for field, count in counters.items():
+        count = int(count)
+        if count <= 0:
+            continue
+        kind, _, rest = field.partition(":")
+        if kind == "weather_rating":
+            summary["weather_rating"][rest] = count
+            summary["airports"] += count
+        elif kind == group_by:
+            name, _, band = rest.rpartition(":")
+            summary[group_by].setdefault(name, {})[band] = count
+    return summary
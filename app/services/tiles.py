@@ -0,0 +1,237 @@
+import logging
+import math
+import redis
+from app.core.config import settings
+from app.core.models import WeatherObservation
+from app.core.utils import okta_columns, weather_risk_columns
+from .cache import check_cache, cache_response, check_cache_many, redis_client
+
+"""
+Weather risk map tiles.
+
+GET /tiles/{z}/{x}/{y} returns a grid of TILE_GRID_SIZE x TILE_GRID_SIZE
+cells over a Web Mercator (slippy map) tile, with the weather risk index and
+its components of the riskiest observation in each cell.
+
+Observations cached under an airport code are indexed by location in a Redis
+GEO set, so a tile reads the observations inside it with one GEOSEARCH and one
+MGET. Tiles are cached for TILE_EXPIRE seconds, and when an observation is
+written the tiles containing it are deleted at every zoom level.
+"""
+
+logger = logging.getLogger(__name__)
+
+OBSERVATIONS_KEY = "tiles:observations"  # GEO set of weather entry keys
+LAYERS = ("weather_rating", "cloud_risk", "precip_risk", "wind_risk", "visibility_risk")
+TILE_TAGS = ["ns:weather"]
+MAX_LATITUDE = 85.05112878  # Web Mercator and Redis GEO limit
+EARTH_RADIUS_KM = 6372.797560856  # As used by Redis GEO
+NO_DATA = 255  # Cell value of empty cells in the binary format
+
+
+def validate_tile(z, x, y):
+    """This function checks that a tile exists and is within TILE_MAX_ZOOM.
+
+    Raises:
+        ValueError: If the zoom level or tile coordinates are out of range.
+    """
+    if not 0 <= z <= settings.TILE_MAX_ZOOM:
+        raise ValueError(f"Zoom level must be between 0 and {settings.TILE_MAX_ZOOM}")
+    if not (0 <= x < 2**z and 0 <= y < 2**z):
+        raise ValueError(f"Tile coordinates must be between 0 and {2 ** z - 1}")
+
+
+def get_tile_key(z, x, y):
+    """This function returns the cache key of a tile."""
+    return f"tile:{z}:{x}:{y}"
+
+
+def tile_position(latitude, longitude, z):
+    """This function returns the position of a location in tile units at a zoom level.
+
+    Args:
+        latitude (float): Latitude, clamped to the Web Mercator range.
+        longitude (float): Longitude.
+        z (int): Zoom level.
+
+    Returns:
+        tuple: The fractional x and y, whose integer parts are the tile coordinates.
+    """
+    n = 2**z
+    latitude = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude)))
+    x = (longitude + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(latitude)) / math.pi) / 2 * n
+    return min(x, n - 1e-9), min(y, n - 1e-9)
+
+
+def tile_bounds(z, x, y):
+    """This function returns the bounds of a tile.
+
+    Returns:
+        tuple: West, south, east and north in degrees.
+    """
+    n = 2**z
+
+    def latitude(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360 - 180, latitude(y + 1), (x + 1) / n * 360 - 180, latitude(y)
+
+
+def index_observation(pipeline, cache_key, latitude, longitude):
+    """This function queues indexing of a weather entry by location, and the deletion
+    of the cached tiles containing it.
+
+    Args:
+        pipeline (Pipeline): The pipeline writing the entry.
+        cache_key (str): The key of the entry, holding a WeatherObservation.
+        latitude (float): Latitude of the observation.
+        longitude (float): Longitude of the observation.
+    """
+    if abs(latitude) > MAX_LATITUDE:
+        return
+    pipeline.geoadd(OBSERVATIONS_KEY, [longitude, latitude, cache_key])
+    tile_keys = []
+    for z in range(settings.TILE_MAX_ZOOM + 1):
+        x, y = tile_position(latitude, longitude, z)
+        tile_keys.append(get_tile_key(z, int(x), int(y)))
+    pipeline.unlink(*tile_keys)
+
+
+def search_observations(z, x, y):
+    """This function reads the indexed observations inside a tile.
+
+    Entries that expired stay in the index, they are skipped here and
+    replaced when their airport is looked up again.
+
+    Returns:
+        list: (latitude, longitude, WeatherObservation) tuples, one per location.
+    """
+    west, south, east, north = tile_bounds(z, x, y)
+    # GEOSEARCH boxes are in km, wide enough for the tile at its equator side
+    nearest = 0 if south <= 0 <= north else min(abs(south), abs(north))
+    width = (
+        EARTH_RADIUS_KM * math.radians(east - west) * math.cos(math.radians(nearest))
+    )
+    height = EARTH_RADIUS_KM * math.radians(north - south)
+    try:
+        results = redis_client.geosearch(
+            OBSERVATIONS_KEY,
+            longitude=(west + east) / 2,
+            latitude=(south + north) / 2,
+            width=width * 1.01,
+            height=height * 1.01,
+            unit="km",
+            withcoord=True,
+        )
+    except redis.RedisError as e:
+        logger.error("Error searching observations: %s", e)
+        return []
+
+    locations = {}
+    for cache_key, (longitude, latitude) in results:
+        if west <= longitude < east and south < latitude <= north:
+            # Airports looked up by IATA and ICAO code share a location
+            locations.setdefault((latitude, longitude), cache_key)
+    observations = []
+    weather_infos = check_cache_many(list(locations.values()))
+    for (latitude, longitude), weather_info in zip(locations, weather_infos):
+        if not weather_info:
+            continue
+        try:
+            weather = WeatherObservation(**weather_info)
+        except (TypeError, ValueError):
+            continue
+        observations.append((latitude, longitude, weather))
+    return observations
+
+
+def render_tile(z, x, y, observations, size=None):
+    """This function grids observations over a tile, keeping the riskiest per cell.
+
+    Args:
+        z (int): Zoom level.
+        x (int): Tile x.
+        y (int): Tile y.
+        observations (list): (latitude, longitude, WeatherObservation) tuples.
+        size (int, optional): Cells per tile side. Defaults to TILE_GRID_SIZE.
+
+    Returns:
+        dict: The tile, its bounds and one size x size matrix per layer, with
+        None in cells without observations.
+    """
+    size = size or settings.TILE_GRID_SIZE
+    weathers = [weather for _, _, weather in observations]
+    columns = weather_risk_columns(
+        okta_columns([w.cloudcover for w in weathers]),
+        [w.precip for w in weathers],
+        [w.wind_speed for w in weathers],
+        [w.visibility for w in weathers],
+    )
+    layers = {layer: [[None] * size for _ in range(size)] for layer in LAYERS}
+    ratings = layers["weather_rating"]
+    count = 0
+    for i, (latitude, longitude, _) in enumerate(observations):
+        rating = columns["weather_rating"][i]
+        if rating is None:
+            continue
+        count += 1
+        tile_x, tile_y = tile_position(latitude, longitude, z)
+        column = min(size - 1, max(0, int((tile_x - x) * size)))
+        row = min(size - 1, max(0, int((tile_y - y) * size)))
+        if ratings[row][column] is not None and ratings[row][column] >= rating:
+            continue
+        for layer in LAYERS:
+            value = columns[layer][i]
+            layers[layer][row][column] = round(value, 1)
+    return {
+        "z": z,
+        "x": x,
+        "y": y,
+        "size": size,
+        "bounds": [round(bound, 6) for bound in tile_bounds(z, x, y)],
+        "observations": count,
+        "layers": layers,
+    }
+
+
+def encode_tile(tile):
+    """This function packs a tile into bytes, one layer after the other in LAYERS order,
+    row by row, one byte per cell holding ten times the value, NO_DATA if empty.
+
+    Args:
+        tile (dict): A tile returned by get_tile.
+
+    Returns:
+        bytes: The packed layers.
+    """
+    return bytes(
+        NO_DATA if value is None else round(value * 10)
+        for layer in LAYERS
+        for row in tile["layers"][layer]
+        for value in row
+    )
+
+
+def get_tile(z, x, y):
+    """This function returns a weather risk tile, from the cache or rendered from the
+    cached observations inside it.
+
+    Args:
+        z (int): Zoom level, up to TILE_MAX_ZOOM.
+        x (int): Tile x.
+        y (int): Tile y.
+
+    Raises:
+        ValueError: If the tile is out of range.
+
+    Returns:
+        dict: The tile, see render_tile.
+    """
+    validate_tile(z, x, y)
+    tile_key = get_tile_key(z, x, y)
+    tile = check_cache(tile_key)
+    if tile is None or tile.get("size") != settings.TILE_GRID_SIZE:
+        tile = render_tile(z, x, y, search_observations(z, x, y))
+        cache_response(tile_key, tile, settings.TILE_EXPIRE, TILE_TAGS)
+    return tile
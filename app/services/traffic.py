@@ -0,0 +1,233 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+import redis
+from app.core.config import settings
+from app.core.deadline import upstream_call
+from .admission import admit
+from .cache import redis_client, get_airport_tags, index_tags
+
+logger = logging.getLogger(__name__)
+
+# Load the AviationStack API key from environment variables
+as_api_key = settings.AVIATIONSTACK_API_KEY
+
+WINDOW_SECONDS = 900  # 15 minute counting windows
+DELAY_THRESHOLD = 15  # Minutes late before a flight counts as delayed
+DELAY_WINDOWS = 4  # Windows (1 hour) used for the delay ratio
+
+# Refreshes run on a bounded pool, without the deadline of the request that
+# found the counters stale, as contextvars are not copied to its threads
+_executor = ThreadPoolExecutor(
+    max_workers=settings.TRAFFIC_REFRESH_CONCURRENCY, thread_name_prefix="traffic"
+)
+
+
+def get_traffic_key(airport_code):
+    """This function returns the Redis hash holding an airport's traffic counters.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        str: The Redis key of the traffic counters hash.
+    """
+    return f"traffic:{airport_code.upper()}"
+
+
+def get_refresh_lock_key(airport_code):
+    """This function returns the Redis key held by the worker refreshing an airport's
+    traffic counters.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        str: The Redis key of the refresh lock.
+    """
+    return f"lock:traffic:{airport_code.upper()}"
+
+
+def get_window(timestamp):
+    """This function returns the 15 minute window index for a UNIX timestamp."""
+    return int(timestamp // WINDOW_SECONDS)
+
+
+def get_traffic_counts(airport_code, now=None):
+    """This function reads an airport's traffic counters for the current window
+    with one HMGET and schedules a background refresh when they are stale.
+
+    Counters are stored compactly as one hash per airport, with one field per
+    15 minute window holding "arrivals:departures:delayed:flights".
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+        now (float, optional): UNIX timestamp to read counters for. Defaults to the current time.
+
+    Returns:
+        dict or None: The arrivals, departures and delay ratio for the current window,
+        or None if no counters have been collected yet.
+    """
+    now = time.time() if now is None else now
+    window = get_window(now)
+    fields = ["updated"] + [str(window - i) for i in range(DELAY_WINDOWS)]
+    try:
+        values = redis_client.hmget(get_traffic_key(airport_code), fields)
+    except redis.RedisError as e:
+        logger.error("Error reading traffic counters: %s", e)
+        return None
+
+    updated, current, *recent = values
+    if updated is None or now - float(updated) > settings.TRAFFIC_REFRESH_INTERVAL:
+        refresh_traffic_counts_in_background(airport_code)
+    if updated is None:
+        return None
+
+    arrivals, departures, _, _ = _unpack(current)
+    delayed = flights = 0
+    for value in [current] + recent:
+        _, _, window_delayed, window_flights = _unpack(value)
+        delayed += window_delayed
+        flights += window_flights
+    return {
+        "arrivals": arrivals,
+        "departures": departures,
+        "delay_ratio": round(delayed / flights, 2) if flights else 0,
+    }
+
+
+def refresh_traffic_counts_in_background(airport_code):
+    """This function queues a refresh of an airport's traffic counters on the
+    refresh pool, unless a worker of any process already holds its refresh lock.
+
+    The lock is taken with SET NX EX and kept for TRAFFIC_REFRESH_INTERVAL, so
+    each airport is refreshed at most once per interval across all workers, and
+    an airport whose refresh failed is retried after the interval.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+
+    Returns:
+        bool: True if a refresh was queued.
+    """
+    try:
+        locked = redis_client.set(
+            get_refresh_lock_key(airport_code),
+            time.time(),
+            nx=True,
+            ex=settings.TRAFFIC_REFRESH_INTERVAL,
+        )
+    except redis.RedisError as e:
+        logger.error("Error locking traffic refresh: %s", e)
+        return False
+    if not locked:
+        return False
+    _executor.submit(_refresh, airport_code)
+    return True
+
+
+def _refresh(airport_code):
+    try:
+        refresh_traffic_counts(airport_code)
+    except Exception as e:
+        logger.error("Error refreshing traffic counters for %s: %s", airport_code, e)
+
+
+def refresh_traffic_counts(airport_code, as_api_key: str = as_api_key):
+    """This function rebuilds an airport's per-window traffic counters from the
+    AviationStack flight schedules, aggregating each page as it arrives. The
+    hash is replaced as a whole, so windows without flights are dropped.
+
+    Args:
+        airport_code (str): Airport code (IATA or ICAO).
+        as_api_key (str, optional): AviationStack API key. Defaults to the value from environment variables.
+
+    Raises:
+        ValueError: If the API key is missing or the airport code is not 3 or 4 characters long.
+        RequestException: If there is an error with the request to the AviationStack API.
+
+    Returns:
+        dict: The counters written, keyed by window index.
+    """
+    if not as_api_key:
+        raise ValueError(
+            "AVIATIONSTACK_API_KEY is not set in the environment variables"
+        )
+    if len(airport_code) == 3:
+        code_type = "iata"
+    elif len(airport_code) == 4:
+        code_type = "icao"
+    else:
+        raise ValueError("Airport code must be 3 or 4 characters long")
+
+    counters = {}
+    for direction, position in (("arr", 0), ("dep", 1)):
+        query = f"{direction}_{code_type}={airport_code}"
+        for flight in _iter_flights(query, as_api_key):
+            movement = flight.get("arrival" if direction == "arr" else "departure")
+            window = _flight_window(movement)
+            if window is None:
+                continue
+            counts = counters.setdefault(window, [0, 0, 0, 0])
+            counts[position] += 1
+            counts[3] += 1
+            if (movement.get("delay") or 0) > DELAY_THRESHOLD:
+                counts[2] += 1
+
+    mapping = {str(window): ":".join(map(str, c)) for window, c in counters.items()}
+    mapping["updated"] = time.time()
+    key = get_traffic_key(airport_code)
+    pipeline = redis_client.pipeline(transaction=True)
+    pipeline.delete(key)
+    pipeline.hset(key, mapping=mapping)
+    pipeline.expire(key, settings.TRAFFIC_EXPIRE)
+    index_tags(
+        pipeline,
+        [key],
+        ["ns:traffic", "provider:aviationstack", *get_airport_tags(airport_code)],
+        settings.TRAFFIC_EXPIRE,
+    )
+    pipeline.execute()
+    logger.debug(
+        "Traffic counters for %s refreshed (%d windows)", airport_code, len(counters)
+    )
+    return counters
+
+
+def _iter_flights(query, as_api_key):
+    """Yield flights from every page of an AviationStack flights query."""
+    limit = 100
+    for page in range(settings.TRAFFIC_MAX_PAGES):
+        url = (
+            f"https://api.aviationstack.com/v1/flights?access_key={as_api_key}"
+            f"&{query}&limit={limit}&offset={page * limit}"
+        )
+        with admit("aviationstack"), upstream_call() as timeout:
+            flights = requests.get(url, timeout=timeout).json()
+        if "error" in flights or not isinstance(flights.get("data"), list):
+            error = flights.get("error", {})
+            raise requests.exceptions.RequestException(
+                f"AviationStack error: {error.get('message', 'invalid response')}"
+            )
+        yield from flights["data"]
+        total = flights.get("pagination", {}).get("total", 0)
+        if (page + 1) * limit >= total:
+            break
+
+
+def _flight_window(movement):
+    """Return the window index of a flight's scheduled arrival or departure time."""
+    try:
+        scheduled = datetime.fromisoformat(movement["scheduled"])
+        return get_window(scheduled.timestamp())
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _unpack(value):
+    """Unpack a window's counters, treating a missing window as empty."""
+    if not value:
+        return 0, 0, 0, 0
+    return tuple(int(count) for count in value.split(":"))
@@ -0,0 +1,387 @@
+import contextvars
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import requests
+from app.core import deadline
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.core.models import WeatherObservation
+from app.core.timing import stage
+from .admission import Overloaded
+from .cache import get_cache_key, check_cache_many, local_cache
+from .metar import get_metar_key
+from .openmeteo import get_openmeteo_url, fetch_openmeteo_info
+from .weatherstack import get_weather_url, fetch_current_weather_info, ws_api_key
+
+"""
+Current weather from pluggable providers.
+
+WEATHER_PROVIDERS lists the providers to use. A lookup reads the cached
+observations of every provider in one MGET, including METARs loaded by
+ingestion, and on a miss fetches from the
+fastest healthy provider by observed p95 latency, failing over to the next
+one on errors. With WEATHER_HEDGE_ENABLED, if the first provider has not
+answered by its p95 the next one is queried as well and the first valid
+answer is used.
+
+Provider entries are keyed and fetched by location. With WEATHER_GRID_DEGREES
+set, locations are snapped to the centre of their grid cell first, so airports
+in the same cell share one observation and one upstream call. Airports listed
+in WEATHER_EXACT_AIRPORTS keep their own coordinates.
+"""
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 100  # Recent upstream latencies kept per provider
+MIN_SAMPLES = 20  # Samples needed before a provider's p95 is trusted
+FAILURE_THRESHOLD = 3  # Consecutive failures before a provider is unhealthy
+FAILURE_COOLDOWN = 30  # Seconds an unhealthy provider is skipped
+
+
+class WeatherProvider(ABC):
+    """A source of current weather, mapped into WeatherObservation.
+
+    Subclasses implement cache_key, parse and fetch, and cannot be created
+    without them. Cache only providers are read from the cache but never
+    fetched from.
+    """
+
+    name = None
+    cache_only = False
+
+    @abstractmethod
+    def cache_key(self, latitude, longtitude, icao=None):
+        """Return the cache key of the provider's response for a location, or None."""
+
+    @abstractmethod
+    def parse(self, weather_info):
+        """Parse a provider response into a WeatherObservation, raising ValueError."""
+
+    @abstractmethod
+    def fetch(self, latitude, longtitude, tags=None):
+        """Fetch and cache the provider's response for a location, raising RequestException."""
+
+
+class WeatherStackProvider(WeatherProvider):
+    name = "weatherstack"
+
+    def cache_key(self, latitude, longtitude, icao=None):
+        return get_cache_key(get_weather_url(latitude, longtitude, ws_api_key))
+
+    def parse(self, weather_info):
+        return WeatherObservation.from_response(weather_info)
+
+    def fetch(self, latitude, longtitude, tags=None):
+        return fetch_current_weather_info(latitude, longtitude, ws_api_key, tags)
+
+
+class OpenMeteoProvider(WeatherProvider):
+    name = "openmeteo"
+
+    def cache_key(self, latitude, longtitude, icao=None):
+        return get_cache_key(get_openmeteo_url(latitude, longtitude))
+
+    def parse(self, weather_info):
+        return WeatherObservation.from_openmeteo(weather_info)
+
+    def fetch(self, latitude, longtitude, tags=None):
+        return fetch_openmeteo_info(latitude, longtitude, tags)
+
+
+class MetarProvider(WeatherProvider):
+    """METAR observations loaded into the cache by ingestion, see app.services.metar."""
+
+    name = "metar"
+    cache_only = True
+
+    def cache_key(self, latitude, longtitude, icao=None):
+        return get_metar_key(icao) if icao else None
+
+    def parse(self, weather_info):
+        return WeatherObservation(**weather_info)
+
+    def fetch(self, latitude, longtitude, tags=None):
+        raise requests.exceptions.RequestException(
+            "METARs are only loaded by ingestion"
+        )
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (WeatherStackProvider, OpenMeteoProvider, MetarProvider)
+}
+
+
+class ProviderHealth:
+    """Recent upstream latencies and failures of one provider."""
+
+    def __init__(self):
+        self.failures = 0
+        self.unhealthy_until = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed):
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= FAILURE_THRESHOLD:
+                self.unhealthy_until = time.monotonic() + FAILURE_COOLDOWN
+
+    def healthy(self):
+        return time.monotonic() >= self.unhealthy_until
+
+    def p95(self):
+        """Return the p95 latency in seconds, or None until MIN_SAMPLES are recorded."""
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[math.ceil(len(latencies) * 0.95) - 1]
+
+    def stats(self):
+        p95 = self.p95()
+        return {
+            "healthy": self.healthy(),
+            "failures": self.failures,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+def load_providers(names):
+    """This function creates the configured providers.
+
+    Args:
+        names (str): Comma separated provider names, in order of preference.
+
+    Raises:
+        ValueError: If a provider is unknown.
+
+    Returns:
+        list: The providers.
+    """
+    providers = []
+    for name in names.split(","):
+        name = name.strip()
+        if name not in PROVIDERS:
+            raise ValueError(
+                f"Unknown weather provider {name!r}, use one of: {', '.join(PROVIDERS)}"
+            )
+        providers.append(PROVIDERS[name]())
+    return providers
+
+
+providers = load_providers(settings.WEATHER_PROVIDERS)
+health = {provider.name: ProviderHealth() for provider in providers}
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="weather-race")
+
+
+def route_providers():
+    """This function orders the providers for a fetch: healthy ones first, fastest p95
+    first, and the configured order for providers without enough samples.
+
+    Returns:
+        list: The providers in the order they should be tried.
+    """
+    default = settings.WEATHER_HEDGE_DEFAULT_MS / 1000
+
+    def rank(provider):
+        provider_health = health[provider.name]
+        p95 = provider_health.p95()
+        return (not provider_health.healthy(), default if p95 is None else p95)
+
+    return sorted((p for p in providers if not p.cache_only), key=rank)
+
+
+def weather_location(latitude, longtitude, icao=None):
+    """This function returns the location weather is cached and fetched for, the centre
+    of the WEATHER_GRID_DEGREES cell holding a location.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longtitude (float): Longitude of the location.
+        icao (str, optional): ICAO code of the airport at the location. Defaults to None.
+
+    Returns:
+        tuple: The latitude and longitude, unchanged if the grid is disabled or the
+        airport is listed in WEATHER_EXACT_AIRPORTS.
+    """
+    grid = settings.WEATHER_GRID_DEGREES
+    if grid <= 0:
+        return latitude, longtitude
+    if icao and icao.upper() in {
+        code.strip().upper() for code in settings.WEATHER_EXACT_AIRPORTS.split(",")
+    }:
+        return latitude, longtitude
+    return tuple(
+        round((math.floor(float(value) / grid) + 0.5) * grid, 4)
+        for value in (latitude, longtitude)
+    )
+
+
+def weather_cache_keys(latitude, longtitude, icao=None):
+    """This function returns the cache key of every provider for a location, in the
+    configured order.
+
+    Args:
+        latitude (float): Latitude of the location, snapped by weather_location.
+        longtitude (float): Longitude of the location, snapped by weather_location.
+        icao (str, optional): ICAO code of the airport at the location, for METARs. Defaults to None.
+
+    Returns:
+        list: (provider, cache key) tuples, for the providers that can cache the location.
+    """
+    latitude, longtitude = weather_location(latitude, longtitude, icao)
+    keys = []
+    for provider in providers:
+        cache_key = provider.cache_key(latitude, longtitude, icao)
+        if cache_key:
+            keys.append((provider, cache_key))
+    return keys
+
+
+def parse_cached_weather(cache_keys, weather_infos):
+    """This function parses the first valid cached response of the providers.
+
+    Args:
+        cache_keys (list): The (provider, cache key) tuples of weather_cache_keys.
+        weather_infos (list): The cached responses of those keys, None if missing.
+
+    Returns:
+        WeatherObservation or None: The observation, or None if no provider has one cached.
+    """
+    for (provider, _), weather_info in zip(cache_keys, weather_infos):
+        if weather_info:
+            try:
+                return provider.parse(weather_info)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def fetch_from(provider, latitude, longtitude, tags=None):
+    """This function fetches an observation from one provider, recording its latency.
+
+    Raises:
+        RequestException: If the provider fails or returns an invalid response.
+        Overloaded: If the provider has no capacity left for the request.
+        DeadlineExceeded: If the request's deadline passed first.
+
+    Returns:
+        WeatherObservation: The observation.
+    """
+    started = time.perf_counter()
+    try:
+        weather = provider.parse(provider.fetch(latitude, longtitude, tags))
+    except (Overloaded, DeadlineExceeded):
+        # Not the provider's fault, its health is left alone
+        raise
+    except (requests.exceptions.RequestException, ValueError) as e:
+        health[provider.name].record_failure()
+        raise requests.exceptions.RequestException(f"{provider.name}: {e}") from e
+    health[provider.name].record(time.perf_counter() - started)
+    return weather
+
+
+def fetch_weather(latitude, longtitude, tags=None):
+    """This function fetches the current weather from the providers, see the module
+    docstring for the routing and hedging.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longtitude (float): Longitude of the location.
+        tags (list, optional): Cache tags besides the weather namespace, e.g. the airport's. Defaults to None.
+
+    Raises:
+        RequestException: If every provider failed.
+        Overloaded: If every provider failed and the last one shed the request.
+        DeadlineExceeded: If the request's deadline passed first, providers not
+            queried yet are then skipped.
+
+    Returns:
+        WeatherObservation: The first valid observation.
+    """
+    pending = route_providers()
+    running = {}
+    error = requests.exceptions.RequestException("No weather provider to fetch from")
+    while pending or running:
+        if pending and (not running or settings.WEATHER_HEDGE_ENABLED):
+            provider = pending.pop(0)
+            # Each thread runs in a copy of this context, so stages are recorded
+            context = contextvars.copy_context()
+            running[
+                _executor.submit(
+                    context.run, fetch_from, provider, latitude, longtitude, tags
+                )
+            ] = provider
+        # Hedge once the newest provider is slower than its p95, else wait for it
+        hedge_after = None
+        if pending and settings.WEATHER_HEDGE_ENABLED:
+            p95 = health[provider.name].p95()
+            hedge_after = (
+                settings.WEATHER_HEDGE_DEFAULT_MS / 1000 if p95 is None else p95
+            )
+        left = deadline.remaining()
+        if left is not None:
+            hedge_after = left if hedge_after is None else min(hedge_after, left)
+        done, _ = wait(running, timeout=hedge_after, return_when=FIRST_COMPLETED)
+        if not done and deadline.expired():
+            # Running fetches time out with the deadline themselves
+            raise DeadlineExceeded()
+        for future in done:
+            running.pop(future)
+            try:
+                return future.result()
+            except (requests.exceptions.RequestException, Overloaded) as e:
+                logger.warning("Weather provider failed: %s", e)
+                error = e
+    raise error
+
+
+def get_local_weather_key(latitude, longtitude):
+    """This function returns the in-process cache key of the weather at a location."""
+    return f"weather:{latitude},{longtitude}"
+
+
+def get_current_weather(latitude, longtitude, tags: list = None, icao: str = None):
+    """This function returns the current weather at a location as a typed model, parsed
+    once and kept in the in-process cache for LOCAL_WEATHER_EXPIRE seconds.
+
+    Args:
+        latitude (float): Latitude of the airport.
+        longtitude (float): Longitude of the airport.
+        tags (list, optional): Cache tags besides the weather namespace, e.g. the airport's. Defaults to None.
+        icao (str, optional): ICAO code of the airport, to use its METAR if one is loaded. Defaults to None.
+
+    Raises:
+        ValueError: If the latitude or longitude is missing.
+        RequestException: If no provider could return the current weather.
+        Overloaded: If the providers have no capacity left for the request.
+
+    Returns:
+        WeatherObservation: The current weather observation.
+    """
+    if latitude in (None, "") or longtitude in (None, ""):
+        raise ValueError("Latitude and longitude must be provided")
+    local_key = get_local_weather_key(latitude, longtitude)
+    weather = local_cache.get(local_key)
+    if weather is None:
+        cache_keys = weather_cache_keys(latitude, longtitude, icao)
+        with stage("weather_cache"):
+            weather = parse_cached_weather(
+                cache_keys, check_cache_many([key for _, key in cache_keys])
+            )
+        if weather is None:
+            location = weather_location(latitude, longtitude, icao)
+            weather = fetch_weather(*location, tags)
+        local_cache.set(local_key, weather, settings.LOCAL_WEATHER_EXPIRE)
+    return weather
@@ -1,70 +1,260 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
+from app.core import deadline
 from app.core.config import settings
-from .cache import get_cache_key, check_cache, cache_response
+from app.core.deadline import DeadlineExceeded, upstream_call
+from app.core.timing import stage
+from .admission import admit
+from .cache import (
+    get_cache_key,
+    cache_response,
+    check_cache_many,
+    cache_many,
+    tag_keys,
+)
+
+logger = logging.getLogger(__name__)
 
 # Load the WeatherStack API key from environment variables
 ws_api_key = settings.WEATHERSTACK_API_KEY
 
+WEATHER_TAGS = ["ns:weather", "provider:weatherstack"]
+
+# Shared session and pool for batched lookups, so connections are reused
+_session = requests.Session()
+_executor = ThreadPoolExecutor(
+    max_workers=settings.WEATHER_BATCH_MAX_SIZE, thread_name_prefix="weather"
+)
+
+
+def get_weather_url(latitude, longtitude, ws_api_key: str = ws_api_key):
+    """This function builds the WeatherStack current weather URL for one location.
+
+    Args:
+        latitude (str): Latitude of the location.
+        longtitude (str): Longitude of the location.
+        ws_api_key (str, optional): WeatherStack API key. Defaults to the value from environment variables.
+
+    Returns:
+        str: The WeatherStack URL, also used to derive the weather cache key.
+    """
+    query = f"query={latitude},{longtitude}"
+    return f"https://api.weatherstack.com/current?access_key={ws_api_key}&{query}"
+
+
+def validate_weather_response(weather_info):
+    """This function checks that a WeatherStack response holds current weather data.
 
-def get_current_weather_info(
-    latitude: str = None, longtitude: str = None, ws_api_key: str = ws_api_key
+    Args:
+        weather_info (dict): The decoded JSON body returned by the WeatherStack API.
+
+    Raises:
+        RequestException: If the body is an error payload (bad key, quota exceeded, unknown location).
+    """
+    if not isinstance(weather_info, dict) or "current" not in weather_info:
+        error = weather_info.get("error", {}) if isinstance(weather_info, dict) else {}
+        raise requests.exceptions.RequestException(
+            f"WeatherStack error: {error.get('info', 'invalid response')}"
+        )
+
+
+def fetch_current_weather_info(
+    latitude, longtitude, ws_api_key: str = ws_api_key, tags: list = None
 ):
-    """This function retrieves weather information from the AviationStack API based
-    on the provided latitude and longitude, and returns the current weather data.
+    """This function fetches the current weather at a location from the WeatherStack
+    API, without checking the cache first, and caches the response.
+
+    The lookup joins a batch when WEATHER_BATCH_WINDOW_MS is set.
 
     Args:
-        latitude (str, optional): Latitude of the airport. Defaults to None.
-        longtitude (str, optional): Longitude of the airport. Defaults to None.
+        latitude (str): Latitude of the location.
+        longtitude (str): Longitude of the location.
         ws_api_key (str, optional): WeatherStack API key. Defaults to the value from environment variables.
+        tags (list, optional): Cache tags besides the weather namespace, e.g. the airport's. Defaults to None.
 
     Raises:
-        ValueError: - If the API key is missing.
-                    - If the latitude or longitude is not provided.
-                    - If there is any other validation error with the input parameters.
-        RequestException: If there is an error with the request to the WeatherStack API.
-        Exception: If any unexpected errors during the execution.
+        ValueError: If the API key is missing.
+        RequestException: If the request fails or WeatherStack returns an error payload.
+        Overloaded: If WeatherStack has no capacity left for the request.
+        DeadlineExceeded: If the request's deadline passed first.
 
     Returns:
-        dict: A dictionary containing weather information if the request is successful.
+        dict: The WeatherStack response.
     """
-    try:
-        # Validate variables
-        if not ws_api_key:
-            raise ValueError(
-                "WEATHERSTACK_API_KEY is not set in the environment variables"
-            )
-        if not latitude or not longtitude:
-            raise ValueError("Latitude and longitude must be provided")
-
-        # Construct the query
-        query = f"query={latitude},{longtitude}"
-        # Construct the URL with the query
-        url = f"https://api.weatherstack.com/current?access_key={ws_api_key}&{query}"
-        cache_key = get_cache_key(url)
-        if cache_key:
-            # Check if the data is already cached
-            cache_data = check_cache(cache_key)
-
-        if cache_data:
-            print("Using cached data...")
-            weather_info = cache_data
-        else:
-            # Make the API request
-            print("Making API request...")
-            response = requests.get(url)
-            weather_info = response.json()
-            cache_response(cache_key, weather_info)
-
-        # If the response is valid, return the weather information
-        print(f"weather info for {latitude}, {longtitude} retrieved successfully")
+    if not ws_api_key:
+        raise ValueError("WEATHERSTACK_API_KEY is not set in the environment variables")
+    url = get_weather_url(latitude, longtitude, ws_api_key)
+    cache_key = get_cache_key(url)
+    if settings.WEATHER_BATCH_WINDOW_MS > 0:
+        # Join other lookups missing the cache in the same window
+        logger.debug("Queueing batched WeatherStack request")
+        with stage("weatherstack"):
+            future = weather_batcher.submit(latitude, longtitude, ws_api_key)
+            try:
+                weather_info = future.result(timeout=deadline.remaining())
+            except TimeoutError as e:
+                # The batch still completes and is cached for later lookups
+                raise DeadlineExceeded() from e
+        # The batch is tagged by namespace only, add this lookup's own tags
+        tag_keys([cache_key], tags)
         return weather_info
 
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {e}")
-        raise e
-    except ValueError as e:
-        print(f"Value error: {e}")
-        raise e
+    # Make the API request
+    logger.debug("WeatherStack request for %s, %s", latitude, longtitude)
+    with admit("weatherstack"), stage("weatherstack"), upstream_call() as timeout:
+        response = requests.get(url, timeout=timeout)
+        weather_info = response.json()
+    # Never cache error payloads (bad key, quota exceeded, unknown location)
+    validate_weather_response(weather_info)
+    cache_response(cache_key, weather_info, tags=WEATHER_TAGS + (tags or []))
+    return weather_info
+
+
+def fetch_weather_batch(locations, ws_api_key: str = ws_api_key):
+    """This function retrieves current weather for several locations, reading the
+    cache with one MGET and fetching only the misses from the WeatherStack API.
+
+    Misses are sent as one multi-location (bulk) request when WEATHERSTACK_BULK_ENABLED
+    is set, which requires a WeatherStack plan with bulk queries. Otherwise they are
+    fetched as parallel single-location requests over a shared session.
+
+    Args:
+        locations (list): A list of (latitude, longitude) tuples.
+        ws_api_key (str, optional): WeatherStack API key. Defaults to the value from environment variables.
+
+    Returns:
+        list: The weather information for each location, in the same order as locations.
+        An entry is the raised exception instead of a dictionary if that location failed.
+    """
+    urls = [get_weather_url(lat, lon, ws_api_key) for lat, lon in locations]
+    cache_keys = [get_cache_key(url) for url in urls]
+    results = check_cache_many(cache_keys)
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        return results
+
+    if settings.WEATHERSTACK_BULK_ENABLED and len(misses) > 1:
+        try:
+            fetched = _fetch_bulk([locations[i] for i in misses], ws_api_key)
+        except requests.exceptions.RequestException as e:
+            fetched = [e] * len(misses)
+    else:
+        fetched = list(_executor.map(_fetch_single, [urls[i] for i in misses]))
+
+    to_cache = {}
+    for i, weather_info in zip(misses, fetched):
+        results[i] = weather_info
+        if isinstance(weather_info, dict):
+            to_cache[cache_keys[i]] = weather_info
+    cache_many(to_cache, tags=WEATHER_TAGS)
+    logger.debug(
+        "Weather batch of %d: %d fetched upstream", len(locations), len(misses)
+    )
+    return results
+
+
+def _fetch_single(url):
+    """Fetch and validate one location, returning the exception on failure."""
+    try:
+        with admit("weatherstack"), upstream_call() as timeout:
+            weather_info = _session.get(url, timeout=timeout).json()
+        validate_weather_response(weather_info)
+        return weather_info
     except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise e
+        return e
+
+
+def _fetch_bulk(locations, ws_api_key):
+    """Fetch several locations with one bulk query and split the results per location."""
+    query = ";".join(f"{lat},{lon}" for lat, lon in locations)
+    url = f"https://api.weatherstack.com/current?access_key={ws_api_key}&query={query}"
+    with admit("weatherstack"), upstream_call() as timeout:
+        payload = _session.get(url, timeout=timeout).json()
+    entries = payload if isinstance(payload, list) else [payload]
+    if len(entries) != len(locations):
+        validate_weather_response(payload)
+        raise requests.exceptions.RequestException(
+            f"WeatherStack bulk query returned {len(entries)} results for {len(locations)} locations"
+        )
+    results = []
+    for weather_info in entries:
+        try:
+            validate_weather_response(weather_info)
+            results.append(weather_info)
+        except requests.exceptions.RequestException as e:
+            results.append(e)
+    return results
+
+
+class WeatherBatcher:
+    """Micro-batching dispatcher for weather lookups that miss the cache.
+
+    Lookups submitted within window_ms of each other are collected and sent
+    together through fetch_weather_batch. A batch is flushed early once it
+    reaches max_size. Duplicate locations within a batch share one lookup.
+    """
+
+    def __init__(self, window_ms, max_size):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def submit(self, latitude, longtitude, ws_api_key: str = ws_api_key):
+        """Queue a lookup and return a Future resolving to its weather information."""
+        location = (latitude, longtitude, ws_api_key)
+        with self._lock:
+            future = self._pending.get(location)
+            if future is None:
+                future = self._pending[location] = Future()
+            if len(self._pending) >= self.max_size:
+                batch = self._take()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            # Dispatch outside the shared pool, which the batch itself uses
+            threading.Thread(target=self._dispatch, args=(batch,), daemon=True).start()
+        return future
+
+    def flush(self):
+        """Dispatch every pending lookup now."""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._dispatch(batch)
+
+    def _take(self):
+        batch, self._pending = self._pending, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _dispatch(self, batch):
+        by_key = {}
+        for location in batch:
+            by_key.setdefault(location[2], []).append(location)
+        for api_key, group in by_key.items():
+            try:
+                results = fetch_weather_batch(
+                    [(lat, lon) for lat, lon, _ in group], api_key
+                )
+            except Exception as e:
+                results = [e] * len(group)
+            for location, result in zip(group, results):
+                if isinstance(result, Exception):
+                    batch[location].set_exception(result)
+                else:
+                    batch[location].set_result(result)
+
+
+weather_batcher = WeatherBatcher(
+    settings.WEATHER_BATCH_WINDOW_MS, settings.WEATHER_BATCH_MAX_SIZE
+)
@@ -1,5 +1,14 @@
 import pytest
-from app.services.cache import get_cache_key, check_cache, cache_response
+from app.services.cache import (
+    get_cache_key,
+    check_cache,
+    cache_response,
+    invalidate_tag,
+    evict_local,
+    local_cache,
+    LocalCache,
+)
+from app.core.models import Airport
 from unittest import mock
 import json
 
@@ -78,3 +87,77 @@ class TestCache:
         mock_client.setex.assert_called_once_with(
             cache_key, 3600, json.dumps(test_response)
         )
+
+
+@pytest.mark.describe("Cache Tag Tests")
+class TestCacheTags:
+    @pytest.mark.it("cache_response indexes tagged entries in the same round trip")
+    def test_cache_response_tags(self, mock_client, test_response):
+        pipeline = mock_client.pipeline.return_value
+        cache_response("test_cache_key", test_response, tags=["airport:JFK"])
+        mock_client.setex.assert_not_called()
+        pipeline.setex.assert_called_once_with(
+            "test_cache_key", 3600, json.dumps(test_response)
+        )
+        pipeline.sadd.assert_called_once_with("tag:airport:JFK", "test_cache_key")
+        pipeline.execute.assert_called_once()
+
+    @pytest.mark.it("invalidate_tag deletes every tagged entry in two round trips")
+    def test_invalidate_tag(self, mock_client):
+        mock_client.smembers.return_value = {"key1", "key2"}
+        pipeline = mock_client.pipeline.return_value
+        pipeline.execute.return_value = [2, 2, 1, 0]
+        assert invalidate_tag("ns:weather") == 2
+        assert sorted(pipeline.unlink.call_args_list[0].args) == ["key1", "key2"]
+        pipeline.unlink.assert_called_with("tag:ns:weather")
+        pipeline.publish.assert_called_once_with("cache:invalidate", "ns:weather")
+        pipeline.execute.assert_called_once()
+
+    @pytest.mark.it("evict_local evicts an airport under any of its codes")
+    def test_evict_local_airport(self):
+        airport = Airport("JFK", "JFK", "KJFK", None, None, None, None, 40.6, -73.8)
+        local_cache.set("airport:JFK", airport, 60)
+        local_cache.set("airport:KJFK", airport, 60)
+        local_cache.set("weather:40.6,-73.8", "weather", 60)
+        evict_local("airport:KJFK")
+        assert local_cache.get("airport:JFK") is None
+        assert local_cache.get("airport:KJFK") is None
+        assert local_cache.get("weather:40.6,-73.8") == "weather"
+        evict_local("ns:weather")
+        assert local_cache.get("weather:40.6,-73.8") is None
+        local_cache.set("weather:40.6,-73.8", "weather", 60)
+        evict_local("provider:openmeteo")
+        assert local_cache.get("weather:40.6,-73.8") is None
+
+
+@pytest.mark.describe("Local Cache Tests")
+class TestLocalCache:
+    @pytest.mark.it("LocalCache returns cached values until they expire")
+    def test_local_cache_expiry(self):
+        cache = LocalCache(max_size=10)
+        cache.set("fresh", "value", 60)
+        cache.set("stale", "value", -1)
+        assert cache.get("fresh") == "value"
+        assert cache.get("stale") is None
+        assert cache.get("missing") is None
+
+    @pytest.mark.it("LocalCache keeps expired values for stale reads")
+    def test_local_cache_stale(self):
+        cache = LocalCache(max_size=10)
+        cache.set("fresh", "value", 60)
+        cache.set("stale", "value", -30)
+        assert cache.get_stale("fresh", 60) == "value"
+        assert cache.get_stale("stale", 60) == "value"
+        assert cache.get_stale("stale", 10) is None
+        assert cache.get_stale("missing", 60) is None
+
+    @pytest.mark.it("LocalCache evicts the least recently used entries")
+    def test_local_cache_eviction(self):
+        cache = LocalCache(max_size=2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        cache.get("a")
+        cache.set("c", 3, 60)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert len(cache) == 2
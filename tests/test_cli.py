@@ -0,0 +1,118 @@
+import json
+import pytest
+from unittest import mock
+from app import cli
+from app.services.admission import Overloaded
+
+"""
+Test suite for the command line tools
+"""
+
+
+def fake_profile(airport_code):
+    if airport_code == "XXX":
+        raise ValueError("Airport code XXX not found or multiple results returned")
+    return {
+        "airport_profile": {"iata": airport_code},
+        "weather_info": {"weather_rating": 2},
+    }
+
+
+@pytest.mark.describe("Profiles CLI tests")
+class TestProfilesCLI:
+    @pytest.mark.it("profiles writes one NDJSON line per airport")
+    @mock.patch("app.cli.airport_query", side_effect=fake_profile)
+    def test_profiles_ndjson(self, mock_airport_query, tmp_path, capsys):
+        codes_file = tmp_path / "codes.txt"
+        codes_file.write_text("jfk\n# comment\n\nLHR\nXXX\nCDG\n")
+        out = tmp_path / "profiles.ndjson"
+
+        exit_code = cli.main(
+            ["profiles", "--codes-file", str(codes_file), "--out", str(out)]
+        )
+
+        assert exit_code == 0
+        lines = [json.loads(line) for line in out.read_text().splitlines()]
+        assert sorted(line["code"] for line in lines) == ["CDG", "JFK", "LHR"]
+        assert all(line["weather_info"]["weather_rating"] == 2 for line in lines)
+        stderr = capsys.readouterr().err
+        assert "XXX: Airport code XXX not found" in stderr
+        assert "3 profiles written, 1 failed" in stderr
+
+    @pytest.mark.it("generate_profiles keeps a bounded number of airports in flight")
+    def test_generate_profiles_bounded(self):
+        pulled = []
+
+        def codes():
+            for i in range(100):
+                pulled.append(i)
+                yield f"A{i:02d}"
+
+        writer = mock.Mock()
+        in_flight_when_first_written = []
+        writer.write.side_effect = lambda code, profile: (
+            in_flight_when_first_written.append(len(pulled))
+        )
+        with mock.patch("app.cli.airport_query", side_effect=fake_profile):
+            stats = cli.generate_profiles(codes(), writer, concurrency=2, report=print)
+
+        assert stats["written"] == 100
+        assert in_flight_when_first_written[0] <= 4
+
+    @pytest.mark.it("fetch_profile retries when an upstream sheds the request")
+    @mock.patch("app.cli.time.sleep")
+    @mock.patch("app.cli.airport_query")
+    def test_fetch_profile_retries(self, mock_airport_query, mock_sleep):
+        mock_airport_query.side_effect = [Overloaded("weatherstack", 2), {"ok": 1}]
+        assert cli.fetch_profile("JFK") == {"ok": 1}
+        mock_sleep.assert_called_once_with(2)
+
+    @pytest.mark.it("flatten_profile merges the profile sections into one row")
+    def test_flatten_profile(self):
+        row = cli.flatten_profile("JFK", fake_profile("JFK"))
+        assert row == {"code": "JFK", "iata": "JFK", "weather_rating": 2}
+
+    @pytest.mark.it(
+        "ParquetWriter keeps the column types when a row group holds only nulls"
+    )
+    def test_parquet_null_row_group(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        out = tmp_path / "profiles.parquet"
+        cold = {"traffic_info": {"arrivals_15min": None, "delay_ratio": None}}
+        warm = {"traffic_info": {"arrivals_15min": 12, "delay_ratio": 0}}
+        writer = cli.ParquetWriter(str(out), row_group_size=2)
+        for code in ("JFK", "LHR"):
+            writer.write(code, cold)
+        writer.write("CDG", warm)
+        writer.write(
+            "AMS", {"traffic_info": {"arrivals_15min": 3, "delay_ratio": 0.25}}
+        )
+        writer.close()
+
+        table = pq.read_table(out)
+        assert pq.ParquetFile(out).num_row_groups == 2
+        assert str(table.schema.field("arrivals_15min").type) == "int64"
+        assert table.column("code").to_pylist() == ["JFK", "LHR", "CDG", "AMS"]
+        assert table.column("arrivals_15min").to_pylist() == [None, None, 12, 3]
+        assert table.column("delay_ratio").to_pylist() == [None, None, 0.0, 0.25]
+
+
+@pytest.mark.describe("METAR CLI tests")
+class TestMetarCLI:
+    @pytest.mark.it("metar loads the stations of a file and reports skipped reports")
+    @mock.patch("app.cli.load_observations", side_effect=len)
+    def test_metar(self, mock_load_observations, tmp_path, capsys):
+        metar_file = tmp_path / "metars.txt"
+        metar_file.write_text(
+            "KJFK 231551Z 18012KT 10SM FEW250 28/18 A3027\n"
+            "EGLL 231550Z 24005KT 9999 SCT040 18/09 Q1021\n"
+            "garbage\n"
+        )
+
+        exit_code = cli.main(["metar", "--file", str(metar_file)])
+
+        assert exit_code == 0
+        assert sorted(mock_load_observations.call_args.args[0]) == ["EGLL", "KJFK"]
+        stderr = capsys.readouterr().err
+        assert "Skipped garbage" in stderr
+        assert "2 stations loaded, 1 reports skipped" in stderr
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import pytest
+import requests
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import deadline
+from app.core.deadline import DeadlineExceeded
+
+"""
+Test suite for per-request deadlines
+"""
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(deadline.apply_deadlines)
+
+    @app.get("/remaining")
+    def remaining():
+        return {"remaining": deadline.remaining()}
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(1)
+        return {"status": "ok"}
+
+    return TestClient(app)
+
+
+@pytest.mark.describe("Request deadline tests")
+class TestDeadline:
+    @pytest.mark.it(
+        "requests get REQUEST_TIMEOUT_MS by default, or less when the client asks for it"
+    )
+    def test_request_timeout(self, client):
+        with mock.patch.object(deadline.settings, "REQUEST_TIMEOUT_MS", 10000):
+            assert 9 < client.get("/remaining").json()["remaining"] <= 10
+            response = client.get("/remaining", headers={deadline.HEADER: "2000"})
+            assert 1 < response.json()["remaining"] <= 2
+            # Clients cannot extend the deadline, invalid values are ignored
+            response = client.get("/remaining", headers={deadline.HEADER: "60000"})
+            assert response.json()["remaining"] <= 10
+            response = client.get("/remaining", headers={deadline.HEADER: "soon"})
+            assert response.json()["remaining"] > 9
+
+    @pytest.mark.it("requests still running at their deadline get a 504")
+    def test_deadline_response(self, client):
+        response = client.get("/slow", headers={deadline.HEADER: "50"})
+        assert response.status_code == 504
+
+    @pytest.mark.it("there is no deadline outside of a request")
+    def test_no_deadline(self):
+        assert deadline.remaining() is None
+        assert not deadline.expired()
+        assert not deadline.near()
+        deadline.check()
+
+    @pytest.mark.it(
+        "upstream calls time out at the deadline, at most after UPSTREAM_TIMEOUT_MS"
+    )
+    def test_upstream_timeout(self):
+        with mock.patch.object(deadline.settings, "UPSTREAM_TIMEOUT_MS", 5000):
+            with deadline.upstream_call() as timeout:
+                assert timeout == 5
+            with deadline.deadline_after(0.5):
+                with deadline.upstream_call() as timeout:
+                    assert 0 < timeout <= 0.5
+
+    @pytest.mark.it("upstream calls are not started once the deadline has passed")
+    def test_upstream_expired(self):
+        with deadline.deadline_after(-1):
+            assert deadline.expired()
+            with pytest.raises(DeadlineExceeded):
+                with deadline.upstream_call():
+                    pytest.fail("The call should not run")
+
+    @pytest.mark.it("upstream timeouts caused by the deadline raise DeadlineExceeded")
+    def test_upstream_timeout_at_deadline(self):
+        with deadline.deadline_after(0.01):
+            with pytest.raises(DeadlineExceeded):
+                with deadline.upstream_call():
+                    time.sleep(0.02)
+                    raise requests.exceptions.Timeout()
+        # Timeouts of the provider itself are left as they are
+        with deadline.deadline_after(10):
+            with pytest.raises(requests.exceptions.Timeout):
+                with deadline.upstream_call():
+                    raise requests.exceptions.Timeout()
+
+    @pytest.mark.it("near is true once less than STALE_WITHIN_MS is left")
+    def test_near(self):
+        with mock.patch.object(deadline.settings, "STALE_WITHIN_MS", 500):
+            with deadline.deadline_after(0.1):
+                assert deadline.near()
+            with deadline.deadline_after(10):
+                assert not deadline.near()
@@ -0,0 +1,288 @@
+import json
+import threading
+import pytest
+import requests
+from dataclasses import asdict
+from unittest import mock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.models import Flight
+from app.services import flights
+from app.api.flights import render_flights
+
+"""
+Test suite for the flight status service and endpoints
+"""
+
+
+def flight_info(number, dep="JFK"):
+    return {
+        "flight_date": "2026-10-19",
+        "flight_status": "scheduled",
+        "departure": {
+            "airport": "John F Kennedy International",
+            "iata": dep,
+            "delay": 12,
+            "gate": "B3",
+            "timezone": "America/New_York",
+        },
+        "arrival": {
+            "airport": "Heathrow",
+            "iata": "LHR",
+            "scheduled": "2026-10-20T06:45:00+00:00",
+            "baggage": "7",
+        },
+        "airline": {"name": "British Airways", "iata": "BA"},
+        "flight": {
+            "number": str(number),
+            "iata": f"BA{number}",
+            "icao": f"BAW{number}",
+            "codeshared": None,
+        },
+        "aircraft": None,
+        "live": None,
+    }
+
+
+def page_body(numbers, total):
+    return json.dumps(
+        {
+            "pagination": {
+                "limit": 100,
+                "offset": 0,
+                "count": len(numbers),
+                "total": total,
+            },
+            "data": [flight_info(number) for number in numbers],
+        }
+    )
+
+
+def chunked(text, size):
+    starts = range(0, len(text), size)
+    return [text[start:][:size] for start in starts]
+
+
+def mock_response(body, size=7):
+    response = mock.MagicMock()
+    response.__enter__.return_value = response
+    response.iter_content.return_value = chunked(body.encode(), size)
+    return response
+
+
+@pytest.fixture
+def no_cache():
+    with mock.patch.object(
+        flights, "check_cache", return_value=None
+    ), mock.patch.object(flights, "cache_response") as mock_cache_response:
+        yield mock_cache_response
+
+
+@pytest.mark.describe("Streaming JSON parser tests")
+class TestIterMembers:
+    @pytest.mark.it(
+        "iter_members yields members and array items whatever the chunk size"
+    )
+    def test_iter_members(self):
+        body = page_body([1, 2, 3], 3)
+        for size in (1, 2, 5, 64, len(body)):
+            members = list(flights.iter_members(chunked(body, size)))
+            assert members[0] == (
+                "pagination",
+                {"limit": 100, "offset": 0, "count": 3, "total": 3},
+            )
+            assert members[1:] == [("data", flight_info(n)) for n in (1, 2, 3)]
+
+    @pytest.mark.it("iter_members waits for numbers split across chunks")
+    def test_iter_members_numbers(self):
+        assert list(flights.iter_members(['{"total": 12', "34, ", '"data": []}'])) == [
+            ("total", 1234)
+        ]
+        assert list(flights.iter_members(['{"data": [1', "2, 3", "]}"])) == [
+            ("data", 12),
+            ("data", 3),
+        ]
+        assert list(flights.iter_members([" { } "])) == []
+
+    @pytest.mark.it("iter_members rejects malformed JSON")
+    def test_iter_members_malformed(self):
+        for text in (
+            '[{"data": []}]',
+            '{"data": [1 2]}',
+            '{"data": [{"a": 1}',
+            '{"a": 1 "b": 2}',
+            "",
+        ):
+            with pytest.raises(ValueError):
+                list(flights.iter_members(chunked(text, 3)))
+
+
+@pytest.mark.describe("Flight status service tests")
+class TestFlights:
+    @pytest.mark.it(
+        "fetch_flights_page parses the streamed page into Flights and caches it"
+    )
+    @mock.patch("app.services.flights.requests.get")
+    def test_fetch_page(self, mock_get, no_cache):
+        mock_get.return_value = mock_response(page_body([117, 175], 2))
+
+        total, page = flights.fetch_flights_page("flight_iata=BA117", 0, "key")
+
+        assert total == 2
+        assert [flight.flight_iata for flight in page] == ["BA117", "BA175"]
+        assert page[0].departure_delay == 12
+        assert page[0].arrival_scheduled == "2026-10-20T06:45:00+00:00"
+        assert mock_get.call_args.kwargs["stream"] is True
+        cache_key, cached, expire = no_cache.call_args.args
+        assert cached == {"total": 2, "data": [asdict(flight) for flight in page]}
+        assert "ns:flights" in no_cache.call_args.kwargs["tags"]
+
+    @pytest.mark.it(
+        "fetch_flights_page serves cached pages without calling AviationStack"
+    )
+    @mock.patch("app.services.flights.requests.get")
+    @mock.patch("app.services.flights.check_cache")
+    def test_fetch_page_cached(self, mock_check_cache, mock_get):
+        flight = Flight.from_response(flight_info(117))
+        mock_check_cache.return_value = {"total": 1, "data": [asdict(flight)]}
+        assert flights.fetch_flights_page("flight_iata=BA117", 0, "key") == (
+            1,
+            [flight],
+        )
+        mock_get.assert_not_called()
+
+    @pytest.mark.it(
+        "fetch_flights_page raises on AviationStack error payloads without caching them"
+    )
+    @mock.patch("app.services.flights.requests.get")
+    def test_fetch_page_error(self, mock_get, no_cache):
+        mock_get.return_value = mock_response(
+            json.dumps(
+                {
+                    "error": {
+                        "code": "usage_limit_reached",
+                        "message": "Usage limit reached",
+                    }
+                }
+            )
+        )
+        with pytest.raises(
+            requests.exceptions.RequestException, match="Usage limit reached"
+        ):
+            flights.fetch_flights_page("flight_iata=BA117", 0, "key")
+        mock_get.return_value = mock_response(
+            '{"pagination": {"total": 1}, "data": [{"flight"'
+        )
+        with pytest.raises(
+            requests.exceptions.RequestException, match="invalid response"
+        ):
+            flights.fetch_flights_page("flight_iata=BA117", 0, "key")
+        no_cache.assert_not_called()
+
+    @pytest.mark.it(
+        "fetch_flights fetches the next pages concurrently and yields flights in page order"
+    )
+    def test_fetch_flights_pages(self):
+        started = set()
+        all_started = threading.Event()
+
+        def fetch_page(query, page, as_api_key, tags=None):
+            started.add(page)
+            if started >= {1, 2}:
+                all_started.set()
+            # Page 1 waits until page 2 is loading as well
+            if page == 1:
+                assert all_started.wait(timeout=5)
+            return 250, [
+                Flight.from_response(flight_info(page * 100 + i)) for i in range(2)
+            ]
+
+        with mock.patch.object(
+            flights, "fetch_flights_page", side_effect=fetch_page
+        ), mock.patch.object(flights.settings, "FLIGHTS_MAX_PAGES", 10):
+            total, results = flights.fetch_flights("dep_iata=JFK", "key")
+            assert total == 250
+            assert [flight.flight_iata for flight in results] == [
+                "BA0",
+                "BA1",
+                "BA100",
+                "BA101",
+                "BA200",
+                "BA201",
+            ]
+
+    @pytest.mark.it("flight numbers and airport codes are validated before any request")
+    @mock.patch("app.services.flights.fetch_flights")
+    def test_validation(self, mock_fetch_flights):
+        with pytest.raises(ValueError):
+            flights.flight_status("not a flight")
+        with pytest.raises(ValueError):
+            flights.airport_departures("JFKX1")
+        with pytest.raises(ValueError):
+            flights.airport_departures("X&Y")
+        flights.airport_departures("egll")
+        assert mock_fetch_flights.call_args.args[0] == "dep_icao=EGLL"
+        flights.flight_status("ba117")
+        assert mock_fetch_flights.call_args.args[0] == "flight_iata=BA117"
+
+
+@pytest.mark.describe("Flight status endpoint tests")
+class TestFlightEndpoints:
+    @pytest.mark.it(
+        "render_flights ends the response with an error when a later page fails"
+    )
+    def test_render_error(self):
+        def results():
+            yield Flight.from_response(flight_info(117))
+            raise requests.exceptions.RequestException("AviationStack error: page 2")
+
+        body = json.loads("".join(render_flights(150, results())))
+        assert body["total"] == 150
+        assert body["count"] == 1
+        assert body["flights"][0]["flight_iata"] == "BA117"
+        assert body["error"] == "AviationStack error: page 2"
+
+    @pytest.mark.it("departures are streamed as one JSON document")
+    @mock.patch("app.services.flights.requests.get")
+    def test_departures_endpoint(self, mock_get, no_cache):
+        numbers = list(range(1, 151))
+        mock_get.side_effect = [
+            mock_response(page_body(numbers[:100], 150), 4096),
+            mock_response(page_body(numbers[100:], 150), 4096),
+        ]
+        response = TestClient(app).get("/airport/JFK/departures")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total"] == body["count"] == 150
+        assert [flight["flight_iata"] for flight in body["flights"]] == [
+            f"BA{n}" for n in numbers
+        ]
+        assert "dep_iata=JFK" in mock_get.call_args_list[0].args[0]
+        assert "offset=100" in mock_get.call_args_list[1].args[0]
+
+    @pytest.mark.it("invalid flight numbers return a 400 status code")
+    def test_flight_endpoint_invalid(self):
+        assert TestClient(app).get("/flights/NOT-A-FLIGHT").status_code == 400
+
+    @pytest.mark.it(
+        "airport codes that could change the AviationStack query return a 400 status code"
+    )
+    @mock.patch("app.services.flights.requests.get")
+    def test_departures_endpoint_invalid(self, mock_get):
+        assert TestClient(app).get("/airport/X%26Y/departures").status_code == 400
+        mock_get.assert_not_called()
+
+    @pytest.mark.it("AviationStack errors on the first page return a 502 status code")
+    @mock.patch("app.services.flights.requests.get")
+    def test_flight_endpoints_upstream_error(self, mock_get, no_cache):
+        error = json.dumps(
+            {"error": {"code": "usage_limit_reached", "message": "Usage limit reached"}}
+        )
+        mock_get.side_effect = lambda *args, **kwargs: mock_response(error)
+        client = TestClient(app)
+        for path in ("/flights/BA117", "/airport/JFK/departures"):
+            response = client.get(path)
+            assert response.status_code == 502
+            assert (
+                response.json()["detail"] == "AviationStack error: Usage limit reached"
+            )
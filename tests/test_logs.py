@@ -0,0 +1,97 @@
+import json
+import logging
+import queue
+import sys
+import pytest
+from unittest import mock
+from app.core import logs
+from app.core.logs import DroppingQueueHandler, JSONFormatter, log_sampled
+
+"""
+Test suite for the logging setup
+"""
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("app.tests.logs")
+    handler = DroppingQueueHandler(queue.Queue())
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logs._counters.clear()
+    yield logger, handler.queue
+    logger.removeHandler(handler)
+    logs._counters.clear()
+
+
+@pytest.mark.describe("Logging tests")
+class TestLogs:
+    @pytest.mark.it(
+        "JSONFormatter writes one JSON object with the message and extra fields"
+    )
+    def test_json_formatter(self):
+        record = logging.makeLogRecord(
+            {
+                "name": "app.services.cache",
+                "levelno": logging.ERROR,
+                "levelname": "ERROR",
+                "msg": "Error caching %s: %s",
+                "args": ("k", "timeout"),
+                "event": "cache_error",
+            }
+        )
+        entry = json.loads(JSONFormatter().format(record))
+        assert entry["level"] == "ERROR"
+        assert entry["logger"] == "app.services.cache"
+        assert entry["message"] == "Error caching k: timeout"
+        assert entry["event"] == "cache_error"
+        assert "args" not in entry
+
+    @pytest.mark.it("JSONFormatter includes the exception traceback")
+    def test_json_formatter_exception(self):
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = logging.makeLogRecord(
+                {"msg": "failed", "exc_info": sys.exc_info()}
+            )
+        entry = json.loads(JSONFormatter().format(record))
+        assert "ValueError: bad" in entry["exception"]
+
+    @pytest.mark.it(
+        "DroppingQueueHandler queues records unformatted and drops them when full"
+    )
+    def test_dropping_queue_handler(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        first = logging.makeLogRecord({"msg": "a %s", "args": (1,)})
+        handler.handle(first)
+        handler.handle(logging.makeLogRecord({"msg": "b"}))
+        assert handler.queue.get_nowait() is first
+        assert first.args == (1,)
+        assert handler.dropped == 1
+
+    @pytest.mark.it("log_sampled keeps one record in every LOG_SAMPLE_RATE per event")
+    def test_log_sampled(self, logger):
+        logger, records = logger
+        with mock.patch("app.core.logs.settings.LOG_SAMPLE_RATE", 10):
+            for i in range(25):
+                log_sampled(logger, logging.DEBUG, "cache_hit", "Cache hit %s", i)
+            log_sampled(logger, logging.DEBUG, "cache_miss", "Cache miss %s", 0)
+        kept = [records.get_nowait() for _ in range(records.qsize())]
+        assert [record.getMessage() for record in kept] == [
+            "Cache hit 0",
+            "Cache hit 10",
+            "Cache hit 20",
+            "Cache miss 0",
+        ]
+        assert kept[0].sample_rate == 10
+
+    @pytest.mark.it(
+        "log_sampled skips events below the logger's level without counting them"
+    )
+    def test_log_sampled_disabled(self, logger):
+        logger, records = logger
+        logger.setLevel(logging.INFO)
+        log_sampled(logger, logging.DEBUG, "cache_hit", "Cache hit")
+        assert records.empty()
+        assert "cache_hit" not in logs._counters
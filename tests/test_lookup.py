@@ -0,0 +1,174 @@
+import json
+import threading
+import pytest
+from dataclasses import asdict
+from unittest import mock
+from app.core.deadline import DeadlineExceeded, deadline_after
+from app.core.models import Airport, WeatherObservation
+from app.services.cache import local_cache
+from app.services.weather import get_local_weather_key
+from app.services.lookup import lookup_airport_weather
+
+"""
+Test suite for the airport and weather lookup
+"""
+
+AIRPORT_INFO = {
+    "data": [
+        {
+            "airport_name": "John F Kennedy International",
+            "iata_code": "JFK",
+            "icao_code": "KJFK",
+            "country_name": "United States",
+            "latitude": "40.642334",
+            "longitude": "-73.78817",
+            "timezone": "America/New_York",
+            "gmt": "-5",
+        }
+    ]
+}
+AIRPORT = Airport.from_response(AIRPORT_INFO)
+WEATHER = WeatherObservation(
+    city="New York",
+    observation_time="03:51 PM",
+    observed_at=1719157860,
+    temperature=28,
+    wind_speed=22.2,
+    wind_degree=180,
+    wind_dir="S",
+    pressure=1025,
+    precip=0.0,
+    humidity=55,
+    cloudcover=25.0,
+    visibility=16.1,
+    description="Partly cloudy",
+    icon=None,
+)
+COORDS = {"latitude": 40.642334, "longitude": -73.78817, "iata": "JFK", "icao": "KJFK"}
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    local_cache.clear()
+    yield
+    local_cache.clear()
+
+
+@pytest.fixture
+def services():
+    with mock.patch.multiple(
+        "app.services.lookup",
+        check_cache_many=mock.DEFAULT,
+        get_airport=mock.DEFAULT,
+        get_current_weather=mock.DEFAULT,
+        redis_client=mock.DEFAULT,
+    ) as mocks:
+        yield mocks
+
+
+@pytest.mark.describe("Airport and weather lookup tests")
+class TestLookup:
+    @pytest.mark.it(
+        "lookup_airport_weather resolves a warm airport and its weather in one MGET"
+    )
+    def test_lookup_warm(self, services):
+        services["check_cache_many"].return_value = [
+            asdict(WEATHER),
+            AIRPORT_INFO,
+            COORDS,
+        ]
+
+        airport, weather = lookup_airport_weather("jfk")
+
+        assert airport == AIRPORT
+        assert weather == WEATHER
+        keys = services["check_cache_many"].call_args.args[0]
+        assert keys[0] == "weather:airport:JFK"
+        assert keys[2] == "airport:coords:JFK"
+        services["get_airport"].assert_not_called()
+        services["get_current_weather"].assert_not_called()
+        services["redis_client"].pipeline.assert_not_called()
+
+        # Served from the local cache afterwards
+        assert lookup_airport_weather("JFK") == (AIRPORT, WEATHER)
+        assert services["check_cache_many"].call_count == 1
+
+    @pytest.mark.it(
+        "lookup_airport_weather fetches weather and airport together when only coordinates are known"
+    )
+    def test_lookup_coords_known(self, services):
+        services["check_cache_many"].return_value = [None, None, COORDS]
+        weather_started = threading.Event()
+
+        def get_current_weather(latitude, longtitude, tags=None, icao=None):
+            assert (latitude, longtitude, icao) == (40.642334, -73.78817, "KJFK")
+            weather_started.set()
+            return WEATHER
+
+        def get_airport(airport_code):
+            # The weather fetch is already running before the airport returns
+            assert weather_started.wait(timeout=5)
+            return AIRPORT
+
+        services["get_current_weather"].side_effect = get_current_weather
+        services["get_airport"].side_effect = get_airport
+
+        assert lookup_airport_weather("JFK") == (AIRPORT, WEATHER)
+        pipeline = services["redis_client"].pipeline.return_value
+        key, expire, value = pipeline.setex.call_args.args
+        assert key == "weather:airport:JFK"
+        assert json.loads(value) == asdict(WEATHER)
+
+    @pytest.mark.it(
+        "lookup_airport_weather caches the weather copy and coordinates after a cold lookup"
+    )
+    def test_lookup_cold(self, services):
+        services["check_cache_many"].return_value = [None, None, None]
+        services["get_airport"].return_value = AIRPORT
+        services["get_current_weather"].return_value = WEATHER
+
+        assert lookup_airport_weather("JFK") == (AIRPORT, WEATHER)
+        tags = services["get_current_weather"].call_args.kwargs["tags"]
+        assert sorted(tags) == ["airport:JFK", "airport:KJFK"]
+        pipeline = services["redis_client"].pipeline.return_value
+        keys = [call.args[0] for call in pipeline.setex.call_args_list]
+        assert keys == ["weather:airport:JFK", "airport:coords:JFK"]
+        pipeline.execute.assert_called_once()
+
+    @pytest.mark.it("lookup_airport_weather rejects a missing airport code")
+    def test_lookup_missing_code(self, services):
+        with pytest.raises(ValueError):
+            lookup_airport_weather("")
+
+    @pytest.mark.it(
+        "lookup_airport_weather serves expired local entries when the deadline is close"
+    )
+    def test_lookup_stale_near_deadline(self, services):
+        local_cache.set("airport:JFK", AIRPORT, -60)
+        local_cache.set(
+            get_local_weather_key(AIRPORT.latitude, AIRPORT.longitude), WEATHER, -60
+        )
+        services["check_cache_many"].return_value = [None, None, COORDS]
+
+        with deadline_after(0.1):
+            assert lookup_airport_weather("JFK") == (AIRPORT, WEATHER)
+        services["get_airport"].assert_not_called()
+        services["get_current_weather"].assert_not_called()
+
+    @pytest.mark.it(
+        "lookup_airport_weather serves expired local entries when an upstream call misses the deadline"
+    )
+    def test_lookup_stale_after_deadline(self, services):
+        local_cache.set("airport:JFK", AIRPORT, -60)
+        local_cache.set(
+            get_local_weather_key(AIRPORT.latitude, AIRPORT.longitude), WEATHER, -60
+        )
+        services["check_cache_many"].return_value = [None, None, None]
+        services["get_airport"].side_effect = DeadlineExceeded()
+
+        assert lookup_airport_weather("JFK") == (AIRPORT, WEATHER)
+
+        # Without anything stale the request fails
+        local_cache.clear()
+        with pytest.raises(DeadlineExceeded):
+            lookup_airport_weather("JFK")
@@ -1,6 +1,10 @@
 import pytest
+import redis
+from unittest import mock
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.deadline import DeadlineExceeded
+from app.services.admission import Overloaded
 
 """
 Test suite for the main application
@@ -27,3 +31,183 @@ class TestMain:
         response = client.get(end_point)
         assert response.status_code == 404
         assert response.json() == {"detail": "Not Found"}
+
+    @pytest.mark.it("overloaded upstreams return a 503 status code with Retry-After")
+    @mock.patch("app.main.airport_query")
+    def test_main_overloaded_503(self, mock_airport_query, client):
+        mock_airport_query.side_effect = Overloaded("aviationstack", 3)
+        response = client.get("/airport/JFK")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+
+    @pytest.mark.it("requests past their deadline return a 504 status code")
+    @mock.patch("app.main.airport_query")
+    def test_main_deadline_504(self, mock_airport_query, client):
+        mock_airport_query.side_effect = DeadlineExceeded()
+        response = client.get("/airport/JFK", headers={"X-Request-Timeout-Ms": "1000"})
+        assert response.status_code == 504
+
+
+@pytest.mark.describe("Weather risk tile endpoint tests")
+class TestTiles:
+    @pytest.mark.it("tiles returns the packed layers with format=bin")
+    @mock.patch("app.services.tiles.check_cache_many", return_value=[])
+    @mock.patch("app.services.tiles.cache_response")
+    @mock.patch("app.services.tiles.check_cache", return_value=None)
+    @mock.patch("app.services.tiles.redis_client")
+    def test_tiles_bin(
+        self,
+        mock_client,
+        mock_check_cache,
+        mock_cache_response,
+        mock_check_cache_many,
+        client,
+    ):
+        mock_client.geosearch.return_value = []
+        response = client.get("/tiles/2/1/1?format=bin")
+        assert response.status_code == 200
+        assert response.headers["X-Tile-Layers"].startswith("weather_rating,")
+        size = int(response.headers["X-Tile-Size"])
+        assert response.content == bytes([255]) * (5 * size * size)
+
+    @pytest.mark.it("tiles out of range return a 400 status code")
+    def test_tiles_out_of_range(self, client):
+        response = client.get("/tiles/2/4/0")
+        assert response.status_code == 400
+
+
+@pytest.mark.describe("Airport ranking endpoint tests")
+class TestRank:
+    @staticmethod
+    def airport(code, country="United States"):
+        return {
+            "data": [
+                {
+                    "airport_name": f"{code} Airport",
+                    "country_name": country,
+                    "latitude": str(len(code)),
+                    "longitude": str(ord(code[0])),
+                }
+            ]
+        }
+
+    @staticmethod
+    def weather(cloudcover, precip, wind_speed, visibility):
+        return {
+            "current": {
+                "cloudcover": cloudcover,
+                "precip": precip,
+                "wind_speed": wind_speed,
+                "visibility": visibility,
+            }
+        }
+
+    @pytest.mark.it("rank returns a 400 status code without codes or region")
+    def test_rank_requires_candidates(self, client):
+        response = client.get("/airports/rank")
+        assert response.status_code == 400
+
+    @pytest.mark.it("rank returns the top-k airports by cached weather risk")
+    @mock.patch("app.api.rank.check_cache_many")
+    def test_rank_top_k(self, mock_check_cache_many, client):
+        mock_check_cache_many.side_effect = [
+            [self.airport("JFK"), self.airport("LHR"), self.airport("CDG"), None],
+            [
+                self.weather(0, 0, 5, 20),
+                self.weather(100, 10, 60, 1),
+                self.weather(50, 1, 20, 8),
+            ],
+        ]
+        response = client.get("/airports/rank?codes=JFK,LHR,CDG,ORD&k=2")
+        assert response.status_code == 200
+        body = response.json()
+        assert [airport["code"] for airport in body["airports"]] == ["LHR", "CDG"]
+        assert body["airports"][0]["weather_rating"] == 10
+        assert body["airports"][0]["components"]["wind_risk"] == 10
+        assert body["unavailable"] == ["ORD"]
+
+    @pytest.mark.it("rank includes the airports indexed for a region")
+    @mock.patch("app.api.rank.get_region_airports")
+    @mock.patch("app.api.rank.check_cache_many")
+    def test_rank_region(self, mock_check_cache_many, mock_region, client):
+        mock_region.return_value = ["JFK", "LAX"]
+        mock_check_cache_many.side_effect = [[None, None], []]
+        response = client.get("/airports/rank?region=us")
+        assert response.status_code == 200
+        mock_region.assert_called_once_with("us")
+        assert response.json() == {"airports": [], "unavailable": ["JFK", "LAX"]}
+
+
+@pytest.mark.describe("Admin cache API tests")
+class TestAdminCache:
+    @pytest.fixture(autouse=True)
+    def admin_key(self):
+        with mock.patch("app.main.settings.ADMIN_API_KEY", "secret"):
+            yield
+
+    @pytest.mark.it("admin endpoints return a 403 status code without the admin key")
+    def test_admin_requires_key(self, client):
+        response = client.get("/admin/cache/stats")
+        assert response.status_code == 403
+        with mock.patch("app.main.settings.ADMIN_API_KEY", ""):
+            response = client.get("/admin/cache/stats", headers={"X-Admin-Key": ""})
+        assert response.json() == {"detail": "Admin API is disabled"}
+
+    @pytest.mark.it("invalidate deletes the entries of a normalised tag")
+    @mock.patch("app.api.admin.invalidate_tag")
+    def test_admin_invalidate(self, mock_invalidate_tag, client):
+        mock_invalidate_tag.return_value = 3
+        response = client.post(
+            "/admin/cache/invalidate?tag=airport:jfk", headers={"X-Admin-Key": "secret"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"tag": "airport:JFK", "deleted": 3}
+
+    @pytest.mark.it("cache operations return a 503 status code while Redis is down")
+    @mock.patch("app.api.admin.keyspace_stats")
+    @mock.patch("app.api.admin.invalidate_tag")
+    def test_admin_redis_down(self, mock_invalidate_tag, mock_keyspace_stats, client):
+        mock_invalidate_tag.side_effect = redis.ConnectionError("down")
+        mock_keyspace_stats.side_effect = redis.ConnectionError("down")
+        headers = {"X-Admin-Key": "secret"}
+        response = client.post(
+            "/admin/cache/invalidate?tag=ns:weather", headers=headers
+        )
+        assert response.status_code == 503
+        assert response.json() == {"detail": "Cache unavailable"}
+        assert client.get("/admin/cache/stats", headers=headers).status_code == 503
+
+    @pytest.mark.it("Redis errors outside the admin API are not reported as 503")
+    @mock.patch("app.main.airport_query")
+    def test_redis_error_elsewhere(self, mock_airport_query):
+        mock_airport_query.side_effect = redis.ConnectionError("down")
+        response = TestClient(app, raise_server_exceptions=False).get("/airport/JFK")
+        assert response.status_code == 500
+
+    @pytest.mark.it("invalidate returns a 400 status code for unknown tags")
+    def test_admin_invalidate_bad_tag(self, client):
+        response = client.post(
+            "/admin/cache/invalidate?tag=ns:routes", headers={"X-Admin-Key": "secret"}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.it("prewarm reports the airports warmed and failed")
+    @mock.patch("app.api.admin.airport_query")
+    def test_admin_prewarm(self, mock_airport_query, client):
+        def airport_query(code):
+            if code != "JFK":
+                raise ValueError("not found")
+            return {}
+
+        mock_airport_query.side_effect = airport_query
+        response = client.post(
+            "/admin/cache/prewarm?codes=jfk,XXX", headers={"X-Admin-Key": "secret"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"warmed": ["JFK"], "failed": {"XXX": "not found"}}
+
+    @pytest.mark.it("loop reports the event loop lag percentiles")
+    def test_admin_loop(self, client):
+        response = client.get("/admin/loop", headers={"X-Admin-Key": "secret"})
+        assert response.status_code == 200
+        assert set(response.json()["lag_ms"]) == {"p50", "p95", "p99", "max"}
@@ -0,0 +1,156 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from unittest import mock
+from app.services.metar import (
+    get_metar_key,
+    parse_metar,
+    parse_reports,
+    load_observations,
+)
+
+"""
+Test suite for METAR ingestion
+"""
+
+REFERENCE = datetime(2024, 6, 23, 16, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.describe("METAR parser tests")
+class TestParseMetar:
+    @pytest.mark.it("parse_metar converts a US report into WeatherStack units")
+    def test_parse_us_report(self):
+        station, weather = parse_metar(
+            "METAR KJFK 231551Z 17010G18KT 1 1/2SM -RA BR FEW008 OVC025 22/20 A2992 "
+            "RMK AO2 SLP132 P0012 T02220200",
+            REFERENCE,
+        )
+
+        assert station == "KJFK"
+        assert weather.observed_at == int(
+            datetime(2024, 6, 23, 15, 51, tzinfo=timezone.utc).timestamp()
+        )
+        assert weather.observation_time == "03:51 PM"
+        assert weather.wind_speed == 18.5
+        assert weather.wind_degree == 170
+        assert weather.wind_dir == "S"
+        assert weather.visibility == 2.4
+        assert weather.cloudcover == 100.0
+        assert weather.pressure == 1013
+        assert weather.temperature == 22.2
+        assert weather.humidity == 89
+        assert weather.precip == 3.0
+        assert weather.description == "Light rain"
+
+    @pytest.mark.it("parse_metar reads metric visibility, hPa and CAVOK")
+    def test_parse_icao_report(self):
+        _, weather = parse_metar(
+            "EGLL 231550Z AUTO 24005MPS 9999 SCT040 18/09 Q1021", REFERENCE
+        )
+        assert weather.wind_speed == 18.0
+        assert weather.visibility == 10.0
+        assert weather.cloudcover == 50.0
+        assert weather.pressure == 1021
+        assert weather.precip == 0.0
+        assert weather.description == "Partly cloudy"
+
+        _, weather = parse_metar("LFPG 231530Z VRB02KT CAVOK M02/M05 Q1030", REFERENCE)
+        assert weather.wind_dir == "VRB"
+        assert weather.wind_degree is None
+        assert weather.cloudcover == 0
+        assert weather.temperature == -2
+        assert weather.humidity == 85
+        assert weather.description == "Clear"
+
+    @pytest.mark.it("parse_metar estimates precipitation from the intensity")
+    def test_parse_intensity_precip(self):
+        _, weather = parse_metar(
+            "EDDF 231550Z 27015KT 3000 +TSRA BKN010CB 17/16 Q1008", REFERENCE
+        )
+        assert weather.precip == 10.0
+        assert weather.description == "Heavy thunderstorm rain"
+
+    @pytest.mark.it(
+        "parse_metar dates a day later than the reference in the previous month"
+    )
+    def test_parse_previous_month(self):
+        _, weather = parse_metar(
+            "KJFK 302351Z 00000KT 10SM CLR 20/10 A3000",
+            datetime(2024, 7, 1, 0, 30, tzinfo=timezone.utc),
+        )
+        assert weather.observed_at == int(
+            datetime(2024, 6, 30, 23, 51, tzinfo=timezone.utc).timestamp()
+        )
+
+    @pytest.mark.it(
+        "parse_metar returns None for NIL reports and rejects malformed ones"
+    )
+    def test_parse_nil_and_invalid(self):
+        assert parse_metar("KJFK 231551Z NIL=", REFERENCE) is None
+        with pytest.raises(ValueError):
+            parse_metar("KJFK", REFERENCE)
+        with pytest.raises(ValueError):
+            parse_metar("KJFK 2315Z 17010KT", REFERENCE)
+
+    @pytest.mark.it("get_metar_key keys observations by ICAO code")
+    def test_get_metar_key(self):
+        assert get_metar_key("kjfk") == "metar:KJFK"
+
+
+@pytest.mark.describe("METAR loading tests")
+class TestLoadMetar:
+    @pytest.mark.it(
+        "parse_reports keeps the latest report per station and collects errors"
+    )
+    def test_parse_reports_text(self):
+        lines = [
+            "2024/06/23 15:00",
+            "KJFK 231451Z 17010KT 10SM FEW250 27/18 A3027",
+            "",
+            "2024/06/23 16:00",
+            "KJFK 231551Z 18012KT 10SM FEW250 28/18 A3027",
+            "EGLL 231550Z 24005KT 9999 SCT040 18/09 Q1021",
+            "garbage",
+        ]
+        errors = []
+        observations = parse_reports(lines, errors=errors)
+
+        assert sorted(observations) == ["EGLL", "KJFK"]
+        assert observations["KJFK"].temperature == 28
+        assert len(errors) == 1 and errors[0].startswith("garbage")
+
+    @pytest.mark.it("parse_reports reads the raw_text column of a CSV file")
+    def test_parse_reports_csv(self):
+        lines = [
+            "No errors",
+            "1 results",
+            "raw_text,station_id,observation_time",
+            "KJFK 231551Z 18012KT 10SM FEW250 28/18 A3027,KJFK,2024-06-23T15:51:00Z",
+        ]
+        observations = parse_reports(lines, "csv")
+        assert list(observations) == ["KJFK"]
+
+    @pytest.mark.it("load_observations writes tagged observations in batches")
+    @mock.patch("app.services.metar.LOAD_BATCH_SIZE", 2)
+    @mock.patch("app.services.metar.update_weather_summary")
+    @mock.patch("app.services.metar.redis_client")
+    def test_load_observations(self, mock_client, mock_update_weather_summary):
+        observations = parse_reports(
+            [
+                "KJFK 231551Z 18012KT 10SM FEW250 28/18 A3027",
+                "EGLL 231550Z 24005KT 9999 SCT040 18/09 Q1021",
+                "LFPG 231530Z VRB02KT CAVOK M02/M05 Q1030",
+            ],
+        )
+        pipeline = mock_client.pipeline.return_value
+
+        assert load_observations(observations, expire=600) == 3
+        assert pipeline.execute.call_count == 2
+        key, expire, value = pipeline.setex.call_args_list[0].args
+        assert (key, expire) == ("metar:KJFK", 600)
+        assert json.loads(value)["temperature"] == 28
+        tagged = [call.args[0] for call in pipeline.sadd.call_args_list]
+        assert "tag:provider:metar" in tagged
+        assert "tag:airport:KJFK" in tagged
+        mock_update_weather_summary.assert_any_call("KJFK", observations["KJFK"])
+        assert mock_update_weather_summary.call_count == 3
@@ -0,0 +1,91 @@
+import pytest
+from datetime import datetime, timezone
+from app.core.models import Airport, WeatherObservation, AirportProfile
+
+"""
+Test suite for the internal models
+"""
+
+
+@pytest.mark.describe("Internal Model Tests")
+class TestModels:
+    @pytest.mark.it("Airport.from_response parses the airport with float coordinates")
+    def test_airport_from_response(self, airport_response):
+        airport = Airport.from_response(airport_response)
+        assert airport.name == "John F Kennedy International"
+        assert airport.iata == "JFK"
+        assert airport.icao == "KJFK"
+        assert airport.country_iso2 == "US"
+        assert airport.latitude == 40.642334
+        assert airport.longitude == -73.78817
+
+    @pytest.mark.it("Airport.from_response raises ValueError for invalid responses")
+    def test_airport_from_response_invalid(self):
+        with pytest.raises(ValueError):
+            Airport.from_response({"data": []})
+        with pytest.raises(ValueError):
+            Airport.from_response({"data": [{"latitude": None, "longitude": "1"}]})
+
+    @pytest.mark.it("models are slotted")
+    def test_models_are_slotted(self, airport_response):
+        airport = Airport.from_response(airport_response)
+        assert not hasattr(airport, "__dict__")
+
+    @pytest.mark.it("WeatherObservation.from_openmeteo converts to WeatherStack units")
+    def test_weather_from_openmeteo(self):
+        weather = WeatherObservation.from_openmeteo(
+            {
+                "current": {
+                    "time": 1753285200,
+                    "temperature_2m": 27.1,
+                    "relative_humidity_2m": 56,
+                    "precipitation": 0.2,
+                    "weather_code": 2,
+                    "cloud_cover": 75,
+                    "pressure_msl": 1025.3,
+                    "wind_speed_10m": 12.4,
+                    "wind_direction_10m": 170,
+                    "visibility": 16000,
+                }
+            }
+        )
+        assert weather.observation_time == "03:40 PM"
+        assert weather.wind_dir == "S"
+        assert weather.visibility == 16
+        assert weather.description == "Partly cloudy"
+        assert weather.city is None
+        with pytest.raises(ValueError):
+            WeatherObservation.from_openmeteo({"error": True, "reason": "bad"})
+
+    @pytest.mark.it("WeatherObservation.from_response parses the current weather")
+    def test_weather_from_response(self, weather_response):
+        weather = WeatherObservation.from_response(weather_response)
+        assert weather.city == "Valley Stream"
+        assert weather.observed_at == 1753270800
+        assert weather.cloudcover == 75
+        assert weather.description == "Partly cloudy"
+        with pytest.raises(ValueError):
+            WeatherObservation.from_response({"success": False})
+
+    @pytest.mark.it("AirportProfile.to_dict renders the airport response format")
+    def test_profile_to_dict(self, airport_response, weather_response):
+        now = datetime(2025, 7, 23, 15, 40, tzinfo=timezone.utc)
+        profile = AirportProfile(
+            airport=Airport.from_response(airport_response),
+            weather=WeatherObservation.from_response(weather_response),
+            utc_time=now,
+            local_time=None,
+            dew_point=18,
+            windspeed_knots=6,
+            visibility_mi=10,
+            pressure_inhg=30.27,
+            cloud_cover_okta=6,
+            weather_rating=2,
+            traffic={"traffic_rating": None},
+        ).to_dict()
+        assert profile["airport_profile"]["city"] == "Valley Stream"
+        assert profile["airport_profile"]["current_time_utc"] == "15:40"
+        assert profile["airport_profile"]["current_time_local"] is None
+        assert profile["weather_info"]["weather_rating"] == 2
+        assert profile["weather_info"]["wind_speed_km"] == 12
+        assert profile["traffic_info"] == {"traffic_rating": None}
@@ -0,0 +1,97 @@
+import time
+import pytest
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import profiling
+
+"""
+Test suite for request profiling
+"""
+
+
+def busy_work():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(profiling.profile_requests)
+
+    @app.get("/work")
+    async def work():
+        busy_work()
+        return {"status": "ok"}
+
+    profiling.profiles.clear()
+    with mock.patch.object(profiling.settings, "ADMIN_API_KEY", "secret"):
+        yield TestClient(app)
+
+
+@pytest.mark.describe("Request profiling tests")
+class TestProfiling:
+    @pytest.mark.it("should_profile honours the debug header and sample rate")
+    @mock.patch.object(profiling.settings, "ADMIN_API_KEY", "secret")
+    def test_should_profile(self):
+        assert profiling.should_profile({}) is None
+        assert (
+            profiling.should_profile(
+                {"X-Debug-Profile": "cprofile", "X-Admin-Key": "secret"}
+            )
+            == "cprofile"
+        )
+        assert (
+            profiling.should_profile({"X-Debug-Profile": "1", "X-Admin-Key": "secret"})
+            == "sample"
+        )
+        with mock.patch.object(profiling.settings, "PROFILE_SAMPLE_RATE", 1):
+            assert profiling.should_profile({}) == "sample"
+
+    @pytest.mark.it("requests without the header or a valid admin key are not profiled")
+    def test_not_profiled(self, client):
+        for headers in (
+            {},
+            {"X-Debug-Profile": "sample"},
+            {"X-Debug-Profile": "sample", "X-Admin-Key": "wrong"},
+        ):
+            response = client.get("/work", headers=headers)
+            assert response.status_code == 200
+            assert "X-Debug-Profile-Id" not in response.headers
+        with mock.patch.object(profiling.settings, "ADMIN_API_KEY", ""):
+            response = client.get(
+                "/work", headers={"X-Debug-Profile": "sample", "X-Admin-Key": ""}
+            )
+            assert "X-Debug-Profile-Id" not in response.headers
+        assert len(profiling.profiles) == 0
+
+    @pytest.mark.it("sampled profiles are stored with folded stacks")
+    def test_sample_profile(self, client):
+        response = client.get(
+            "/work", headers={"X-Debug-Profile": "sample", "X-Admin-Key": "secret"}
+        )
+        profile = profiling.get_profile(int(response.headers["X-Debug-Profile-Id"]))
+        assert profile["mode"] == "sample"
+        assert profile["status_code"] == 200
+        assert profile["duration_ms"] >= 50
+        assert isinstance(profile["allocations"], list)
+        folded = profiling.to_folded(profile)
+        assert "busy_work" in folded
+        stack, count = folded.splitlines()[0].rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+
+    @pytest.mark.it("cProfile profiles include the call statistics")
+    def test_cprofile_profile(self, client):
+        response = client.get(
+            "/work", headers={"X-Debug-Profile": "cprofile", "X-Admin-Key": "secret"}
+        )
+        profile = profiling.get_profile(int(response.headers["X-Debug-Profile-Id"]))
+        assert profile["mode"] == "cprofile"
+        assert "busy_work" in profile["stats"]
+
+    @pytest.mark.it("profiled returns the function unchanged without DEBUG")
+    def test_profiled_disabled(self):
+        with mock.patch.object(profiling.settings, "DEBUG", False):
+            assert profiling.profiled(busy_work) is busy_work
@@ -0,0 +1,90 @@
+import pytest
+import redis
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import ratelimit
+
+"""
+Test suite for inbound rate limiting
+"""
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(ratelimit.limit_requests)
+
+    @app.get("/")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/airport/{airport_code}")
+    async def airport(airport_code: str):
+        return {"code": airport_code}
+
+    ratelimit._blocked.clear()
+    return TestClient(app)
+
+
+@pytest.fixture
+def mock_script():
+    with mock.patch("app.core.ratelimit._sliding_window") as mock_script:
+        yield mock_script
+
+
+@pytest.mark.describe("Rate limiting tests")
+class TestRateLimit:
+    @pytest.mark.it("parse_tier reads requests per window")
+    def test_parse_tier(self):
+        assert ratelimit.parse_tier("60/60") == (60, 60)
+        for tier in ("60", "0/60", "a/60"):
+            with pytest.raises(ValueError):
+                ratelimit.parse_tier(tier)
+
+    @pytest.mark.it("allowed requests carry the RateLimit headers")
+    def test_allowed(self, client, mock_script):
+        mock_script.return_value = [1, 59, 42000, 0]
+        response = client.get("/airport/JFK")
+        assert response.status_code == 200
+        assert response.headers["RateLimit-Limit"] == "60"
+        assert response.headers["RateLimit-Remaining"] == "59"
+        assert response.headers["RateLimit-Reset"] == "42"
+        assert response.headers["RateLimit-Policy"] == "60;w=60"
+        mock_script.assert_called_once_with(
+            keys=["ratelimit:{ip:testclient}"], args=[60, 60000]
+        )
+
+    @pytest.mark.it("clients over the limit get a 429 without reaching Redis again")
+    def test_rejected(self, client, mock_script):
+        mock_script.return_value = [0, 0, 42000, 3500]
+        response = client.get("/airport/JFK")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "4"
+        assert response.headers["RateLimit-Remaining"] == "0"
+        response = client.get("/airport/LHR")
+        assert response.status_code == 429
+        mock_script.assert_called_once()
+
+    @pytest.mark.it("known API keys are limited per key with their tier")
+    def test_api_key_tier(self, client, mock_script):
+        mock_script.return_value = [1, 5999, 60000, 0]
+        with mock.patch.dict(
+            ratelimit.settings.RATE_LIMIT_API_KEYS, {"secret": "premium"}
+        ):
+            response = client.get("/airport/JFK", headers={"X-API-Key": "secret"})
+        assert response.headers["RateLimit-Limit"] == "6000"
+        key = mock_script.call_args.kwargs["keys"][0]
+        assert key.startswith("ratelimit:{key:") and "secret" not in key
+
+    @pytest.mark.it("requests are let through when Redis is unavailable")
+    def test_fail_open(self, client, mock_script):
+        mock_script.side_effect = redis.ConnectionError("down")
+        response = client.get("/airport/JFK")
+        assert response.status_code == 200
+        assert "RateLimit-Limit" not in response.headers
+
+    @pytest.mark.it("health checks are not limited")
+    def test_exempt(self, client, mock_script):
+        assert client.get("/").status_code == 200
+        mock_script.assert_not_called()
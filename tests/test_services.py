@@ -1,10 +1,37 @@
 import pytest
+import threading
+import time
 from unittest import mock
-from app.services.aviationstack import get_airport_info
-from app.services.weatherstack import get_current_weather_info
+from app.core.config import settings
+from app.core.models import Airport, WeatherObservation
+from app.services.aviationstack import (
+    get_airport,
+    get_airport_info,
+    classify_airport_response,
+    AIRPORT_FOUND,
+    AIRPORT_NOT_FOUND,
+    UPSTREAM_ERROR,
+)
+from app.services.cache import LocalCache, get_cache_key
+from app.services.admission import AdmissionController, Overloaded, admit
+from app.core.deadline import DeadlineExceeded, deadline_after
+from app.services.lookup import store_airport_weather
+from app.services.summary import update_summary, expire_summary, get_summary
+from app.services.traffic import (
+    get_traffic_counts,
+    refresh_traffic_counts,
+    refresh_traffic_counts_in_background,
+    get_window,
+)
+from app.services.weatherstack import (
+    fetch_current_weather_info,
+    get_weather_url,
+    fetch_weather_batch,
+    WeatherBatcher,
+)
+from app.services import weather
 import requests
 
-
 """
 Test suite for the AviationStack service
 """
@@ -23,26 +50,12 @@ class TestAviationStack:
         "timezone",
         "country_iso2",
     ]
-    test_response = {
-        "data": [
-            {
-                "gmt": "-5",
-                "airport_name": "John F Kennedy International",
-                "iata_code": "JFK",
-                "icao_code": "KJFK",
-                "country_name": "United States",
-                "latitude": "40.642334",
-                "longitude": "-73.78817",
-                "timezone": "America/New_York",
-                "country_iso2": "US",
-            }
-        ]
-    }
 
     @pytest.mark.it("get_airport_info returns a valid response for iata code")
     @mock.patch("app.services.aviationstack.requests.get")
-    def test_get_airport_info_iata(self, mock_get):
-        mock_response = self.test_response
+    @mock.patch("app.services.aviationstack.redis_client")
+    def test_get_airport_info_iata(self, mock_redis_client, mock_get, airport_response):
+        mock_response = airport_response
         mock_get.return_value.json.return_value = mock_response
         response = get_airport_info(airport_code="JFK")
         assert response is not None
@@ -53,11 +66,13 @@ class TestAviationStack:
         for key in self.airport_keys:
             assert key in response["data"][0]
         assert response["data"][0]["icao_code"] == "KJFK"
+        mock_redis_client.sadd.assert_called_once_with("airports:region:US", "JFK")
 
     @pytest.mark.it("get_airport_info returns a valid response for icao code")
     @mock.patch("app.services.aviationstack.requests.get")
-    def test_get_airport_info_icao(self, mock_get):
-        mock_response = self.test_response
+    @mock.patch("app.services.aviationstack.redis_client")
+    def test_get_airport_info_icao(self, mock_redis_client, mock_get, airport_response):
+        mock_response = airport_response
         mock_get.return_value.json.return_value = mock_response
         response = get_airport_info(airport_code="KJFK")
         assert response is not None
@@ -68,6 +83,7 @@ class TestAviationStack:
         for key in self.airport_keys:
             assert key in response["data"][0]
         assert response["data"][0]["iata_code"] == "JFK"
+        mock_redis_client.sadd.assert_called_once_with("airports:region:US", "KJFK")
 
     @pytest.mark.it("get_airport_info raises ValueError for multiple results")
     @mock.patch("app.services.aviationstack.requests.get")
@@ -120,9 +136,9 @@ class TestAviationStack:
     @mock.patch("app.services.aviationstack.check_cache")
     @mock.patch("app.services.aviationstack.cache_response")
     def test_get_airport_info_uses_cache(
-        self, mock_cache_response, mock_check_cache, mock_get
+        self, mock_cache_response, mock_check_cache, mock_get, airport_response
     ):
-        mock_response = self.test_response
+        mock_response = airport_response
         mock_get.return_value.json.return_value = mock_response
         mock_check_cache.return_value = mock_response
 
@@ -140,10 +156,17 @@ class TestAviationStack:
     @mock.patch("app.services.aviationstack.get_cache_key")
     @mock.patch("app.services.aviationstack.check_cache")
     @mock.patch("app.services.aviationstack.cache_response")
+    @mock.patch("app.services.aviationstack.redis_client")
     def test_get_airport_info_caches_response(
-        self, mock_cache_response, mock_check_cache, mock_get_cache_key, mock_get
+        self,
+        mock_redis_client,
+        mock_cache_response,
+        mock_check_cache,
+        mock_get_cache_key,
+        mock_get,
+        airport_response,
     ):
-        mock_response = self.test_response
+        mock_response = airport_response
         mock_get.return_value.json.return_value = mock_response
         mock_check_cache.return_value = None
         mock_get_cache_key.return_value = "mock_cache_key"
@@ -151,7 +174,77 @@ class TestAviationStack:
         get_airport_info(airport_code="JFK")
         # Ensure cache was checked and response was cached
         mock_check_cache.assert_called_once()
-        mock_cache_response.assert_called_once_with("mock_cache_key", mock_response)
+        mock_cache_response.assert_called_once_with(
+            "mock_cache_key",
+            mock_response,
+            tags=[
+                "ns:airport",
+                "provider:aviationstack",
+                "airport:JFK",
+                "airport:KJFK",
+            ],
+        )
+        # The airport is indexed under its region for /airports/rank
+        mock_redis_client.sadd.assert_called_once_with("airports:region:US", "JFK")
+
+    @pytest.mark.it("get_airport_info caches not found results with a short expiry")
+    @mock.patch("app.services.aviationstack.requests.get")
+    @mock.patch("app.services.aviationstack.get_cache_key")
+    @mock.patch("app.services.aviationstack.check_cache")
+    @mock.patch("app.services.aviationstack.cache_response")
+    def test_get_airport_info_negative_cache(
+        self, mock_cache_response, mock_check_cache, mock_get_cache_key, mock_get
+    ):
+        mock_response = {"pagination": {"total": 0}, "data": []}
+        mock_get.return_value.json.return_value = mock_response
+        mock_check_cache.return_value = None
+        mock_get_cache_key.return_value = "mock_cache_key"
+
+        with pytest.raises(ValueError, match="Airport code XXX not found"):
+            get_airport_info(airport_code="XXX")
+        mock_cache_response.assert_called_once_with(
+            "mock_cache_key",
+            mock_response,
+            settings.NEGATIVE_CACHE_EXPIRE,
+            ["ns:airport", "provider:aviationstack", "airport:XXX"],
+        )
+
+    @pytest.mark.it("get_airport_info does not cache upstream error payloads")
+    @mock.patch("app.services.aviationstack.requests.get")
+    @mock.patch("app.services.aviationstack.check_cache")
+    @mock.patch("app.services.aviationstack.cache_response")
+    def test_get_airport_info_does_not_cache_errors(
+        self, mock_cache_response, mock_check_cache, mock_get
+    ):
+        mock_get.return_value.json.return_value = {
+            "error": {"code": "usage_limit_reached", "message": "Quota exceeded"}
+        }
+        mock_check_cache.return_value = None
+
+        with pytest.raises(
+            requests.exceptions.RequestException, match="Quota exceeded"
+        ):
+            get_airport_info(airport_code="JFK")
+        mock_cache_response.assert_not_called()
+
+    @pytest.mark.it("get_airport parses the airport once and keeps it in process")
+    @mock.patch("app.services.aviationstack.local_cache", LocalCache(10))
+    @mock.patch("app.services.aviationstack.get_airport_info")
+    def test_get_airport_local_cache(self, mock_get_airport_info, airport_response):
+        mock_get_airport_info.return_value = airport_response
+        airport = get_airport("jfk")
+        assert airport.icao == "KJFK"
+        assert airport.latitude == 40.642334
+        assert get_airport("JFK") is airport
+        mock_get_airport_info.assert_called_once()
+
+    @pytest.mark.it("classify_airport_response classifies upstream payloads")
+    def test_classify_airport_response(self, airport_response):
+        assert classify_airport_response(airport_response) == AIRPORT_FOUND
+        assert classify_airport_response({"data": []}) == AIRPORT_NOT_FOUND
+        assert classify_airport_response({"error": {}}) == UPSTREAM_ERROR
+        assert classify_airport_response({"pagination": {}}) == UPSTREAM_ERROR
+        assert classify_airport_response(None) == UPSTREAM_ERROR
 
 
 """
@@ -168,71 +261,15 @@ class TestWeatherStack:
         "location",
         "current",
     ]
-    test_response = {
-        "request": {
-            "type": "LatLon",
-            "query": "Lat 40.64 and Lon -73.79",
-            "language": "en",
-            "unit": "m",
-        },
-        "location": {
-            "name": "Valley Stream",
-            "country": "United States of America",
-            "region": "New York",
-            "lat": "40.664",
-            "lon": "-73.709",
-            "timezone_id": "America/New_York",
-            "localtime": "2025-07-23 11:40",
-            "localtime_epoch": 1753270800,
-            "utc_offset": "-4.0",
-        },
-        "current": {
-            "observation_time": "03:40 PM",
-            "temperature": 27,
-            "weather_code": 116,
-            "weather_icons": [
-                "https://cdn.worldweatheronline.com/images/wsymbols01_png_64/wsymbol_0002_sunny_intervals.png"
-            ],
-            "weather_descriptions": ["Partly cloudy"],
-            "astro": {
-                "sunrise": "05:44 AM",
-                "sunset": "08:19 PM",
-                "moonrise": "03:56 AM",
-                "moonset": "08:00 PM",
-                "moon_phase": "Waning Crescent",
-                "moon_illumination": 4,
-            },
-            "air_quality": {
-                "co": "308.95",
-                "no2": "10.73",
-                "o3": "133",
-                "so2": "5.18",
-                "pm2_5": "21.275",
-                "pm10": "24.235",
-                "us-epa-index": "2",
-                "gb-defra-index": "2",
-            },
-            "wind_speed": 12,
-            "wind_degree": 170,
-            "wind_dir": "S",
-            "pressure": 1025,
-            "precip": 0,
-            "humidity": 56,
-            "cloudcover": 75,
-            "feelslike": 28,
-            "uv_index": 7,
-            "visibility": 16,
-            "is_day": "yes",
-        },
-    }
-
-    @pytest.mark.it("get_current_weather_info returns a valid response")
+
+    @pytest.mark.it("fetch_current_weather_info returns a valid response")
+    @mock.patch("app.services.weatherstack.cache_response")
     @mock.patch("app.services.weatherstack.requests.get")
-    def test_get_current_weather_info_returns_info(self, mock_get):
-        mock_response = self.test_response
-        mock_get.return_value.json.return_value = mock_response
-        response = get_current_weather_info(self.test_lat, self.test_long)
-        assert response is not None
+    def test_fetch_current_weather_info_returns_info(
+        self, mock_get, mock_cache_response, weather_response
+    ):
+        mock_get.return_value.json.return_value = weather_response
+        response = fetch_current_weather_info(self.test_lat, self.test_long)
         assert isinstance(response, dict)
         assert len(response) == 3
         for key in self.weather_keys:
@@ -240,67 +277,556 @@ class TestWeatherStack:
             assert isinstance(response[key], dict)
             assert len(response[key]) > 0
 
-    @pytest.mark.it("get_current_weather_info raises ValueError for missing API key")
-    def test_get_current_weather_info_missing_api_key(self):
+    @pytest.mark.it("fetch_current_weather_info raises ValueError for missing API key")
+    @mock.patch("app.services.weatherstack.requests.get")
+    def test_fetch_current_weather_info_missing_api_key(self, mock_get):
         with pytest.raises(
             ValueError,
             match="WEATHERSTACK_API_KEY is not set in the environment variables",
         ):
-            get_current_weather_info(self.test_lat, self.test_long, ws_api_key=None)
-
-    @pytest.mark.it("get_current_weather_info raises ValueError for invalid lat/long")
-    def test_get_current_weather_info_missing_code(self):
-        with pytest.raises(ValueError, match="Latitude and longitude must be provided"):
-            get_current_weather_info()
+            fetch_current_weather_info(self.test_lat, self.test_long, ws_api_key=None)
+        mock_get.assert_not_called()
 
-    @pytest.mark.it("get_current_weather_info raises RequestException for API errors")
+    @pytest.mark.it("fetch_current_weather_info raises RequestException for API errors")
     @mock.patch("app.services.weatherstack.requests.get")
-    def test_get_current_weather_info_raises_api_error(self, mock_get):
+    def test_fetch_current_weather_info_raises_api_error(self, mock_get):
         mock_get.side_effect = requests.exceptions.RequestException("API error")
         with pytest.raises(requests.exceptions.RequestException, match="API error"):
-            get_current_weather_info("40.200000", "-73.60007")
+            fetch_current_weather_info("40.200000", "-73.60007")
 
-    @pytest.mark.it("get_current_weather_info raises Exception for unexpected errors")
+    @pytest.mark.it("fetch_current_weather_info caches the response with its tags")
     @mock.patch("app.services.weatherstack.requests.get")
-    def test_get_current_weather_info_raises_unexpected_error(self, mock_get):
-        mock_get.side_effect = Exception("Unexpected error")
-        with pytest.raises(Exception, match="Unexpected error"):
-            get_current_weather_info("40.200000", "-73.60007")
+    @mock.patch("app.services.weatherstack.get_cache_key")
+    @mock.patch("app.services.weatherstack.cache_response")
+    def test_fetch_current_weather_info_caches_response(
+        self, mock_cache_response, mock_get_cache_key, mock_get, weather_response
+    ):
+        mock_get.return_value.json.return_value = weather_response
+        mock_get_cache_key.return_value = "mock_cache_key"
 
-    @pytest.mark.it("get_current_weather_info uses cache when available")
+        fetch_current_weather_info(self.test_lat, self.test_long, tags=["airport:JFK"])
+        mock_cache_response.assert_called_once_with(
+            "mock_cache_key",
+            weather_response,
+            tags=["ns:weather", "provider:weatherstack", "airport:JFK"],
+        )
+
+    @pytest.mark.it("fetch_current_weather_info does not cache upstream error payloads")
     @mock.patch("app.services.weatherstack.requests.get")
-    @mock.patch("app.services.weatherstack.check_cache")
     @mock.patch("app.services.weatherstack.cache_response")
-    def test_get_current_weather_info_uses_cache(
-        self, mock_cache_response, mock_check_cache, mock_get
+    def test_fetch_current_weather_info_does_not_cache_errors(
+        self, mock_cache_response, mock_get
     ):
-        mock_response = self.test_response
-        mock_get.return_value.json.return_value = mock_response
-        mock_check_cache.return_value = mock_response
+        mock_get.return_value.json.return_value = {
+            "success": False,
+            "error": {"code": 104, "info": "Monthly usage limit reached"},
+        }
+        with pytest.raises(
+            requests.exceptions.RequestException, match="usage limit reached"
+        ):
+            fetch_current_weather_info(self.test_lat, self.test_long)
+        mock_cache_response.assert_not_called()
 
-        get_current_weather_info(self.test_lat, self.test_long)
+    @pytest.mark.it(
+        "WeatherStackProvider caches by request URL and parses observations"
+    )
+    @mock.patch("app.services.weatherstack.cache_response")
+    @mock.patch("app.services.weatherstack.requests.get")
+    def test_weatherstack_provider(
+        self, mock_get, mock_cache_response, weather_response
+    ):
+        mock_get.return_value.json.return_value = weather_response
+        provider = weather.WeatherStackProvider()
+        assert provider.cache_key(self.test_lat, self.test_long) == get_cache_key(
+            get_weather_url(self.test_lat, self.test_long)
+        )
 
-        # Ensure cache was checked and response was cached
-        mock_check_cache.assert_called_once()
-        mock_cache_response.assert_not_called()
+        observation = provider.parse(
+            provider.fetch(self.test_lat, self.test_long, tags=["airport:JFK"])
+        )
+        assert observation.temperature == 27
+        assert observation.observed_at == 1753270800
+        assert observation.description == "Partly cloudy"
+        assert mock_cache_response.call_args.kwargs["tags"][-1] == "airport:JFK"
 
-        # Ensure the API was not called since cache was hit
-        mock_get.assert_not_called()
 
-    @pytest.mark.it("get_current_weather_info caches response when not in cache")
-    @mock.patch("app.services.weatherstack.requests.get")
-    @mock.patch("app.services.weatherstack.get_cache_key")
-    @mock.patch("app.services.weatherstack.check_cache")
-    @mock.patch("app.services.weatherstack.cache_response")
-    def test_get_current_weather_info_caches_response(
-        self, mock_cache_response, mock_check_cache, mock_get_cache_key, mock_get
+"""
+Test suite for batched WeatherStack lookups
+"""
+
+
+@pytest.mark.describe("WeatherStack Batching Tests")
+class TestWeatherBatch:
+    locations = [("40.64", "-73.78"), ("51.47", "-0.45"), ("49.00", "2.55")]
+
+    @staticmethod
+    def weather(name):
+        return {"location": {"name": name}, "current": {"temperature": 20}}
+
+    @pytest.mark.it("fetch_weather_batch only fetches cache misses")
+    @mock.patch("app.services.weatherstack._session")
+    @mock.patch("app.services.weatherstack.check_cache_many")
+    @mock.patch("app.services.weatherstack.cache_many")
+    def test_fetch_weather_batch_skips_hits(
+        self, mock_cache_many, mock_check_cache_many, mock_session
     ):
-        mock_response = self.test_response
-        mock_get.return_value.json.return_value = mock_response
-        mock_check_cache.return_value = None
-        mock_get_cache_key.return_value = "mock_cache_key"
+        cached = self.weather("Cached")
+        mock_check_cache_many.return_value = [cached, None, None]
+        mock_session.get.return_value.json.return_value = self.weather("Fetched")
+
+        results = fetch_weather_batch(self.locations)
+
+        assert results[0] == cached
+        assert results[1] == results[2] == self.weather("Fetched")
+        assert mock_session.get.call_count == 2
+        assert len(mock_cache_many.call_args[0][0]) == 2
+
+    @pytest.mark.it("fetch_weather_batch splits a bulk response per location")
+    @mock.patch("app.services.weatherstack.settings.WEATHERSTACK_BULK_ENABLED", True)
+    @mock.patch("app.services.weatherstack._session")
+    @mock.patch("app.services.weatherstack.check_cache_many")
+    @mock.patch("app.services.weatherstack.cache_many")
+    def test_fetch_weather_batch_bulk(
+        self, mock_cache_many, mock_check_cache_many, mock_session
+    ):
+        mock_check_cache_many.return_value = [None, None, None]
+        mock_session.get.return_value.json.return_value = [
+            self.weather("New York"),
+            {"success": False, "error": {"info": "Unknown location"}},
+            self.weather("Paris"),
+        ]
 
-        get_current_weather_info(self.test_lat, self.test_long)
-        # Ensure cache was checked and response was cached
-        mock_check_cache.assert_called_once()
-        mock_cache_response.assert_called_once_with("mock_cache_key", mock_response)
+        results = fetch_weather_batch(self.locations)
+
+        mock_session.get.assert_called_once()
+        assert "40.64,-73.78;51.47,-0.45;49.00,2.55" in mock_session.get.call_args[0][0]
+        assert results[0]["location"]["name"] == "New York"
+        assert isinstance(results[1], requests.exceptions.RequestException)
+        assert results[2]["location"]["name"] == "Paris"
+        assert len(mock_cache_many.call_args[0][0]) == 2
+
+    @pytest.mark.it("WeatherBatcher coalesces lookups submitted in the same window")
+    @mock.patch("app.services.weatherstack.fetch_weather_batch")
+    def test_weather_batcher_coalesces(self, mock_fetch_weather_batch):
+        mock_fetch_weather_batch.side_effect = lambda locations, api_key: [
+            self.weather(f"{lat},{lon}") for lat, lon in locations
+        ]
+        batcher = WeatherBatcher(window_ms=1000, max_size=50)
+
+        futures = [batcher.submit(lat, lon, "key") for lat, lon in self.locations]
+        futures.append(batcher.submit("40.64", "-73.78", "key"))
+        batcher.flush()
+
+        mock_fetch_weather_batch.assert_called_once_with(self.locations, "key")
+        assert futures[0] is futures[3]
+        assert futures[1].result(timeout=1)["location"]["name"] == "51.47,-0.45"
+
+
+"""
+Test suite for the traffic counters service
+"""
+
+
+@pytest.mark.describe("Traffic Counters Service Tests")
+class TestTraffic:
+    now = 1753270800.0  # 2025-07-23 11:40 UTC
+    window = get_window(now)
+
+    @pytest.mark.it("get_traffic_counts reads the current window counters")
+    @mock.patch("app.services.traffic.refresh_traffic_counts_in_background")
+    @mock.patch("app.services.traffic.redis_client")
+    def test_get_traffic_counts(self, mock_client, mock_refresh):
+        mock_client.hmget.return_value = [str(self.now - 60), "6:8:2:14", "5:5:4:10"]
+        mock_client.hmget.return_value += [None, None]
+
+        counts = get_traffic_counts("JFK", now=self.now)
+
+        assert counts == {"arrivals": 6, "departures": 8, "delay_ratio": 0.25}
+        mock_client.hmget.assert_called_once_with(
+            "traffic:JFK", ["updated"] + [str(self.window - i) for i in range(4)]
+        )
+        mock_refresh.assert_not_called()
+
+    @pytest.mark.it("get_traffic_counts schedules a refresh when counters are missing")
+    @mock.patch("app.services.traffic.refresh_traffic_counts_in_background")
+    @mock.patch("app.services.traffic.redis_client")
+    def test_get_traffic_counts_missing(self, mock_client, mock_refresh):
+        mock_client.hmget.return_value = [None] * 5
+        assert get_traffic_counts("JFK", now=self.now) is None
+        mock_refresh.assert_called_once_with("JFK")
+
+    @pytest.mark.it("refreshes are queued once per airport across workers")
+    @mock.patch("app.services.traffic._executor")
+    @mock.patch("app.services.traffic.redis_client")
+    def test_refresh_in_background(self, mock_client, mock_executor):
+        mock_client.set.return_value = True
+        with mock.patch.object(settings, "TRAFFIC_REFRESH_INTERVAL", 900):
+            assert refresh_traffic_counts_in_background("JFK") is True
+        assert mock_client.set.call_args.args[0] == "lock:traffic:JFK"
+        assert mock_client.set.call_args.kwargs == {"nx": True, "ex": 900}
+        mock_executor.submit.assert_called_once()
+        # Another worker holds the lock
+        mock_client.set.return_value = None
+        assert refresh_traffic_counts_in_background("JFK") is False
+        assert mock_executor.submit.call_count == 1
+
+    @pytest.mark.it("refresh_traffic_counts aggregates flights per 15 minute window")
+    @mock.patch("app.services.traffic.requests.get")
+    @mock.patch("app.services.traffic.redis_client")
+    def test_refresh_traffic_counts(self, mock_client, mock_get):
+        arrivals = {
+            "pagination": {"total": 2},
+            "data": [
+                {"arrival": {"scheduled": "2025-07-23T11:35:00+00:00", "delay": 30}},
+                {"arrival": {"scheduled": "2025-07-23T11:50:00+00:00", "delay": None}},
+            ],
+        }
+        departures = {
+            "pagination": {"total": 1},
+            "data": [
+                {"departure": {"scheduled": "2025-07-23T11:40:00+00:00", "delay": 5}}
+            ],
+        }
+        mock_get.return_value.json.side_effect = [arrivals, departures]
+
+        counters = refresh_traffic_counts("JFK")
+
+        assert counters == {self.window: [1, 1, 1, 2], self.window + 1: [1, 0, 0, 1]}
+        assert "arr_iata=JFK" in mock_get.call_args_list[0][0][0]
+        assert "dep_iata=JFK" in mock_get.call_args_list[1][0][0]
+        mapping = mock_client.pipeline.return_value.hset.call_args[1]["mapping"]
+        assert mapping[str(self.window)] == "1:1:1:2"
+
+
+"""
+Test suite for the network summary service
+"""
+
+
+@pytest.mark.describe("Network Summary Service Tests")
+class TestSummary:
+    airport = {"country_name": "United States", "timezone": "America/New_York"}
+
+    @pytest.mark.it("update_summary moves the airport to its new rating band")
+    @mock.patch("app.services.summary.time.time", return_value=1753270800)
+    @mock.patch("app.services.summary._update_summary")
+    def test_update_summary(self, mock_script, mock_time):
+        mock_script.return_value = 1
+        assert update_summary("KJFK", self.airport, 3) is True
+        mock_script.assert_called_once_with(
+            keys=[
+                "summary:{network}",
+                "summary:{network}:airports",
+                "summary:{network}:seen",
+            ],
+            args=[
+                "KJFK",
+                1753270800,
+                "3",
+                "country_name:United States",
+                "timezone:America/New_York",
+            ],
+        )
+        mock_script.return_value = 0
+        assert update_summary("KJFK", None, None) is False
+        assert mock_script.call_args.kwargs["args"] == ["KJFK", 1753270800, "unknown"]
+
+    @pytest.mark.it("airports are counted once whichever code they are looked up by")
+    @mock.patch("app.services.lookup.update_weather_summary")
+    @mock.patch("app.services.lookup.redis_client")
+    def test_summary_canonical_code(
+        self, mock_client, mock_update_weather_summary, airport_response
+    ):
+        airport = Airport.from_response(airport_response)
+        weather_observation = WeatherObservation(
+            city="New York",
+            observation_time="03:51 PM",
+            observed_at=1753270800,
+            temperature=28,
+            wind_speed=22.2,
+            wind_degree=180,
+            wind_dir="S",
+            pressure=1025,
+            precip=0.0,
+            humidity=55,
+            cloudcover=25.0,
+            visibility=16.1,
+            description="Partly cloudy",
+            icon=None,
+        )
+        store_airport_weather("JFK", airport, weather_observation)
+        store_airport_weather("KJFK", airport, weather_observation)
+        store_airport_weather("JFK", airport, None)
+        assert mock_update_weather_summary.call_count == 2
+        for call in mock_update_weather_summary.call_args_list:
+            assert call.args == ("KJFK", weather_observation, self.airport)
+
+    @pytest.mark.it("expire_summary drops airports not refreshed for SUMMARY_MAX_AGE")
+    @mock.patch("app.services.summary.time.time", return_value=1753270800)
+    @mock.patch("app.services.summary._expire_summary", return_value=2)
+    def test_expire_summary(self, mock_script, mock_time):
+        with mock.patch.object(settings, "SUMMARY_MAX_AGE", 3600):
+            assert expire_summary() == 2
+        assert mock_script.call_args.kwargs["args"] == [1753267200, 1000]
+
+    @pytest.mark.it("get_summary returns counts per band and group")
+    @mock.patch("app.services.summary._expire_summary", return_value=0)
+    @mock.patch("app.services.summary.redis_client")
+    def test_get_summary(self, mock_client, mock_expire_script):
+        mock_client.hgetall.return_value = {
+            "weather_rating:3": "2",
+            "weather_rating:5": "1",
+            "weather_rating:7": "0",
+            "country_name:United States:3": "2",
+            "country_name:United Kingdom:5": "1",
+            "timezone:America/New_York:3": "2",
+        }
+        assert get_summary() == {"airports": 3, "weather_rating": {"3": 2, "5": 1}}
+        assert get_summary("country_name")["country_name"] == {
+            "United States": {"3": 2},
+            "United Kingdom": {"5": 1},
+        }
+        with pytest.raises(ValueError, match="group_by must be one of"):
+            get_summary("city")
+
+
+"""
+Test suite for upstream admission control
+"""
+
+
+@pytest.mark.describe("Admission Control Tests")
+class TestAdmission:
+    @pytest.mark.it("admit runs calls up to the concurrency limit at once")
+    def test_admit_within_limit(self):
+        controller = AdmissionController("test", 2, 0, 0.1)
+        with controller.admit():
+            with controller.admit():
+                assert controller.active == 2
+        assert controller.active == 0
+
+    @pytest.mark.it("admit rejects callers when the queue is full")
+    def test_admit_queue_full(self):
+        controller = AdmissionController("test", 1, 0, 0.1)
+        with controller.admit():
+            with pytest.raises(Overloaded) as exc_info:
+                with controller.admit():
+                    pass
+        assert exc_info.value.retry_after >= 1
+        assert controller.rejected == 1
+
+    @pytest.mark.it("admit rejects queued callers after their deadline")
+    def test_admit_deadline(self):
+        controller = AdmissionController("test", 1, 1, 0.05)
+        with controller.admit():
+            with pytest.raises(Overloaded):
+                with controller.admit():
+                    pass
+        assert controller.waiting == 0
+
+    @pytest.mark.it("admit lets a queued caller in when a slot frees up")
+    def test_admit_queued(self):
+        controller = AdmissionController("test", 1, 1, 1)
+        release = threading.Event()
+
+        def hold_slot():
+            with controller.admit():
+                release.wait()
+
+        holder = threading.Thread(target=hold_slot)
+        holder.start()
+        while controller.active == 0:
+            time.sleep(0.001)
+        threading.Timer(0.05, release.set).start()
+        with controller.admit():
+            assert controller.active == 1
+        holder.join()
+
+    @pytest.mark.it("admit waits in the queue no longer than the request's deadline")
+    def test_admit_request_deadline(self):
+        controller = AdmissionController("test", 1, 1, 5)
+        with mock.patch.dict(
+            "app.services.admission.controllers", {"test": controller}
+        ):
+            with deadline_after(-1):
+                with pytest.raises(DeadlineExceeded):
+                    with admit("test"):
+                        pass
+            with controller.admit(), deadline_after(0.05):
+                started = time.monotonic()
+                with pytest.raises(Overloaded):
+                    with admit("test"):
+                        pass
+                assert time.monotonic() - started < 1
+
+    @pytest.mark.it("cache hits bypass admission control")
+    @mock.patch("app.services.aviationstack.check_cache")
+    def test_cache_hits_bypass(self, mock_check_cache, airport_response):
+        mock_check_cache.return_value = airport_response
+        with mock.patch("app.services.aviationstack.admit") as mock_admit:
+            get_airport_info(airport_code="JFK")
+            mock_admit.assert_not_called()
+
+
+"""
+Test suite for the weather providers
+"""
+
+
+class FakeProvider(weather.WeatherProvider):
+    def __init__(self, name, delay=0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.locations = []
+
+    def cache_key(self, latitude, longtitude, icao=None):
+        return f"{self.name}:{latitude},{longtitude}"
+
+    def parse(self, weather_info):
+        return weather_info
+
+    def fetch(self, latitude, longtitude, tags=None):
+        self.calls += 1
+        self.locations.append((latitude, longtitude))
+        time.sleep(self.delay)
+        if self.error:
+            raise requests.exceptions.RequestException(self.error)
+        return {"provider": self.name}
+
+
+@pytest.mark.describe("Weather Provider Tests")
+class TestWeatherProviders:
+    @pytest.fixture
+    def providers(self):
+        """Replace the configured providers for the duration of a test."""
+        patch = mock.patch.multiple(weather, providers=[], health={})
+        patch.start()
+
+        def use(*providers):
+            weather.providers[:] = providers
+            weather.health.update({p.name: weather.ProviderHealth() for p in providers})
+            return providers
+
+        yield use
+        patch.stop()
+
+    @pytest.mark.it("providers missing a method cannot be created")
+    def test_incomplete_provider(self):
+        class Incomplete(weather.WeatherProvider):
+            name = "incomplete"
+
+            def cache_key(self, latitude, longtitude, icao=None):
+                return None
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    @pytest.mark.it("load_providers rejects unknown providers")
+    def test_load_providers(self):
+        assert [p.name for p in weather.load_providers("openmeteo, weatherstack")] == [
+            "openmeteo",
+            "weatherstack",
+        ]
+        with pytest.raises(ValueError):
+            weather.load_providers("unknown")
+
+    @pytest.mark.it("the first cached provider response is used")
+    def test_parse_cached_weather(self, providers):
+        a, b, metar = providers(
+            FakeProvider("a"), FakeProvider("b"), weather.MetarProvider()
+        )
+        keys = weather.weather_cache_keys(1, 2)
+        assert keys == [(a, "a:1,2"), (b, "b:1,2")]
+        assert weather.parse_cached_weather(keys, [None, {"provider": "b"}]) == {
+            "provider": "b"
+        }
+        assert weather.parse_cached_weather(keys, [None, None]) is None
+        assert weather.weather_cache_keys(1, 2, "kjfk")[2] == (metar, "metar:KJFK")
+
+    @pytest.mark.it(
+        "weather_location snaps locations to their grid cell, except listed airports"
+    )
+    def test_weather_location(self):
+        with mock.patch.multiple(
+            settings, WEATHER_GRID_DEGREES=0.5, WEATHER_EXACT_AIRPORTS="kjfk, EGLL"
+        ):
+            assert weather.weather_location(51.4706, -0.4619) == (51.25, -0.25)
+            assert weather.weather_location("51.5053", "0.0553") == (51.75, 0.25)
+            assert weather.weather_location(40.6413, -73.7781, "KJFK") == (
+                40.6413,
+                -73.7781,
+            )
+            assert weather.weather_location(40.7769, -73.874, "KLGA") == (40.75, -73.75)
+            assert weather.weather_location(
+                *weather.weather_location(-33.9, 151.2)
+            ) == (-33.75, 151.25)
+        with mock.patch.object(settings, "WEATHER_GRID_DEGREES", 0):
+            assert weather.weather_location(51.4706, -0.4619) == (51.4706, -0.4619)
+
+    @pytest.mark.it("co-located airports share one cache key and one upstream fetch")
+    def test_grid_shared_fetch(self, providers):
+        (provider,) = providers(FakeProvider("a"))
+        with mock.patch.object(settings, "WEATHER_GRID_DEGREES", 1), mock.patch.object(
+            weather, "check_cache_many", return_value=[None]
+        ) as mock_check_cache_many, mock.patch.object(
+            weather, "local_cache", LocalCache(10)
+        ):
+            assert weather.weather_cache_keys(
+                40.64, -73.78
+            ) == weather.weather_cache_keys(40.78, -73.87)
+            weather.get_current_weather(40.64, -73.78, icao="KJFK")
+        mock_check_cache_many.assert_called_once_with(["a:40.5,-73.5"])
+        assert provider.calls == 1
+        assert provider.locations == [(40.5, -73.5)]
+
+    @pytest.mark.it(
+        "fetches stop at the request's deadline without marking providers unhealthy"
+    )
+    def test_fetch_deadline(self, providers):
+        providers(FakeProvider("slow", delay=0.5), FakeProvider("backup"))
+        with mock.patch.object(
+            settings, "WEATHER_HEDGE_ENABLED", False
+        ), deadline_after(0.05):
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                weather.fetch_weather(1, 2)
+            assert time.monotonic() - started < 0.4
+        assert weather.health["slow"].failures == 0
+
+    @pytest.mark.it("fetches are routed to the fastest healthy provider")
+    def test_route_providers(self, providers):
+        slow, fast, broken = providers(
+            FakeProvider("slow"), FakeProvider("fast"), FakeProvider("broken")
+        )
+        for _ in range(weather.MIN_SAMPLES):
+            weather.health["slow"].record(0.5)
+            weather.health["fast"].record(0.1)
+            weather.health["broken"].record(0.01)
+        for _ in range(weather.FAILURE_THRESHOLD):
+            weather.health["broken"].record_failure()
+        assert weather.route_providers() == [fast, slow, broken]
+
+    @pytest.mark.it("fetch_weather fails over to the next provider")
+    def test_fetch_weather_failover(self, providers):
+        failing, backup = providers(FakeProvider("a", error="down"), FakeProvider("b"))
+        with mock.patch.object(settings, "WEATHER_HEDGE_ENABLED", False):
+            assert weather.fetch_weather(1, 2) == {"provider": "b"}
+        assert weather.health["a"].failures == 1
+        with pytest.raises(requests.exceptions.RequestException):
+            backup.error = "down"
+            weather.fetch_weather(1, 2)
+
+    @pytest.mark.it("fetch_weather hedges a slow provider after its p95")
+    def test_fetch_weather_hedged(self, providers):
+        slow, fast = providers(FakeProvider("slow", delay=0.5), FakeProvider("fast"))
+        for _ in range(weather.MIN_SAMPLES):
+            weather.health["slow"].record(0.05)
+        with mock.patch.object(settings, "WEATHER_HEDGE_ENABLED", True):
+            started = time.perf_counter()
+            assert weather.fetch_weather(1, 2) == {"provider": "fast"}
+            assert time.perf_counter() - started < 0.4
+        with mock.patch.object(settings, "WEATHER_HEDGE_ENABLED", False):
+            assert weather.fetch_weather(1, 2) == {"provider": "slow"}
+        assert fast.calls == 1
@@ -0,0 +1,160 @@
+import pytest
+import redis
+from app.services.sharding import (
+    HashRing,
+    Shard,
+    ShardedRedis,
+    get_hash_tag,
+    parse_nodes,
+)
+
+"""
+Test suite for the sharded Redis client, run against in-memory Redis stand-ins
+"""
+
+
+class FakeNode:
+    """In-memory stand-in for one Redis node, recording the commands it runs.
+
+    Replicas share their primary's data, as if replication were instant.
+    """
+
+    def __init__(self, data=None, down=False):
+        self.data = {} if data is None else data
+        self.down = down
+        self.calls = []
+
+    def _record(self, name):
+        if self.down:
+            raise redis.ConnectionError("node down")
+        self.calls.append(name)
+
+    def get(self, key):
+        self._record("get")
+        return self.data.get(key)
+
+    def setex(self, key, expiry, value):
+        self._record("setex")
+        self.data[key] = value
+        return True
+
+    def mget(self, keys):
+        self._record("mget")
+        return [self.data.get(key) for key in keys]
+
+    def unlink(self, *keys):
+        self._record("unlink")
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, node):
+        self.node = node
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        self.node._record("execute")
+        return [getattr(self.node, n)(*a, **k) for n, a, k in self.commands]
+
+
+@pytest.fixture
+def nodes():
+    primaries = [FakeNode() for _ in range(3)]
+    replicas = [FakeNode(primary.data) for primary in primaries]
+    return primaries, replicas
+
+
+@pytest.fixture
+def client(nodes):
+    primaries, replicas = nodes
+    return ShardedRedis(
+        [
+            Shard(f"redis-{i}:6379", primary, [replica])
+            for i, (primary, replica) in enumerate(zip(primaries, replicas))
+        ]
+    )
+
+
+@pytest.mark.describe("Hash Ring Tests")
+class TestHashRing:
+    @pytest.mark.it("parse_nodes reads shards with their replicas")
+    def test_parse_nodes(self):
+        assert parse_nodes("a:6379|a-replica:6380, b:6379") == [
+            (("a", 6379), [("a-replica", 6380)]),
+            (("b", 6379), []),
+        ]
+        with pytest.raises(ValueError):
+            parse_nodes("a")
+
+    @pytest.mark.it("adding a shard only moves keys to the new shard")
+    def test_ring_add_shard(self):
+        keys = [f"key{i}" for i in range(2000)]
+        before = HashRing(["a", "b", "c", "d"])
+        after = HashRing(["a", "b", "c", "d", "e"])
+        moved = [key for key in keys if before.get(key) != after.get(key)]
+        assert all(after.get(key) == "e" for key in moved)
+        assert len(moved) < len(keys) * 0.3
+
+    @pytest.mark.it("keys with the same hash tag share a shard")
+    def test_ring_hash_tag(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        assert get_hash_tag("summary:{network}:airports") == "network"
+        assert get_hash_tag("plain{}") == "plain{}"
+        assert ring.get("summary:{network}") == ring.get("summary:{network}:airports")
+
+
+@pytest.mark.describe("Sharded Redis Tests")
+class TestShardedRedis:
+    @pytest.mark.it("writes go to primaries and reads to replicas")
+    def test_read_write_routing(self, client, nodes):
+        primaries, replicas = nodes
+        client.setex("key", 60, "value")
+        assert client.get("key") == "value"
+        assert sum(p.calls == ["setex"] for p in primaries) == 1
+        assert sum(r.calls == ["get"] for r in replicas) == 1
+        assert not any("get" in p.calls for p in primaries)
+
+    @pytest.mark.it("reads fall back to the primary when a replica is down")
+    def test_replica_fallback(self, client, nodes):
+        primaries, replicas = nodes
+        for replica in replicas:
+            replica.down = True
+        client.setex("key", 60, "value")
+        assert client.get("key") == "value"
+
+    @pytest.mark.it("mget sends one MGET per shard and keeps the key order")
+    def test_mget(self, client, nodes):
+        _, replicas = nodes
+        keys = [f"key{i}" for i in range(30)]
+        for key in keys[::2]:
+            client.setex(key, 60, key.upper())
+        assert client.mget(keys) == [
+            key.upper() if i % 2 == 0 else None for i, key in enumerate(keys)
+        ]
+        assert all(replica.calls == ["mget"] for replica in replicas)
+
+    @pytest.mark.it("pipelines run one pipeline per shard and keep the result order")
+    def test_pipeline(self, client, nodes):
+        primaries, _ = nodes
+        keys = [f"key{i}" for i in range(30)]
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.setex(key, 60, "value")
+        pipeline.unlink(*keys[:10])
+        pipeline.get(keys[-1])
+        assert pipeline.execute() == [True] * 30 + [10, "value"]
+        assert all(primary.calls.count("execute") == 1 for primary in primaries)
+        assert client.mget(keys[:10]) == [None] * 10
+
+    @pytest.mark.it("scripts with keys on several shards are rejected")
+    def test_script_cross_shard(self, client):
+        script = client.register_script("return 1")
+        keys = [f"key{i}" for i in range(10)]
+        with pytest.raises(redis.RedisError, match="one shard"):
+            script(keys=keys, args=[])
@@ -0,0 +1,110 @@
+import multiprocessing
+import struct
+import time
+import pytest
+from unittest import mock
+from app.services.cache import check_cache_many
+from app.services.shared_cache import HEADER, SharedCache
+
+"""
+Test suite for the cache shared by the workers of a host
+"""
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "shared-cache")
+
+
+@pytest.fixture
+def cache(path):
+    cache = SharedCache(path, slots=64, slot_size=256)
+    yield cache
+    cache.close()
+
+
+def write_entry(path, key, value):
+    cache = SharedCache(path, slots=64, slot_size=256)
+    cache.set_many({key: value}, 60)
+    cache.close()
+
+
+@pytest.mark.describe("Shared cache tests")
+class TestSharedCache:
+    @pytest.mark.it("Entries written by one process are read by another")
+    def test_shared_between_processes(self, cache, path):
+        process = multiprocessing.get_context("fork").Process(
+            target=write_entry, args=(path, "airport:JFK", '{"iata": "JFK"}')
+        )
+        process.start()
+        process.join()
+        assert cache.get("airport:JFK") == '{"iata": "JFK"}'
+        assert cache.get_many(["airport:JFK", "airport:LHR"]) == [
+            '{"iata": "JFK"}',
+            None,
+        ]
+
+    @pytest.mark.it("Entries are replaced, deleted and expired")
+    def test_replace_delete_expire(self, cache):
+        cache.set_many({"a": "1", "b": "2"}, 60)
+        cache.set_many({"a": "3"}, 60)
+        assert cache.get("a") == "3"
+        cache.delete("a")
+        assert cache.get("a") is None
+        assert cache.get("b") == "2"
+        with mock.patch(
+            "app.services.shared_cache.time.time", return_value=time.time() + 61
+        ):
+            assert cache.get("b") is None
+
+    @pytest.mark.it("clear expires every entry, in every process")
+    def test_clear(self, cache, path):
+        cache.set_many({"a": "1"}, 60)
+        other = SharedCache(path, slots=64, slot_size=256)
+        other.clear()
+        assert cache.get("a") is None
+        cache.set_many({"a": "2"}, 60)
+        assert other.get("a") == "2"
+        other.close()
+
+    @pytest.mark.it("Entries larger than a slot are not shared")
+    def test_oversized(self, cache):
+        cache.set_many({"big": "x" * 300}, 60)
+        assert cache.get("big") is None
+
+    @pytest.mark.it("A full table replaces the entries expiring first")
+    def test_eviction(self, path):
+        cache = SharedCache(path, slots=4, slot_size=128)
+        cache.set_many({f"k{i}": str(i) for i in range(4)}, 60)
+        cache.set_many({"soon": "s"}, 1)
+        cache.set_many({"later": "l"}, 60)
+        assert cache.get("later") == "l"
+        assert cache.get("soon") is None
+        assert sum(cache.get(f"k{i}") is not None for i in range(4)) == 3
+        cache.close()
+
+    @pytest.mark.it("Reads racing a write miss instead of returning a torn entry")
+    def test_read_during_write(self, cache):
+        cache.set_many({"a": "1"}, 60)
+        for offset in range(HEADER.size, HEADER.size + 64 * 256, 256):
+            sequence = struct.unpack_from("<I", cache._map, offset)[0]
+            if sequence:
+                struct.pack_into("<I", cache._map, offset, sequence + 1)
+        assert cache.get("a") is None
+
+    @pytest.mark.it(
+        "check_cache_many reads only the keys missing from the shared cache"
+    )
+    def test_check_cache_many(self, cache):
+        cache.set_many({"a": '{"value": 1}'}, 60)
+        with mock.patch("app.services.cache.shared_cache", cache), mock.patch(
+            "app.services.cache.cache_backend"
+        ) as backend:
+            backend.get_many.return_value = ['{"value": 2}', None]
+            assert check_cache_many(["a", "b", "c"]) == [
+                {"value": 1},
+                {"value": 2},
+                None,
+            ]
+            backend.get_many.assert_called_once_with(["b", "c"])
+        assert cache.get("b") == '{"value": 2}'
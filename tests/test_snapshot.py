@@ -0,0 +1,147 @@
+import struct
+import threading
+import pytest
+from unittest import mock
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.models import Airport, WeatherObservation
+from app.main import app
+from app.services.cache import LocalCache, local_cache
+from app.services.snapshot import HEADER, restore_snapshot, save_snapshot
+
+"""
+Test suite for the local cache snapshots
+"""
+
+AIRPORT = Airport(
+    name="John F Kennedy International",
+    iata="JFK",
+    icao="KJFK",
+    country="United States",
+    country_iso2="US",
+    timezone="America/New_York",
+    gmt="-5",
+    latitude=40.642334,
+    longitude=-73.78817,
+)
+WEATHER = WeatherObservation(
+    city="New York",
+    observation_time="03:51 PM",
+    observed_at=1719157860,
+    temperature=28,
+    wind_speed=22.2,
+    wind_degree=180,
+    wind_dir="S",
+    pressure=1025,
+    precip=0.0,
+    humidity=55,
+    cloudcover=25.0,
+    visibility=16.1,
+    description="Partly cloudy",
+    icon=None,
+)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "local-cache.snap")
+
+
+@pytest.mark.describe("Local cache snapshot tests")
+class TestSnapshot:
+    @pytest.mark.it(
+        "restore_snapshot restores the airports and weather saved, with their expiry and order"
+    )
+    def test_round_trip(self, path):
+        cache = LocalCache(max_size=10)
+        cache.set("airport:JFK", AIRPORT, 3600)
+        cache.set("weather:40.64,-73.79", WEATHER, 60)
+        cache.set("other", "not a model", 60)
+
+        assert save_snapshot(cache, path) == 2
+
+        restored = LocalCache(max_size=10)
+        assert restore_snapshot(restored, path) == 2
+        assert restored.get("airport:JFK") == AIRPORT
+        assert restored.get("weather:40.64,-73.79") == WEATHER
+        assert restored.get("other") is None
+        (_, airport_expiry, _), (_, weather_expiry, _) = restored.items()
+        assert airport_expiry == pytest.approx(cache.items()[0][1], abs=0.01)
+        assert weather_expiry == pytest.approx(cache.items()[1][1], abs=0.01)
+
+    @pytest.mark.it("restore_snapshot skips entries that expired since the snapshot")
+    def test_skips_expired(self, path):
+        cache = LocalCache(max_size=10)
+        cache.set("airport:JFK", AIRPORT, 3600)
+        cache.set("weather:40.64,-73.79", WEATHER, 60)
+        save_snapshot(cache, path)
+
+        restored = LocalCache(max_size=10)
+        with mock.patch(
+            "app.services.snapshot.time.time", return_value=cache.items()[1][1] + 1
+        ):
+            assert restore_snapshot(restored, path) == 1
+        assert [key for key, _, _ in restored.items()] == ["airport:JFK"]
+
+    @pytest.mark.it("restore_snapshot ignores missing, corrupt and other version files")
+    def test_ignores_invalid_files(self, path):
+        cache = LocalCache(max_size=10)
+        assert restore_snapshot(cache, path) == 0
+
+        with open(path, "wb") as file:
+            file.write(b"not a snapshot")
+        assert restore_snapshot(cache, path) == 0
+
+        source = LocalCache(max_size=10)
+        source.set("airport:JFK", AIRPORT, 3600)
+        save_snapshot(source, path)
+        with open(path, "r+b") as file:
+            file.seek(4)
+            file.write(struct.pack("<H", 99))
+        assert restore_snapshot(cache, path) == 0
+
+        save_snapshot(source, path)
+        with open(path, "r+b") as file:
+            file.truncate(HEADER.size + 4)
+        assert restore_snapshot(cache, path) == 0
+        assert len(cache) == 0
+
+    @pytest.mark.it(
+        "entries restored at startup survive the invalidation listener subscribing"
+    )
+    def test_restore_at_startup(self, path):
+        source = LocalCache(max_size=10)
+        source.set("airport:JFK", AIRPORT, 3600)
+        save_snapshot(source, path)
+        restored = threading.Event()
+        subscribed = threading.Event()
+
+        def restore():
+            count = restore_snapshot()
+            restored.set()
+            return count
+
+        def listen():
+            # Subscribed, then waits for messages that never come
+            subscribed.set()
+            threading.Event().wait()
+            yield
+
+        redis_client = mock.MagicMock()
+        # The subscription completes after the restore, as it usually does
+        redis_client.pubsub.return_value.subscribe.side_effect = (
+            lambda channel: restored.wait(5)
+        )
+        redis_client.pubsub.return_value.listen.side_effect = listen
+        local_cache.clear()
+        with mock.patch.multiple(
+            settings, LOCAL_SNAPSHOT_PATH=path, CACHE_BACKEND="redis"
+        ), mock.patch("app.services.cache.redis_client", redis_client), mock.patch(
+            "app.services.cache._listener", None
+        ), mock.patch(
+            "app.main.restore_snapshot", side_effect=restore
+        ):
+            with TestClient(app):
+                assert subscribed.wait(timeout=5)
+                assert local_cache.get("airport:JFK") == AIRPORT
+        local_cache.clear()
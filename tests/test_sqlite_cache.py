@@ -0,0 +1,85 @@
+import time
+import pytest
+from unittest import mock
+from app.services.cache import cache_many, check_cache_many
+from app.services.sqlite_cache import SQLiteCache
+
+"""
+Test suite for the SQLite cache backend
+"""
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+@pytest.fixture
+def cache(path):
+    cache = SQLiteCache(path, flush_interval=60, sweep_interval=3600)
+    yield cache
+    cache.close()
+
+
+@pytest.mark.describe("SQLite cache backend tests")
+class TestSQLiteCache:
+    @pytest.mark.it(
+        "Queued writes are read at once and shared with other processes once flushed"
+    )
+    def test_read_queued_and_flushed(self, cache, path):
+        cache.set_many({"a": "1", "b": "2"}, 60)
+        assert cache.get_many(["a", "b", "c"]) == ["1", "2", None]
+
+        other = SQLiteCache(path, flush_interval=60)
+        assert other.get("a") is None
+        cache.flush()
+        assert other.get_many(["b", "a"]) == ["2", "1"]
+        other.close()
+
+    @pytest.mark.it("get_many reads more keys than fit in one query")
+    def test_get_many_batches(self, cache):
+        cache.set_many({f"k{i}": str(i) for i in range(1200)}, 60)
+        cache.flush()
+        assert cache.get_many([f"k{i}" for i in range(1200)]) == [
+            str(i) for i in range(1200)
+        ]
+
+    @pytest.mark.it("Expired entries are not returned and are deleted by sweep")
+    def test_expiry(self, cache):
+        cache.set_many({"a": "1"}, 10)
+        cache.set_many({"b": "2"}, 100)
+        cache.flush()
+        assert cache.ttl("a") in (9, 10)
+        with mock.patch(
+            "app.services.sqlite_cache.time.time", return_value=time.time() + 50
+        ):
+            assert cache.get_many(["a", "b"]) == [None, "2"]
+            assert cache.ttl("a") == -2
+            assert cache.sweep() == 1
+        assert cache.get("b") == "2"
+
+    @pytest.mark.it("delete removes entries, queued or flushed")
+    def test_delete(self, cache):
+        cache.set_many({"a": "1", "b": "2"}, 60)
+        cache.flush()
+        cache.set_many({"c": "3"}, 60)
+        assert cache.delete("a", "c", "missing") == 2
+        assert cache.get_many(["a", "b", "c"]) == [None, "2", None]
+        cache.flush()
+        assert cache.get_many(["a", "b", "c"]) == [None, "2", None]
+        assert cache.ttl("a") == -2
+
+    @pytest.mark.it("The writer thread commits queued writes when closed")
+    def test_close_flushes(self, path):
+        cache = SQLiteCache(path, flush_interval=60)
+        cache.set_many({"a": "1"}, 60)
+        cache.close()
+        other = SQLiteCache(path)
+        assert other.get("a") == "1"
+        other.close()
+
+    @pytest.mark.it("check_cache_many and cache_many go through the selected backend")
+    def test_cache_functions(self, cache):
+        with mock.patch("app.services.cache.cache_backend", cache):
+            cache_many({"a": {"value": 1}}, 60, tags=["ns:weather"])
+            assert check_cache_many(["a", "b"]) == [{"value": 1}, None]
@@ -0,0 +1,128 @@
+import pytest
+from dataclasses import asdict
+from unittest import mock
+from app.core.models import WeatherObservation
+from app.services.tiles import (
+    LAYERS,
+    NO_DATA,
+    tile_bounds,
+    tile_position,
+    index_observation,
+    render_tile,
+    encode_tile,
+    get_tile,
+)
+
+"""
+Test suite for the weather risk tiles
+"""
+
+
+def observation(cloudcover=0, precip=0.0, wind_speed=0, visibility=10):
+    return WeatherObservation(
+        city=None,
+        observation_time="03:51 PM",
+        observed_at=1719157860,
+        temperature=20,
+        wind_speed=wind_speed,
+        wind_degree=180,
+        wind_dir="S",
+        pressure=1013,
+        precip=precip,
+        humidity=50,
+        cloudcover=cloudcover,
+        visibility=visibility,
+        description=None,
+        icon=None,
+    )
+
+
+JFK = (40.642334, -73.78817)
+
+
+@pytest.mark.describe("Weather risk tile tests")
+class TestTiles:
+    @pytest.mark.it("tile_position and tile_bounds agree on the tile of a location")
+    def test_tile_geometry(self):
+        assert tile_bounds(0, 0, 0)[0] == -180
+        assert tile_bounds(0, 0, 0)[3] == pytest.approx(85.0511, abs=1e-4)
+        x, y = tile_position(*JFK, 10)
+        west, south, east, north = tile_bounds(10, int(x), int(y))
+        assert west <= JFK[1] < east
+        assert south < JFK[0] <= north
+
+    @pytest.mark.it(
+        "index_observation indexes the entry and drops its tiles at every zoom"
+    )
+    def test_index_observation(self):
+        pipeline = mock.Mock()
+        with mock.patch("app.services.tiles.settings.TILE_MAX_ZOOM", 3):
+            index_observation(pipeline, "weather:airport:JFK", *JFK)
+        pipeline.geoadd.assert_called_once_with(
+            "tiles:observations", [JFK[1], JFK[0], "weather:airport:JFK"]
+        )
+        assert pipeline.unlink.call_args.args == (
+            "tile:0:0:0",
+            "tile:1:0:0",
+            "tile:2:1:1",
+            "tile:3:2:3",
+        )
+
+    @pytest.mark.it("render_tile keeps the riskiest observation of each cell")
+    def test_render_tile(self):
+        tile = render_tile(
+            0,
+            0,
+            0,
+            [
+                (*JFK, observation()),
+                (40.7, -73.9, observation(cloudcover=100, wind_speed=60, visibility=1)),
+                (51.47, -0.45, observation(precip=None)),
+            ],
+            size=4,
+        )
+        assert tile["observations"] == 2
+        ratings = tile["layers"]["weather_rating"]
+        assert ratings[1][1] == 7
+        assert sum(value is not None for row in ratings for value in row) == 1
+        assert tile["layers"]["wind_risk"][1][1] == 10
+
+    @pytest.mark.it("encode_tile packs every layer into one byte per cell")
+    def test_encode_tile(self):
+        tile = render_tile(0, 0, 0, [(*JFK, observation(precip=1.0))], size=2)
+        packed = encode_tile(tile)
+        assert len(packed) == len(LAYERS) * 4
+        assert packed[:4] == bytes([10, NO_DATA, NO_DATA, NO_DATA])
+        assert packed[4 * 2] == 28  # precip_risk 2.8
+
+    @pytest.mark.it(
+        "get_tile renders from the indexed observations and caches the tile"
+    )
+    @mock.patch("app.services.tiles.cache_response")
+    @mock.patch("app.services.tiles.check_cache_many")
+    @mock.patch("app.services.tiles.check_cache", return_value=None)
+    @mock.patch("app.services.tiles.redis_client")
+    def test_get_tile(
+        self, mock_client, mock_check_cache, mock_check_cache_many, mock_cache_response
+    ):
+        mock_client.geosearch.return_value = [
+            ["weather:airport:JFK", (JFK[1], JFK[0])],
+            ["weather:airport:KJFK", (JFK[1], JFK[0])],
+            ["weather:airport:SYD", (151.17, -33.94)],
+        ]
+        mock_check_cache_many.return_value = [asdict(observation())]
+
+        tile = get_tile(1, 0, 0)
+
+        mock_check_cache_many.assert_called_once_with(["weather:airport:JFK"])
+        assert tile["observations"] == 1
+        mock_cache_response.assert_called_once_with(
+            "tile:1:0:0", tile, 300, ["ns:weather"]
+        )
+
+    @pytest.mark.it("get_tile rejects tiles out of range")
+    def test_get_tile_out_of_range(self):
+        with pytest.raises(ValueError):
+            get_tile(1, 2, 0)
+        with pytest.raises(ValueError):
+            get_tile(30, 0, 0)
@@ -0,0 +1,75 @@
+import json
+import time
+import pytest
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import timing
+
+"""
+Test suite for Server-Timing and request spans
+"""
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(timing.time_requests)
+
+    @app.get("/stages")
+    async def stages():
+        with timing.stage("airport_cache"):
+            time.sleep(0.01)
+        with timing.stage("weatherstack"):
+            pass
+        return {"status": "ok"}
+
+    @app.get("/plain")
+    async def plain():
+        return {"status": "ok"}
+
+    return TestClient(app)
+
+
+@pytest.mark.describe("Server-Timing tests")
+class TestTiming:
+    @pytest.mark.it("responses carry a Server-Timing entry per stage")
+    def test_server_timing_header(self, client):
+        response = client.get("/stages")
+        entries = response.headers["Server-Timing"].split(", ")
+        assert [entry.split(";")[0] for entry in entries] == [
+            "airport_cache",
+            "weatherstack",
+        ]
+        assert float(entries[0].split(";")[1].removeprefix("dur=")) >= 10
+        assert 'desc="Airport cache lookup"' in entries[0]
+
+    @pytest.mark.it("responses without stages have no Server-Timing header")
+    def test_no_stages(self, client):
+        assert "Server-Timing" not in client.get("/plain").headers
+
+    @pytest.mark.it("stage does nothing outside of a request")
+    def test_stage_outside_request(self):
+        with timing.stage("profile"):
+            value = 1
+        assert value == 1
+
+    @pytest.mark.it("spans are exported as OTLP JSON lines")
+    def test_file_export(self, client, tmp_path):
+        trace_file = tmp_path / "traces.jsonl"
+        traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        with mock.patch.object(timing.settings, "TRACE_EXPORTER", "file"):
+            with mock.patch.object(timing.settings, "TRACE_FILE", str(trace_file)):
+                client.get("/stages", headers={"traceparent": traceparent})
+                for _ in range(100):
+                    if trace_file.exists() and trace_file.read_text():
+                        break
+                    time.sleep(0.01)
+        line = json.loads(trace_file.read_text().splitlines()[0])
+        spans = line["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root, *stages = spans
+        assert root["name"] == "GET /stages"
+        assert root["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert root["parentSpanId"] == "00f067aa0ba902b7"
+        assert [span["name"] for span in stages] == ["airport_cache", "weatherstack"]
+        assert all(span["parentSpanId"] == root["spanId"] for span in stages)
@@ -3,8 +3,11 @@ from datetime import datetime
 
 from app.core.utils import (
     weather_risk_calc,
-    # TODO traffic_risk_calc,
+    weather_risk_batch,
+    weather_risk_columns,
+    traffic_risk_calc,
     okta_calc,
+    okta_columns,
     dew_point_calc,
     local_time_calc,
     pressure_inhg_calc,
@@ -72,6 +75,86 @@ class TestWeatherRiskCalc:
             )  # Missing visibility
 
 
+@pytest.mark.describe("Batched Weather Risk Function Tests")
+class TestWeatherRiskBatch:
+    @pytest.mark.it("weather_risk_batch matches weather_risk_calc")
+    def test_weather_risk_batch_matches(self):
+        observations = [
+            (4, 2.0, 15.0, 8.0),
+            (0, 0, 0, 20),
+            (8, 10, 51, 1),
+            (6, 0, 12, 16),
+        ]
+        results = weather_risk_batch(observations)
+        assert [risk for risk, _ in results] == [
+            weather_risk_calc(*observation) for observation in observations
+        ]
+
+    @pytest.mark.it("weather_risk_batch returns the risk components")
+    def test_weather_risk_batch_components(self):
+        [(risk, components)] = weather_risk_batch([(8, 0, 51, 1)])
+        assert risk == 7
+        assert components == {
+            "cloud_risk": 10,
+            "precip_risk": 0,
+            "wind_risk": 10,
+            "visibility_risk": 10,
+        }
+
+    @pytest.mark.it("weather_risk_batch returns None for invalid observations")
+    def test_weather_risk_batch_invalid_inputs(self):
+        results = weather_risk_batch([(9, 0, 0, 20), (None, 0, 0, 20), (0, 0, 0, 20)])
+        assert results[0] == (None, None)
+        assert results[1] == (None, None)
+        assert results[2][0] == 0
+
+
+@pytest.mark.describe("Columnar Weather Risk Function Tests")
+class TestWeatherRiskColumns:
+    @pytest.mark.it(
+        "weather_risk_columns matches weather_risk_batch at every threshold"
+    )
+    def test_weather_risk_columns_matches(self):
+        observations = [
+            (okta, precip, wind, visibility)
+            for okta in (0, 3, 8)
+            for precip in (0, 0.5, 20)
+            for wind in (0, 10, 10.5, 30, 31, 50, 51)
+            for visibility in (0, 1.9, 2, 5.9, 6, 9.9, 10, 20)
+        ]
+        observations += [(9, 0, 0, 20), (None, 0, 0, 20), (0, -1, 0, 20)]
+        columns = weather_risk_columns(*zip(*observations))
+        for i, (risk, components) in enumerate(weather_risk_batch(observations)):
+            assert columns["weather_rating"][i] == risk
+            for name in ("cloud_risk", "precip_risk", "wind_risk", "visibility_risk"):
+                assert columns[name][i] == (components[name] if components else None)
+
+    @pytest.mark.it("okta_columns matches okta_calc")
+    def test_okta_columns_matches(self):
+        covers = [0, 6, 50, 100, 101, None]
+        assert okta_columns(covers) == [okta_calc(cover) for cover in covers]
+
+
+@pytest.mark.describe("Traffic Risk Function Tests")
+class TestTrafficRiskCalc:
+    @pytest.mark.it("traffic_risk_calc returns a value between 0 and 10")
+    def test_traffic_risk_calc_range(self):
+        risk = traffic_risk_calc(movements=30, delay_ratio=0.25)
+        assert 0 <= risk <= 10
+
+    @pytest.mark.it("traffic_risk_calc returns None for invalid inputs")
+    def test_traffic_risk_calc_invalid_inputs(self):
+        assert traffic_risk_calc(movements=-1, delay_ratio=0.5) is None
+        assert traffic_risk_calc(movements=10, delay_ratio=1.5) is None
+        assert traffic_risk_calc(movements="10", delay_ratio=0.5) is None
+
+    @pytest.mark.it("traffic_risk_calc handles boundary conditions")
+    def test_traffic_risk_calc_boundary_conditions(self):
+        assert traffic_risk_calc(movements=0, delay_ratio=0) == 0
+        assert traffic_risk_calc(movements=51, delay_ratio=1) == 10
+        assert traffic_risk_calc(movements=10, delay_ratio=0.5) == 3
+
+
 @pytest.mark.describe("Okta Calculation Function Tests")
 class TestOktaCalc:
     @pytest.mark.it("okta_calc returns correct okta value")
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import pytest
+from app.core.watchdog import LoopWatchdog, percentile
+
+"""
+Test suite for the event loop watchdog
+"""
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+async def run_blocks(watchdog, blocks, pause=0.1):
+    watchdog.start()
+    try:
+        await asyncio.sleep(pause)
+        for seconds in blocks:
+            block_loop(seconds)
+            await asyncio.sleep(pause)
+    finally:
+        watchdog.stop()
+
+
+@pytest.mark.describe("Event loop watchdog tests")
+class TestWatchdog:
+    @pytest.mark.it("the watchdog reports the stack of code blocking the loop")
+    def test_watchdog_captures_blocking_stack(self):
+        watchdog = LoopWatchdog(0.01, 0.05, 100, 10, 60)
+        asyncio.run(run_blocks(watchdog, [0.25]))
+
+        stats = watchdog.stats()
+        assert stats["blocked"] == 1
+        assert stats["lag_ms"]["max"] >= 200
+        [report] = stats["reports"]
+        assert report["blocked_ms"] >= 200
+        assert report["stack"][-1].startswith("block_loop (")
+        assert any(frame.startswith("run_blocks (") for frame in report["stack"])
+
+    @pytest.mark.it("the watchdog rate limits its stack reports")
+    def test_watchdog_rate_limits_reports(self):
+        watchdog = LoopWatchdog(0.01, 0.05, 100, 10, 60)
+        asyncio.run(run_blocks(watchdog, [0.15, 0.15]))
+
+        stats = watchdog.stats()
+        assert stats["blocked"] == 2
+        assert stats["suppressed"] == 1
+        assert len(stats["reports"]) == 1
+
+    @pytest.mark.it("the watchdog keeps a bounded number of lag samples")
+    def test_watchdog_bounded_samples(self):
+        watchdog = LoopWatchdog(0.01, 0.05, 5, 10, 60)
+        for lag in range(10):
+            watchdog.record(lag / 1000)
+        stats = watchdog.stats()
+        assert stats["samples"] == 5
+        assert stats["lag_ms"]["p50"] == 7
+        assert stats["lag_ms"]["max"] == 9
+
+    @pytest.mark.it("percentile returns None without samples")
+    def test_percentile_empty(self):
+        assert percentile([], 0.99) is None
+        assert percentile([1, 2, 3, 4], 0.5) == 3